@@ -0,0 +1,320 @@
+# Copyright (C) 2020 R. Knuus
+
+from INCode.call_tree_manager import CallTreeManager
+from INCode.clang_access import Callable, DEFAULT_PARSE_OPTIONS
+from os import path
+import appdirs
+import json
+import os
+import socket
+import socketserver
+import threading
+
+
+DEFAULT_SESSION = 'default'
+
+
+def default_socket_path():
+    return path.join(appdirs.user_cache_dir('INCode', 'rknuus'), 'server.sock')
+
+
+class ServerError(RuntimeError):
+    '''Raised by AnalysisClient if the server failed to answer a request.'''
+
+
+def callable_to_dict_(callable):
+    if callable is None:
+        return None
+    return {'name': callable.name, 'spelling': callable.get_spelling(), 'callable': callable.callable,
+            'file_name': callable.file_name, 'used_in_file': callable.used_in_file,
+            'participant': callable.raw_participant, 'is_definition': callable.is_definition(), 'usr': callable.usr}
+
+
+def callable_from_dict_(record):
+    return None if record is None else Callable(**record)
+
+
+class Session_(object):
+    def __init__(self, manager):
+        super(Session_, self).__init__()
+        self.manager = manager
+        self.lock = threading.Lock()
+        self.is_parsed = False
+
+
+class AnalysisRequestHandler_(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError as error:
+                response = {'error': 'Invalid request: {}'.format(error)}
+            else:
+                response = self.server.answer(request)
+            self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+
+
+class AnalysisServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    '''Keeps CallTreeManagers and their parsed call graphs in memory to answer requests of AnalysisClients.
+
+    Each line received is a JSON object with a command, its arguments and the name of a session, each line sent
+    back holds either the result or an error. Interactive commands go to the manager of the session, dump
+    requests reuse the call graph parsed before for the same compilation database and settings.
+    '''
+    daemon_threads = True
+
+    def __init__(self, socket_path, cache=None, parse_options=DEFAULT_PARSE_OPTIONS):
+        if path.exists(socket_path):
+            if is_server_running(socket_path):
+                raise OSError('An analysis server is already listening on {}'.format(socket_path))
+            os.remove(socket_path)  # left over by a server that was killed
+        os.makedirs(path.dirname(path.abspath(socket_path)), exist_ok=True)
+        super(AnalysisServer, self).__init__(socket_path, AnalysisRequestHandler_)
+        self.socket_path_ = socket_path
+        self.cache_ = cache
+        self.parse_options_ = parse_options
+        self.lock_ = threading.Lock()
+        self.sessions_ = dict()
+        self.dump_sessions_ = dict()
+
+    def server_close(self):
+        super(AnalysisServer, self).server_close()
+        if path.exists(self.socket_path_):
+            os.remove(self.socket_path_)
+
+    def answer(self, request):
+        '''Returns the response to a decoded request.'''
+        command = request.get('command')
+        handler = getattr(self, 'command_{}_'.format(command), None) if command in COMMANDS else None
+        if handler is None:
+            return {'error': 'Unknown command {}'.format(command)}
+        try:
+            return {'result': handler(request.get('session', DEFAULT_SESSION), **request.get('arguments', {}))}
+        except Exception as error:
+            return {'error': '{}: {}'.format(type(error).__name__, error)}
+
+    def create_manager_(self):
+        manager = CallTreeManager(cache=self.cache_)
+        manager.set_parse_options(self.parse_options_)
+        return manager
+
+    def get_session_(self, name):
+        with self.lock_:
+            if name not in self.sessions_:
+                raise ValueError('No file opened in session {}'.format(name))
+            return self.sessions_[name]
+
+    def call_(self, session_name, method_name, *args, **kwargs):
+        session = self.get_session_(session_name)
+        with session.lock:
+            return getattr(session.manager, method_name)(*args, **kwargs)
+
+    def command_status_(self, session_name):
+        with self.lock_:
+            return {'pid': os.getpid(), 'sessions': sorted(self.sessions_), 'dumps': len(self.dump_sessions_)}
+
+    def command_shutdown_(self, session_name):
+        # serve_forever runs in another thread than the handlers, so waiting for it to return cannot deadlock
+        threading.Thread(target=self.shutdown).start()
+
+    def command_open_(self, session_name, file_name, extra_arguments='', include_system_headers=False,
+                      exclude_patterns=None):
+        session = Session_(self.create_manager_())
+        session.manager.set_extra_arguments(extra_arguments, include_system_headers=include_system_headers,
+                                            exclude_patterns=exclude_patterns)
+        files = session.manager.open(file_name)
+        with self.lock_:
+            replaced = self.sessions_.get(session_name)
+            self.sessions_[session_name] = session
+        if replaced:
+            replaced.manager.set_prefetch(False)
+        return list(files or [])
+
+    def command_close_(self, session_name):
+        with self.lock_:
+            session = self.sessions_.pop(session_name, None)
+        if session:
+            session.manager.set_prefetch(False)
+
+    def command_select_tu_(self, session_name, file_name):
+        return [callable_to_dict_(callable) for callable in self.call_(session_name, 'select_tu', file_name) or []]
+
+    def command_select_root_(self, session_name, callable_name):
+        return callable_to_dict_(self.call_(session_name, 'select_root', callable_name))
+
+    def command_load_definition_(self, session_name, callable_name):
+        return callable_to_dict_(self.call_(session_name, 'load_definition', callable_name))
+
+    def command_get_callable_(self, session_name, callable_name):
+        return callable_to_dict_(self.call_(session_name, 'get_callable', callable_name))
+
+    def command_calls_of_(self, session_name, callable_name):
+        return [callable_to_dict_(callable) for callable in self.call_(session_name, 'get_calls_of', callable_name)]
+
+    def command_callers_of_(self, session_name, callable_name):
+        return [callable_to_dict_(callable) for callable in self.call_(session_name, 'get_callers_of', callable_name)]
+
+    def command_include_(self, session_name, callable_name):
+        self.call_(session_name, 'include', callable_name)
+
+    def command_exclude_(self, session_name, callable_name):
+        self.call_(session_name, 'exclude', callable_name)
+
+    def command_export_(self, session_name):
+        return self.call_(session_name, 'export')
+
+    def command_watch_(self, session_name, enabled=True):
+        self.call_(session_name, 'set_watch', enabled)
+
+    def command_refresh_(self, session_name):
+        return sorted(self.call_(session_name, 'refresh'))
+
+    def command_prefetch_(self, session_name, enabled=True, depth=1, max_tus=16):
+        self.call_(session_name, 'set_prefetch', enabled=enabled, depth=depth, max_tus=max_tus)
+
+    def command_stats_(self, session_name, reset=False):
+        session = self.get_session_(session_name)
+        report = session.manager.statistics.report()
+        if reset:
+            session.manager.statistics.reset()
+        return report
+
+    def command_dump_(self, session_name, file_name, entry_point, include_system_headers=False,
+                      extra_arguments=None, jobs=1, exclude_patterns=None, format='text', max_depth=None,
+                      reparse=False):
+        key = json.dumps([file_name, include_system_headers, extra_arguments, exclude_patterns])
+        with self.lock_:
+            if reparse or key not in self.dump_sessions_:
+                self.dump_sessions_[key] = Session_(self.create_manager_())
+            session = self.dump_sessions_[key]
+        with session.lock:
+            if not session.is_parsed:
+                session.manager.parse_all(file_name=file_name, include_system_headers=include_system_headers,
+                                          extra_arguments=extra_arguments, jobs=jobs,
+                                          exclude_patterns=exclude_patterns)
+                session.is_parsed = True
+            return {'dump': session.manager.write_dump(entry_point=entry_point, format=format, max_depth=max_depth),
+                    'statistics': session.manager.statistics.report()}
+
+
+COMMANDS = {name[len('command_'):-1] for name in dir(AnalysisServer) if name.startswith('command_')}
+
+
+def is_server_running(socket_path):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(socket_path)
+        return True
+    except OSError:
+        return False
+
+
+class AnalysisClient(object):
+    '''Sends requests to an AnalysisServer over a connection kept open between requests.'''
+    def __init__(self, socket_path=None, session=DEFAULT_SESSION):
+        super(AnalysisClient, self).__init__()
+        self.session_ = session
+        self.socket_ = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket_.connect(socket_path or default_socket_path())
+        self.file_ = self.socket_.makefile('rwb')
+
+    def close(self):
+        self.file_.close()
+        self.socket_.close()
+
+    def request(self, command, **arguments):
+        '''Returns the result of command or raises ServerError.'''
+        request = {'command': command, 'session': self.session_, 'arguments': arguments}
+        self.file_.write((json.dumps(request) + '\n').encode('utf-8'))
+        self.file_.flush()
+        line = self.file_.readline()
+        if not line:
+            raise ServerError('The analysis server closed the connection')
+        response = json.loads(line.decode('utf-8'))
+        if 'error' in response:
+            raise ServerError(response['error'])
+        return response['result']
+
+
+class RemoteStatistics_(object):
+    def __init__(self, client):
+        super(RemoteStatistics_, self).__init__()
+        self.client_ = client
+
+    def report(self):
+        return self.client_.request('stats')
+
+    def reset(self):
+        self.client_.request('stats', reset=True)
+
+
+class RemoteCallTreeManager(object):
+    '''Stands in for a CallTreeManager, forwarding to the session of an AnalysisClient.'''
+    def __init__(self, client):
+        super(RemoteCallTreeManager, self).__init__()
+        self.client_ = client
+        self.extra_arguments_ = ''
+        self.include_system_headers_ = False
+        self.exclude_patterns_ = []
+        self.observers_ = []
+        self.statistics_ = RemoteStatistics_(client)
+
+    @property
+    def statistics(self):
+        return self.statistics_
+
+    def set_extra_arguments(self, extra_arguments, include_system_headers=False, exclude_patterns=None):
+        self.extra_arguments_ = extra_arguments
+        self.include_system_headers_ = include_system_headers
+        self.exclude_patterns_ = list(exclude_patterns or [])
+
+    def set_prefetch(self, enabled=True, depth=1, max_tus=16):
+        self.client_.request('prefetch', enabled=enabled, depth=depth, max_tus=max_tus)
+
+    def subscribe(self, observer):
+        self.observers_.append(observer)
+
+    def set_watch(self, enabled=True):
+        self.client_.request('watch', enabled=enabled)
+
+    def refresh(self):
+        changed_names = set(self.client_.request('refresh'))
+        if changed_names:
+            for observer in self.observers_:
+                observer(changed_names)
+        return changed_names
+
+    def open(self, file_name):
+        # the server does not share the working directory of the client
+        return self.client_.request('open', file_name=path.abspath(file_name), extra_arguments=self.extra_arguments_,
+                                    include_system_headers=self.include_system_headers_,
+                                    exclude_patterns=self.exclude_patterns_)
+
+    def select_tu(self, file_name):
+        return [callable_from_dict_(record) for record in self.client_.request('select_tu', file_name=file_name)]
+
+    def select_root(self, callable_name):
+        return callable_from_dict_(self.client_.request('select_root', callable_name=callable_name))
+
+    def load_definition(self, callable_name):
+        return callable_from_dict_(self.client_.request('load_definition', callable_name=callable_name))
+
+    def get_callable(self, callable_name):
+        return callable_from_dict_(self.client_.request('get_callable', callable_name=callable_name))
+
+    def get_calls_of(self, callable_name):
+        return [callable_from_dict_(record)
+                for record in self.client_.request('calls_of', callable_name=callable_name)]
+
+    def get_callers_of(self, callable_name):
+        return [callable_from_dict_(record)
+                for record in self.client_.request('callers_of', callable_name=callable_name)]
+
+    def include(self, callable_name):
+        self.client_.request('include', callable_name=callable_name)
+
+    def exclude(self, callable_name):
+        self.client_.request('exclude', callable_name=callable_name)
+
+    def export(self):
+        return self.client_.request('export')
@@ -0,0 +1,149 @@
+# Copyright (C) 2020 R. Knuus
+
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatchcase
+from INCode import clang_access
+from INCode.plantuml_exporter import PlantUmlExporter
+from os import path
+import json
+import os
+import re
+import warnings
+
+
+DIAGRAM_SUFFIX = '.plantuml'
+UNSAFE_FILE_NAME_CHARACTERS = re.compile(r'[^A-Za-z0-9_.-]+')
+WORKER_CALLS_OF = None
+
+
+def load_roots(file_name, include_patterns=None):
+    '''Reads the roots to export from a JSON array or from a text file with one callable name per line.
+
+    An element of the JSON array is either a callable name or an object with the name as "root" and optionally
+    its own "include" patterns and "output" file name relative to the output directory. Roots without own
+    patterns get include_patterns.
+    '''
+    with open(file_name) as file:
+        if file_name.endswith('.json'):
+            entries = json.load(file)
+        else:
+            entries = [line.strip() for line in file if line.strip()]
+    roots = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'root': entry}
+        roots.append({'root': entry['root'],
+                      'include': entry.get('include', include_patterns),
+                      'output': entry.get('output')})
+    return roots
+
+
+def get_diagram_file_name(root_name):
+    return UNSAFE_FILE_NAME_CHARACTERS.sub('_', root_name).strip('_') + DIAGRAM_SUFFIX
+
+
+def matches_(name, patterns):
+    # names of operators contain wildcard characters, so each pattern also matches itself literally
+    return any(name == pattern or fnmatchcase(name, pattern) for pattern in patterns)
+
+
+def is_inside_(file_name, directory):
+    # resolves symbolic links as well, so a linked subdirectory cannot lead outside either
+    directory = path.realpath(directory)
+    return path.commonpath([directory, path.realpath(file_name)]) == directory
+
+
+def write_diagram_(calls_of, root, included, file_name):
+    exporter = PlantUmlExporter(get_calls_of=lambda name: calls_of.get(name, []), included=included)
+    with open(file_name, 'w') as file:
+        exporter.export(root=root, stream=file)
+
+
+def init_worker_(calls_of, common_path):
+    global WORKER_CALLS_OF
+    WORKER_CALLS_OF = calls_of
+    # participants of free functions are named relative to the common path of the TUs
+    clang_access.set_global_common_path(common_path)
+
+
+def export_root_(root, included, file_name):
+    '''Worker entry point of BatchExporter.export, must be picklable.'''
+    write_diagram_(WORKER_CALLS_OF, root, included, file_name)
+    return file_name
+
+
+class BatchExporter(object):
+    '''Writes the sequence diagrams of many roots of one call graph.
+
+    The calls reachable from all roots are collected once and sent to each worker process once, so rendering
+    a diagram only needs its root and the callables to include. Include patterns are shell-style wildcard
+    patterns matched against the callables reachable from the root; without patterns all of them are included.
+    '''
+    def __init__(self, get_calls_of, get_callable):
+        super(BatchExporter, self).__init__()
+        self.get_calls_of_ = get_calls_of
+        self.get_callable_ = get_callable
+
+    def export(self, roots, output_directory, jobs=1):
+        '''Writes a diagram per root, as returned by load_roots, and returns the written file names.'''
+        os.makedirs(output_directory, exist_ok=True)
+        tasks = []
+        used_file_names = set()
+        for entry in roots:
+            root = self.get_callable_(entry['root'])
+            if root is None:
+                warnings.warn('Root {} not found in call graph'.format(entry['root']))
+                continue
+            file_name = path.normpath(path.join(output_directory,
+                                                entry.get('output') or get_diagram_file_name(root.name)))
+            if not is_inside_(file_name, output_directory):
+                warnings.warn('Output {} of root {} is outside of {}'.format(entry['output'], entry['root'],
+                                                                            output_directory))
+                continue
+            file_name = self.make_unique_(file_name, used_file_names)
+            tasks.append((root, entry.get('include'), file_name))
+        calls_of = self.collect_calls_([root.name for root, _, _ in tasks])
+        tasks = [(root, self.find_included_(root.name, patterns or ['*'], calls_of), file_name)
+                 for root, patterns, file_name in tasks]
+        if jobs <= 1 or len(tasks) <= 1:
+            for root, included, file_name in tasks:
+                write_diagram_(calls_of, root, included, file_name)
+            return [file_name for _, _, file_name in tasks]
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker_,
+                                 initargs=(calls_of, clang_access.GLOBAL_COMMON_PATH)) as executor:
+            return list(executor.map(export_root_, *zip(*tasks)))
+
+    def collect_calls_(self, root_names):
+        calls_of = dict()
+        pending = list(root_names)
+        while pending:
+            name = pending.pop()
+            if name in calls_of:
+                continue
+            calls_of[name] = self.get_calls_of_(name)
+            pending.extend(call.name for call in calls_of[name])
+        return calls_of
+
+    def find_included_(self, root_name, patterns, calls_of):
+        included = {root_name}
+        reached = {root_name}
+        pending = [root_name]
+        while pending:
+            for call in calls_of.get(pending.pop(), []):
+                if call.name not in reached:
+                    reached.add(call.name)
+                    pending.append(call.name)
+                    if matches_(call.name, patterns):
+                        included.add(call.name)
+        return included
+
+    def make_unique_(self, file_name, used_file_names):
+        # overloads may differ only in characters not allowed in file names
+        base, suffix = path.splitext(file_name)
+        unique_file_name = file_name
+        counter = 2
+        while unique_file_name in used_file_names:
+            unique_file_name = '{}_{}{}'.format(base, counter, suffix)
+            counter += 1
+        used_file_names.add(unique_file_name)
+        return unique_file_name
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+from INCode.call_graph_cache import CallGraphCache
+from optparse import OptionParser
+
+
+def main():
+    parser = OptionParser('usage: %prog [options]')
+    parser.add_option('', '--cache-dir', dest='cache_dir',
+                      help='Inspect the cache in DIR instead of the user cache directory',
+                      metavar='DIR', default=None)
+    parser.add_option('', '--list', action="store_true",
+                      dest='list_entries', default=False,
+                      help='List all cached call graphs, least recently used first')
+    parser.add_option('', '--evict', dest='max_size',
+                      help='Evict least recently used call graphs until the cache is smaller than N MiB',
+                      metavar='N', type=int, default=None)
+    parser.add_option('', '--clear', action="store_true",
+                      dest='clear', default=False,
+                      help='Remove all cached call graphs')
+    (opts, args) = parser.parse_args()
+
+    if len(args) > 0:
+        parser.error('invalid number arguments')
+
+    cache = CallGraphCache(directory=opts.cache_dir)
+    if opts.clear:
+        cache.clear()
+    if opts.max_size is not None:
+        cache.evict(max_size=opts.max_size * 1024 * 1024)
+
+    entries = sorted(cache.entries, key=lambda entry: entry.last_used)
+    if opts.list_entries:
+        for entry in entries:
+            last_used = datetime.fromtimestamp(entry.last_used).strftime('%Y-%m-%d %H:%M:%S')
+            print('{}  {:>10}  {}'.format(last_used, entry.size, entry.file_name))
+    print('{}: {} call graphs, {:.1f} MiB'.format(cache.directory, len(entries),
+                                                 sum(entry.size for entry in entries) / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+from INCode.batch_exporter import load_roots
+from INCode.call_graph_cache import CallGraphCache
+from INCode.call_tree_manager import CallTreeManager
+from INCode.clang_access import get_parse_options
+from optparse import OptionParser
+import sys
+import time
+
+
+def main():
+    parser = OptionParser('usage: %prog [options] roots-file {file.cpp|compile_commands.json|index.sqlite} '
+                          '[extra-clang-args*]')
+    parser.add_option('-o', '--output-dir', dest='output_directory',
+                      help='Write the diagrams to DIR [default: %default]', metavar='DIR', default='.')
+    parser.add_option('', '--include', action='append',
+                      dest='include_patterns', default=[],
+                      help='Include callables matching PATTERN in diagrams of roots without own patterns '
+                           '(repeatable) [default: all]',
+                      metavar='PATTERN')
+    parser.add_option('', '--include-system-headers', action="store_true",
+                      dest='include_system_headers', default=False,
+                      help='Include calls into system headers from the call-tree')
+    parser.add_option('', '--exclude', action='append',
+                      dest='exclude_patterns', default=[],
+                      help='Skip AST subtrees in files starting with or matching PATTERN (repeatable)',
+                      metavar='PATTERN')
+    parser.add_option('', '--parse-option', action='append',
+                      dest='parse_options', default=[],
+                      help='Pass libclang parse option NAME, e.g. incomplete or precompiled-preamble (repeatable)',
+                      metavar='NAME')
+    parser.add_option('-j', '--jobs', dest='jobs',
+                      help='Parse translation units and render diagrams in up to N worker processes',
+                      metavar='N', type=int, default=1)
+    parser.add_option('', '--cache-dir', dest='cache_dir',
+                      help='Store parsed call graphs in DIR instead of the user cache directory',
+                      metavar='DIR', default=None)
+    parser.add_option('', '--no-cache', action="store_false",
+                      dest='use_cache', default=True,
+                      help='Always parse all translation units instead of reusing cached call graphs')
+    parser.add_option('', '--stats', action='store_true', dest='stats', default=False,
+                      help='Report parse and export times and counters to stderr')
+    parser.disable_interspersed_args()
+    (opts, args) = parser.parse_args()
+
+    if len(args) < 2:
+        parser.error('invalid number arguments')
+
+    cache = CallGraphCache(directory=opts.cache_dir) if opts.use_cache else None
+    manager = CallTreeManager(cache=cache)
+    try:
+        manager.set_parse_options(get_parse_options(opts.parse_options))
+    except ValueError as error:
+        parser.error(str(error))
+    roots = load_roots(args[0], include_patterns=opts.include_patterns or None)
+    extra_arguments = args[2:] if len(args) > 2 else None
+    start = time.time()
+    manager.parse_all(file_name=args[1], include_system_headers=opts.include_system_headers,
+                      extra_arguments=extra_arguments, jobs=opts.jobs, exclude_patterns=opts.exclude_patterns)
+    file_names = manager.export_batch(roots=roots, output_directory=opts.output_directory, jobs=opts.jobs)
+    print('{}: {} of {} diagrams, {:.1f} s'.format(opts.output_directory, len(file_names), len(roots),
+                                                   time.time() - start))
+    if opts.stats:
+        sys.stderr.write(manager.statistics.report())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,13 @@
 #!/usr/bin/env python3
 
+from INCode.analysis_server import AnalysisClient, AnalysisServer, default_socket_path, ServerError
+from INCode.call_graph_cache import CallGraphCache
 from INCode.call_tree_manager import CallTreeManager
+from INCode.clang_access import get_parse_options
+from INCode.dump_writers import DUMP_FORMATS
 from optparse import OptionParser
+import os
+import sys
 
 
 # TODO(KNR): rewrite to use tui's view model
@@ -10,20 +16,96 @@ def main():
     parser.add_option('', '--include-system-headers', action="store_true",
                       dest='include_system_headers', default=False,
                       help='Include calls into system headers from the call-tree')
-    # parser.add_option('', '--max-depth', dest='maxDepth',
-    #                   help='Limit cursor expansion to depth N',
-    #                   metavar='N', type=int, default=None)
+    parser.add_option('', '--exclude', action='append',
+                      dest='exclude_patterns', default=[],
+                      help='Skip AST subtrees in files starting with or matching PATTERN (repeatable)',
+                      metavar='PATTERN')
+    parser.add_option('', '--parse-option', action='append',
+                      dest='parse_options', default=[],
+                      help='Pass libclang parse option NAME, e.g. incomplete or precompiled-preamble (repeatable)',
+                      metavar='NAME')
+    parser.add_option('-j', '--jobs', dest='jobs',
+                      help='Parse up to N translation units in parallel worker processes',
+                      metavar='N', type=int, default=1)
+    parser.add_option('', '--cache-dir', dest='cache_dir',
+                      help='Store parsed call graphs in DIR instead of the user cache directory',
+                      metavar='DIR', default=None)
+    parser.add_option('', '--no-cache', action="store_false",
+                      dest='use_cache', default=True,
+                      help='Always parse all translation units instead of reusing cached call graphs')
+    parser.add_option('', '--max-depth', dest='max_depth',
+                      help='Limit call-tree expansion to depth N',
+                      metavar='N', type=int, default=None)
+    parser.add_option('', '--format', dest='format', type='choice',
+                      choices=sorted(DUMP_FORMATS.keys()), default='text',
+                      help='Write the call-tree as indented text, JSON lines or DOT edges [default: %default]')
+    parser.add_option('', '--stats', action='store_true', dest='stats', default=False,
+                      help='Report parse, traversal and dump times and counters to stderr')
+    parser.add_option('', '--serve', action='store_true', dest='serve', default=False,
+                      help='Run as analysis server keeping parsed call graphs in memory, takes no arguments')
+    parser.add_option('', '--connect', action='store_true', dest='connect', default=False,
+                      help='Let the analysis server dump the call-tree instead of parsing in this process')
+    parser.add_option('', '--socket', dest='socket_path', default=default_socket_path(),
+                      help='Unix domain socket of the analysis server [default: %default]', metavar='PATH')
     parser.disable_interspersed_args()
     (opts, args) = parser.parse_args()
 
-    if len(args) < 2:
+    if len(args) < (0 if opts.serve else 2):
         parser.error('invalid number arguments')
 
-    manager = CallTreeManager()
+    try:
+        parse_options = get_parse_options(opts.parse_options)
+    except ValueError as error:
+        parser.error(str(error))
+    cache = CallGraphCache(directory=opts.cache_dir) if opts.use_cache and not opts.connect else None
+    if opts.serve:
+        serve(opts.socket_path, cache, parse_options)
+        return
     extra_arguments = args[2:] if len(args) > 2 else None
-    print(manager.dump(entry_point=args[0], file_name=args[1],
-                       include_system_headers=opts.include_system_headers,
-                       extra_arguments=extra_arguments))
+    if opts.connect:
+        dump_remotely(opts, entry_point=args[0], file_name=args[1], extra_arguments=extra_arguments)
+        return
+    manager = CallTreeManager(cache=cache)
+    manager.set_parse_options(parse_options)
+    manager.dump(entry_point=args[0], file_name=args[1],
+                 include_system_headers=opts.include_system_headers,
+                 extra_arguments=extra_arguments, jobs=opts.jobs,
+                 exclude_patterns=opts.exclude_patterns,
+                 stream=sys.stdout, format=opts.format, max_depth=opts.max_depth)
+    if opts.stats:
+        sys.stderr.write(manager.statistics.report())
+
+
+def serve(socket_path, cache, parse_options):
+    server = AnalysisServer(socket_path, cache=cache, parse_options=parse_options)
+    print('Serving on {}'.format(socket_path), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def dump_remotely(opts, entry_point, file_name, extra_arguments):
+    try:
+        client = AnalysisClient(opts.socket_path)
+    except OSError as error:
+        sys.exit('Cannot connect to the analysis server on {}: {}'.format(opts.socket_path, error))
+    try:
+        # the server does not share the working directory of the client
+        result = client.request('dump', file_name=os.path.abspath(file_name), entry_point=entry_point,
+                                include_system_headers=opts.include_system_headers,
+                                extra_arguments=extra_arguments, jobs=opts.jobs,
+                                exclude_patterns=opts.exclude_patterns, format=opts.format,
+                                max_depth=opts.max_depth)
+    except ServerError as error:
+        sys.exit(str(error))
+    finally:
+        client.close()
+    sys.stdout.write(result['dump'])
+    if opts.stats:
+        sys.stderr.write(result['statistics'])
 
 
 if __name__ == '__main__':
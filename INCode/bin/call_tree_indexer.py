@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+from INCode.call_graph_cache import CallGraphCache
+from INCode.clang_access import ClangCallGraphAccess, ClangTUAccess, get_parse_options
+from INCode.project_index import get_project_index_file_name, ProjectIndex
+from optparse import OptionParser
+import time
+
+
+def main():
+    parser = OptionParser('usage: %prog [options] compile_commands.json [extra-clang-args*]')
+    parser.add_option('-o', '--output', dest='output',
+                      help='Write the project index to FILE instead of next to the compilation database',
+                      metavar='FILE', default=None)
+    parser.add_option('', '--include-system-headers', action="store_true",
+                      dest='include_system_headers', default=False,
+                      help='Include calls into system headers in the index')
+    parser.add_option('', '--exclude', action='append',
+                      dest='exclude_patterns', default=[],
+                      help='Skip AST subtrees in files starting with or matching PATTERN (repeatable)',
+                      metavar='PATTERN')
+    parser.add_option('', '--parse-option', action='append',
+                      dest='parse_options', default=[],
+                      help='Pass libclang parse option NAME, e.g. incomplete or precompiled-preamble (repeatable)',
+                      metavar='NAME')
+    parser.add_option('-j', '--jobs', dest='jobs',
+                      help='Parse up to N translation units in parallel worker processes',
+                      metavar='N', type=int, default=1)
+    parser.add_option('', '--cache-dir', dest='cache_dir',
+                      help='Store parsed call graphs in DIR instead of the user cache directory',
+                      metavar='DIR', default=None)
+    parser.add_option('', '--no-cache', action="store_false",
+                      dest='use_cache', default=True,
+                      help='Always parse all translation units instead of reusing cached call graphs')
+    parser.disable_interspersed_args()
+    (opts, args) = parser.parse_args()
+
+    if len(args) < 1:
+        parser.error('invalid number arguments')
+
+    try:
+        parse_options = get_parse_options(opts.parse_options)
+    except ValueError as error:
+        parser.error(str(error))
+    cache = CallGraphCache(directory=opts.cache_dir) if opts.use_cache else None
+    tu_access = ClangTUAccess(file_name=args[0], extra_arguments=args[1:])
+    access = ClangCallGraphAccess(include_system_headers=opts.include_system_headers,
+                                  exclude_patterns=opts.exclude_patterns, parse_options=parse_options, cache=cache)
+    project_index = ProjectIndex(opts.output or get_project_index_file_name(args[0]))
+    start = time.time()
+    project_index.build(access=access, files=tu_access.files, jobs=opts.jobs)
+    print('{}: {} TUs, {} callables, {:.1f} s'.format(project_index.file_name, len(tu_access.files),
+                                                      project_index.count_callables(), time.time() - start))
+    project_index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 # Copyright (C) 2020 R. Knuus
 
+from INCode.analysis_server import AnalysisClient, default_socket_path, RemoteCallTreeManager
+from INCode.call_graph_cache import CallGraphCache
 from INCode.call_tree_manager import CallTreeManager
 from INCode.tui import TuiViewModel
 from prompt_toolkit.history import FileHistory
@@ -10,7 +12,7 @@ import os
 import re
 
 
-manager = CallTreeManager()
+manager = CallTreeManager(cache=CallGraphCache())
 root_callable = None
 view_model = TuiViewModel(manager)
 
@@ -23,9 +25,17 @@ def clean_up_usage_message_(message, command):
 
 
 @click.group(invoke_without_command=True)
+@click.option('--connect', is_flag=True, default=False,
+              help='Forward the commands to an analysis server started by call_tree_dumper.py --serve')
+@click.option('--socket', 'socket_path', default=default_socket_path(), help='Unix domain socket of the server')
 @click.pass_context
-def cli(ctx):
+def cli(ctx, connect, socket_path):
     '''Pleasantries CLI'''
+    global manager, view_model
+    # the REPL invokes the group again for each command, so only connect on the first invocation
+    if connect and not isinstance(manager, RemoteCallTreeManager):
+        manager = RemoteCallTreeManager(AnalysisClient(socket_path))
+        view_model = TuiViewModel(manager)
     if ctx.invoked_subcommand is None:
         ctx.invoke(repl)
 
@@ -94,10 +104,48 @@ def select_root(root):
 def load_definition(callable_name):
     '''Enter signature of callable to load'''
     callable = manager.load_definition(callable_name=callable_name)
-    view_model.update_node_data(callable)
+    if callable:
+        view_model.update_node_data(callable)
+        view_model.expand(callable.name)
     click.echo(view_model.view)
 
 
+@cli.command()
+@click.option('--callable-name', prompt='Enter signature of callable to expand')
+@click.option('--depth', default=1, type=int)
+def expand(callable_name, depth):
+    '''Show the calls of a callable down to depth levels'''
+    if not view_model.expand(callable_name, depth=depth):
+        click.echo('Callable {} is not in the call tree'.format(callable_name))
+        return
+    click.echo(view_model.view)
+
+
+@cli.command()
+@click.option('--callable-name', prompt='Enter signature of callable to collapse')
+def collapse(callable_name):
+    '''Hide the calls of a callable'''
+    view_model.collapse(callable_name)
+    click.echo(view_model.view)
+
+
+@cli.command()
+@click.option('--callable-name', default=None)
+@click.option('--max-depth', default=None, type=int)
+def view(callable_name, max_depth):
+    '''Print the expanded call tree, or only the subtree of a callable'''
+    click.echo(view_model.render(node_name=callable_name, max_depth=max_depth))
+
+
+@cli.command()
+@click.option('--callable-name', prompt='Enter signature of callable to list the callers of')
+def callers(callable_name):
+    '''List the callables calling a callable'''
+    callable_list = manager.get_callers_of(callable_name)
+    for i, callable in zip(range(len(callable_list)), callable_list):
+        click.echo('{}: {} ({})\n'.format(i + 1, callable.name, callable.file_name))
+
+
 @cli.command()
 @click.option('--callable-name', prompt='Enter signature of callable to include')
 def include(callable_name):
@@ -116,12 +164,44 @@ def exclude(callable_name):
     click.echo(view_model.view)
 
 
+@cli.command()
+@click.option('--enabled', default=True, type=bool)
+def watch(enabled):
+    '''Track modifications of loaded files to refresh the call tree'''
+    manager.set_watch(enabled)
+
+
+@cli.command()
+def refresh():
+    '''Re-parse modified files and print the updated call tree'''
+    manager.refresh()
+    click.echo(view_model.view)
+
+
+@cli.command()
+@click.option('--enabled', default=True, type=bool)
+@click.option('--depth', default=1, type=int)
+@click.option('--max-tus', default=16, type=int)
+def prefetch(enabled, depth, max_tus):
+    '''Load definitions of callees in the background after selecting the root or loading a definition'''
+    manager.set_prefetch(enabled=enabled, depth=depth, max_tus=max_tus)
+
+
 @cli.command()
 def export():
     '''Export all included callables'''
     click.echo(manager.export())
 
 
+@cli.command()
+@click.option('--reset', default=False, type=bool)
+def stats(reset):
+    '''Print parse, definition lookup and export times and counters of the session'''
+    click.echo(manager.statistics.report())
+    if reset:
+        manager.statistics.reset()
+
+
 @cli.command()
 def debug():
     '''Enters debugger (which cannot be left anymore!)'''
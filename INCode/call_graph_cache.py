@@ -0,0 +1,197 @@
+# Copyright (C) 2020 R. Knuus
+
+from collections import Counter
+from os import path
+import appdirs
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+
+# bump whenever the pickled CallGraphFragment or Callable layout changes
+FORMAT_VERSION = 4
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+# a full cache is shrunk below its limit, so the next stores do not list the directory again right away
+EVICTION_RATIO = 0.8
+MANIFEST_SUFFIX = '.manifest'
+FRAGMENT_SUFFIX = '.fragment'
+
+
+def default_cache_directory():
+    return path.join(appdirs.user_cache_dir('INCode', 'rknuus'), 'call_graphs')
+
+
+def hash_text_(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class CacheEntry(object):
+    def __init__(self, file_name, size, last_used):
+        super(CacheEntry, self).__init__()
+        self.file_name = file_name
+        self.size = size
+        self.last_used = last_used
+
+
+class CallGraphCache(object):
+    '''Persistent per-TU cache of call graph fragments.
+
+    A fragment is stored under a hash of its TU, all files the TU includes, the compiler arguments and the
+    libclang parse options. As the includes are only known after parsing, a manifest keyed by TU, compiler
+    arguments and parse options remembers them for the next lookup. Fragment file names start with the key of
+    their manifest, so a manifest is evicted together with its last fragment.
+
+    The size of the cache is counted once on the first store and kept up to date by later stores of the same
+    instance, fragments stored by other processes in the meantime are only noticed by the next eviction.
+    '''
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        super(CallGraphCache, self).__init__()
+        self.directory_ = directory or default_cache_directory()
+        self.max_size_ = max_size
+        self.file_digests_ = dict()
+        self.size_ = None
+        os.makedirs(self.directory_, exist_ok=True)
+
+    @property
+    def directory(self):
+        return self.directory_
+
+    def load(self, tu_file_name, compiler_arguments, settings, options=0):
+        manifest_key = self.get_manifest_key_(tu_file_name, compiler_arguments, settings, options)
+        try:
+            with open(self.get_path_(manifest_key, MANIFEST_SUFFIX)) as manifest:
+                dependencies = json.load(manifest)
+        except (OSError, ValueError):
+            return None
+        fragment_key = self.get_fragment_key_(manifest_key, dependencies)
+        if not fragment_key:
+            return None
+        fragment_path = self.get_path_(fragment_key, FRAGMENT_SUFFIX)
+        try:
+            with open(fragment_path, 'rb') as fragment_file:
+                fragment = pickle.load(fragment_file)
+            os.utime(fragment_path)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+            return None
+        return fragment
+
+    def store(self, tu_file_name, compiler_arguments, settings, fragment, dependencies, options=0):
+        manifest_key = self.get_manifest_key_(tu_file_name, compiler_arguments, settings, options)
+        dependencies = [tu_file_name] + sorted(set(dependencies) - {tu_file_name})
+        fragment_key = self.get_fragment_key_(manifest_key, dependencies)
+        if not fragment_key:
+            return
+        if self.size_ is None:
+            self.size_ = self.size
+        fragment_path = self.get_path_(fragment_key, FRAGMENT_SUFFIX)
+        content = pickle.dumps(fragment)
+        try:
+            self.size_ -= os.stat(fragment_path).st_size
+        except OSError:
+            pass
+        self.write_atomically_(fragment_path, content)
+        self.size_ += len(content)
+        self.write_atomically_(self.get_path_(manifest_key, MANIFEST_SUFFIX), json.dumps(dependencies).encode())
+        if self.size_ > self.max_size_:
+            self.evict(max_size=int(self.max_size_ * EVICTION_RATIO))
+
+    @property
+    def entries(self):
+        return self.get_entries_(os.listdir(self.directory_))
+
+    @property
+    def size(self):
+        return sum(entry.size for entry in self.entries)
+
+    def evict(self, max_size=None):
+        '''Removes least recently used fragments until the cache fits into max_size bytes.
+
+        Manifests left without any fragment are removed as well.
+        '''
+        max_size = self.max_size_ if max_size is None else max_size
+        file_names = os.listdir(self.directory_)
+        entries = sorted(self.get_entries_(file_names), key=lambda entry: entry.last_used)
+        fragment_counts = Counter(self.get_manifest_key_of_(entry.file_name) for entry in entries)
+        size = sum(entry.size for entry in entries)
+        for entry in entries:
+            if size <= max_size:
+                break
+            self.remove_(entry.file_name)
+            fragment_counts[self.get_manifest_key_of_(entry.file_name)] -= 1
+            size -= entry.size
+        for file_name in file_names:
+            if file_name.endswith(MANIFEST_SUFFIX) and not fragment_counts[file_name[:-len(MANIFEST_SUFFIX)]]:
+                self.remove_(file_name)
+        self.size_ = size
+
+    def clear(self):
+        for file_name in os.listdir(self.directory_):
+            if file_name.endswith(FRAGMENT_SUFFIX) or file_name.endswith(MANIFEST_SUFFIX):
+                os.remove(path.join(self.directory_, file_name))
+        self.size_ = 0
+
+    def get_entries_(self, file_names):
+        entries = []
+        for file_name in file_names:
+            if not file_name.endswith(FRAGMENT_SUFFIX):
+                continue
+            try:
+                status = os.stat(path.join(self.directory_, file_name))
+            except FileNotFoundError:
+                continue
+            entries.append(CacheEntry(file_name=file_name, size=status.st_size, last_used=status.st_mtime))
+        return entries
+
+    def get_manifest_key_(self, tu_file_name, compiler_arguments, settings, options):
+        # settings describe how the call graph is extracted, e.g. which headers are excluded
+        return hash_text_(str(FORMAT_VERSION), path.abspath(tu_file_name), str(options), *settings, '',
+                          *compiler_arguments)
+
+    def get_fragment_key_(self, manifest_key, dependencies):
+        digests = []
+        for file_name in dependencies:
+            digest = self.get_file_digest_(file_name)
+            if not digest:
+                return None
+            digests.append(file_name)
+            digests.append(digest)
+        return '{}-{}'.format(manifest_key, hash_text_(manifest_key, *digests))
+
+    def get_manifest_key_of_(self, fragment_file_name):
+        return fragment_file_name[:-len(FRAGMENT_SUFFIX)].split('-')[0]
+
+    def get_file_digest_(self, file_name):
+        try:
+            status = os.stat(file_name)
+        except OSError:
+            return None
+        # headers are shared by many TUs, so only hash each version of a file once per session
+        signature = (status.st_mtime_ns, status.st_size)
+        cached = self.file_digests_.get(file_name)
+        if cached and cached[0] == signature:
+            return cached[1]
+        with open(file_name, 'rb') as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        self.file_digests_[file_name] = (signature, digest)
+        return digest
+
+    def get_path_(self, key, suffix):
+        return path.join(self.directory_, key + suffix)
+
+    def remove_(self, file_name):
+        try:
+            os.remove(path.join(self.directory_, file_name))
+        except FileNotFoundError:
+            pass  # evicted concurrently by another worker
+
+    def write_atomically_(self, file_name, content):
+        handle, temp_file_name = tempfile.mkstemp(dir=self.directory_)
+        with os.fdopen(handle, 'wb') as file:
+            file.write(content)
+        os.replace(temp_file_name, file_name)
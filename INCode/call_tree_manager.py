@@ -1,8 +1,20 @@
 # Copyright (C) 2020 R. Knuus
 
+from clang.cindex import TranslationUnitLoadError
 from enum import Enum
+from INCode.batch_exporter import BatchExporter
 from INCode.clang_access import ClangCallGraphAccess, ClangTUAccess, set_global_common_path
+from INCode.clang_access import DEFAULT_PARSE_OPTIONS, DEFINITION_PARSE_OPTIONS, get_changed_callable_names
+from INCode.definition_prefetcher import DEFAULT_DEPTH, DEFAULT_MAX_TUS, DefinitionPrefetcher
+from INCode.dump_writers import DUMP_FORMATS
+from INCode.identifier_index import get_index_file_name, get_mtime, IdentifierIndex, is_identifier
+from INCode.include_graph import get_include_graph_file_name, IncludeGraph
+from INCode.plantuml_exporter import PlantUmlExporter
+from INCode.project_index import FORMAT_VERSION, IndexedCallGraphAccess, is_project_index, ProjectIndex
+from INCode.statistics import Statistics
+import io
 import os
+import threading
 import warnings
 
 
@@ -27,12 +39,6 @@ def find_common_path(paths):
     return common_path
 
 
-def quote(text):
-    if not text:
-        return text
-    return '"{}"'.format(text)
-
-
 class CallTreeManagerState(Enum):
     INITIALIZED = 1
     EXTRA_ARGUMENTS_INITIALIZED = 2
@@ -43,18 +49,39 @@ class CallTreeManagerState(Enum):
 
 class CallTreeManager(object):
     ''' Manages call-tree related use cases '''
-    def __init__(self):
+    def __init__(self, cache=None):
         super(CallTreeManager, self).__init__()
+        self.cache_ = cache
         self.extra_arguments_ = ''
         self.tu_access_ = None
+        self.compilation_database_file_name_ = None
+        self.identifier_index_ = None
+        self.include_graph_ = None
+        self.include_graph_is_current_ = False
+        self.project_index_ = None
         self.call_graph_access_ = None
         self.include_system_headers_ = False
-        self.loaded_files_ = set()
+        self.exclude_patterns_ = []
+        self.parse_options_ = DEFAULT_PARSE_OPTIONS
+        self.definition_parse_options_ = DEFINITION_PARSE_OPTIONS
+        self.loaded_files_ = dict()
+        self.loading_files_ = set()
+        self.lock_ = threading.RLock()
         self.included_ = set()
         self.root_ = None
+        self.watching_ = False
+        self.file_mtimes_ = dict()
+        self.observers_ = []
+        self.prefetcher_ = None
+        self.statistics_ = Statistics()
         self.state_ = CallTreeManagerState.INITIALIZED
 
-    def set_extra_arguments(self, extra_arguments, include_system_headers=False):
+    @property
+    def statistics(self):
+        '''Parse, definition lookup and export counters and times of the session.'''
+        return self.statistics_
+
+    def set_extra_arguments(self, extra_arguments, include_system_headers=False, exclude_patterns=None):
         if self.state_ not in [CallTreeManagerState.INITIALIZED,
                                CallTreeManagerState.EXTRA_ARGUMENTS_INITIALIZED]:
             warnings.warn('Unsupported state transition from {} to {}'.format(
@@ -62,18 +89,96 @@ class CallTreeManager(object):
             return
         self.extra_arguments_ = extra_arguments
         self.include_system_headers_ = include_system_headers
+        self.exclude_patterns_ = list(exclude_patterns or [])
         self.state_ = CallTreeManagerState.EXTRA_ARGUMENTS_INITIALIZED
 
+    def set_parse_options(self, options=DEFAULT_PARSE_OPTIONS, definition_options=DEFINITION_PARSE_OPTIONS):
+        '''Sets the libclang parse options for selected TUs and for TUs parsed only to load a definition.'''
+        self.parse_options_ = options
+        self.definition_parse_options_ = definition_options
+
+    def set_prefetch(self, enabled=True, depth=DEFAULT_DEPTH, max_tus=DEFAULT_MAX_TUS):
+        '''Enables loading the definitions of callees up to depth levels below the root and expanded callables.
+
+        Prefetching is off by default. The prefetcher thread only reads and merges through the methods of the
+        manager, which hold lock_ while accessing the call graph.
+        '''
+        if self.prefetcher_:
+            self.prefetcher_.stop()
+            self.prefetcher_ = None
+        if enabled:
+            self.prefetcher_ = DefinitionPrefetcher(parse_definition=self.parse_candidates_,
+                                                    merge_definition=self.merge_candidates_,
+                                                    get_callable=self.get_callable, get_calls_of=self.get_calls_of,
+                                                    depth=depth, max_tus=max_tus)
+
+    def subscribe(self, observer):
+        '''Registers observer to be called with the names of changed callables after a refresh.'''
+        self.observers_.append(observer)
+
+    def set_watch(self, enabled=True):
+        '''Enables tracking the modification times of the loaded TUs and their includes for refresh.'''
+        self.watching_ = enabled
+        self.file_mtimes_ = dict()
+        if self.call_graph_access_:
+            self.call_graph_access_.set_keep_translation_units(enabled)
+        if enabled:
+            for file_name in self.loaded_files_:
+                self.record_mtimes_(file_name)
+
+    def refresh(self):
+        '''Re-parses the loaded TUs affected by modified files and notifies observers about changed callables.'''
+        if not self.watching_ or not self.call_graph_access_:
+            return set()
+        changed_names = set()
+        # re-parsing rebuilds the call graph, which the prefetcher thread merges definitions into concurrently
+        with self.lock_:
+            for file_name, compiler_arguments in list(self.loaded_files_.items()):
+                if not self.is_modified_(file_name):
+                    continue
+                try:
+                    old_fragment, new_fragment = self.call_graph_access_.reparse_tu(
+                        tu_file_name=file_name, compiler_arguments=compiler_arguments)
+                except (SyntaxError, OSError, TranslationUnitLoadError) as error:
+                    # most likely the file is being edited, renamed or deleted, so retry on the next refresh
+                    warnings.warn('Failed to re-parse {}: {}'.format(file_name, error))
+                    continue
+                self.record_mtimes_(file_name)
+                changed_names |= get_changed_callable_names(old_fragment, new_fragment)
+            if self.root_ and self.root_.name in self.call_graph_access_.callables:
+                self.root_ = self.call_graph_access_.get_callable(self.root_.name)
+        if changed_names:
+            self.identifier_index_ = None  # updated incrementally on the next lookup
+            self.include_graph_is_current_ = False
+            for observer in self.observers_:
+                observer(changed_names)
+        return changed_names
+
     def open(self, file_name):
+        '''Opens a compilation database, a single source file or a project index built by call_tree_indexer.'''
         if self.state_ not in [CallTreeManagerState.INITIALIZED,
                                CallTreeManagerState.EXTRA_ARGUMENTS_INITIALIZED,
                                CallTreeManagerState.READY_TO_SELECT_TU]:
             warnings.warn('Unsupported state transition from {} to {}'.format(
                 self.state_, CallTreeManagerState.READY_TO_SELECT_TU))
             return
-        self.tu_access_ = ClangTUAccess(file_name=file_name,
-                                        extra_arguments=self.extra_arguments_)
+        self.project_index_ = None
+        if is_project_index(file_name):
+            if not os.path.exists(file_name):
+                raise FileNotFoundError(file_name)
+            project_index = ProjectIndex(file_name)
+            if project_index.version != FORMAT_VERSION:
+                warnings.warn('Project index {} has an unsupported format, rebuild it'.format(file_name))
+                return
+            # the index provides the TUs and their compiler arguments like a compilation database
+            self.project_index_ = self.tu_access_ = project_index
+        else:
+            self.tu_access_ = ClangTUAccess(file_name=file_name,
+                                            extra_arguments=self.extra_arguments_)
         set_global_common_path(find_common_path(list(self.tu_access_.files)))
+        self.identifier_index_ = None
+        self.include_graph_ = None
+        self.compilation_database_file_name_ = file_name
         self.state_ = CallTreeManagerState.READY_TO_SELECT_TU
         return self.tu_access_.files.keys()
 
@@ -87,9 +192,20 @@ class CallTreeManager(object):
             warnings.warn('File {} not found in compilation database'.format(file_name))
             return
         compiler_arguments = self.tu_access_.files[file_name]
-        self.call_graph_access_ = ClangCallGraphAccess(include_system_headers=self.include_system_headers_)
-        self.call_graph_access_.parse_tu(tu_file_name=file_name, compiler_arguments=compiler_arguments)
-        self.loaded_files_.add(file_name)
+        if self.prefetcher_:
+            self.prefetcher_.clear()
+        self.loaded_files_ = dict()
+        self.file_mtimes_ = dict()
+        if self.project_index_:
+            self.call_graph_access_ = IndexedCallGraphAccess(self.project_index_)
+        else:
+            self.call_graph_access_ = ClangCallGraphAccess(include_system_headers=self.include_system_headers_,
+                                                           exclude_patterns=self.exclude_patterns_,
+                                                           parse_options=self.parse_options_, cache=self.cache_,
+                                                           statistics=self.statistics_)
+            self.call_graph_access_.set_keep_translation_units(self.watching_)
+            self.call_graph_access_.parse_tu(tu_file_name=file_name, compiler_arguments=compiler_arguments)
+        self.add_loaded_file_(file_name, compiler_arguments)
         self.state_ = CallTreeManagerState.READY_TO_SELECT_ROOT
         return self.call_graph_access_.get_callables_in(file_name)
 
@@ -101,80 +217,278 @@ class CallTreeManager(object):
             return
         self.root_ = self.call_graph_access_.get_callable(callable_name)
         self.state_ = CallTreeManagerState.READY_FOR_INTERACTIONS
+        if self.prefetcher_ and self.root_:
+            self.prefetcher_.prefetch(callable_name)
         return self.root_
 
     def load_definition(self, callable_name):
-        for file_name, compiler_arguments in self.list_tu_candidates_(callable_name).items():
-            if file_name not in self.loaded_files_:
-                self.call_graph_access_.parse_tu(tu_file_name=file_name, compiler_arguments=compiler_arguments)
-                self.loaded_files_.add(file_name)
-                callable = self.call_graph_access_.get_callable(callable_name)
-                if callable and callable.is_definition():
-                    return callable
+        return self.merge_definition_candidates(callable_name, self.parse_definition_candidates(callable_name))
+
+    def parse_definition_candidates(self, callable_name, is_cancelled=None):
+        '''Parses candidate TUs not loaded yet until one defines callable_name, without changing the call graph.
+
+        Can run in a worker thread, concurrently to other calls. Pass the result to merge_definition_candidates
+        or, if it is not needed anymore, to release_definition_candidates.
+        '''
+        if self.prefetcher_:
+            self.prefetcher_.wait_for(callable_name)
+        return self.parse_candidates_(callable_name, is_cancelled)
+
+    def merge_definition_candidates(self, callable_name, parsed):
+        '''Adds the TUs parsed by parse_definition_candidates to the call graph and returns the definition.'''
+        callable = self.merge_candidates_(callable_name, parsed)
+        if self.prefetcher_ and callable:
+            # the user is likely to expand the callees next
+            self.prefetcher_.prefetch(callable_name)
+        return callable
+
+    def release_definition_candidates(self, parsed):
+        with self.lock_:
+            for file_name, _, fragment in parsed:
+                self.loading_files_.discard(file_name)
+                if fragment:
+                    self.statistics_.merge(fragment.statistics)
+
+    def parse_candidates_(self, callable_name, is_cancelled=None):
+        self.statistics_.count('definition lookups')
+        if self.project_index_:
+            return []  # the index already holds the definitions of all TUs
+        with self.statistics_.measure('candidate search'):
+            candidates = self.list_tu_candidates_(callable_name)
+        self.statistics_.count('candidate TUs scanned', len(candidates))
+        parsed = []
+        for file_name, compiler_arguments in candidates.items():
+            if is_cancelled and is_cancelled():
+                break
+            with self.lock_:
+                if file_name in self.loaded_files_ or file_name in self.loading_files_:
+                    continue
+                self.loading_files_.add(file_name)
+            try:
+                fragment = self.call_graph_access_.load_fragment(tu_file_name=file_name,
+                                                                 compiler_arguments=compiler_arguments,
+                                                                 options=self.definition_parse_options_)
+            except Exception:
+                self.release_definition_candidates(parsed + [(file_name, compiler_arguments, None)])
+                raise
+            parsed.append((file_name, compiler_arguments, fragment))
+            callable = fragment.callables.get(callable_name)
+            if callable_name in fragment.declared and callable.is_definition():
+                break
+        self.statistics_.count('candidate TUs parsed', len(parsed))
+        return parsed
+
+    def merge_candidates_(self, callable_name, parsed):
+        with self.lock_:
+            for file_name, compiler_arguments, fragment in parsed:
+                self.loading_files_.discard(file_name)
+                if file_name not in self.loaded_files_:
+                    self.call_graph_access_.merge_fragment(fragment)
+                    self.add_loaded_file_(file_name, compiler_arguments)
+                else:
+                    self.statistics_.merge(fragment.statistics)
+            callable = self.get_callable(callable_name)
+        if callable and callable.is_definition():
+            return callable
+
+    def get_callable(self, callable_name):
+        with self.lock_:
+            return self.call_graph_access_.callables.get(callable_name)
 
     def get_calls_of(self, callable_name):
-        return self.call_graph_access_.get_calls_of(callable_name)
+        with self.lock_:
+            return self.call_graph_access_.get_calls_of(callable_name)
+
+    def get_callers_of(self, callable_name):
+        '''Returns the callers of callable_name in the loaded TUs, or in all TUs when running on a project index.'''
+        with self.lock_:
+            return self.call_graph_access_.get_callers_of(callable_name)
 
     def include(self, callable_name):
         self.included_.add(callable_name)
 
+    def is_included(self, callable_name):
+        return callable_name in self.included_
+
     def exclude(self, callable_name):
         if callable_name in self.included_:
             self.included_.remove(callable_name)
 
-    def export(self):
-        call_tree = ''
-        if self.root_.name in self.included_:
-            call_tree = ' -> ' + quote(self.root_.participant) + ': ' + self.root_.callable + '\n'
-            call_tree += 'activate {}\n'.format(quote(self.root_.participant))
-        call_tree += self.export_calls_(parent=self.root_, included_parent_name='')
-        if self.root_.name in self.included_:
-            call_tree += 'deactivate {}\n'.format(quote(self.root_.participant))
-        return '@startuml\n\n{}\n@enduml'.format(call_tree)
-
-    def export_calls_(self, parent, included_parent_name):
-        call_tree = ''
-        if parent is None:
-            return call_tree
-        parent_name = included_parent_name
-        if parent.name in self.included_:
-            parent_name = parent.participant
-        for call in self.call_graph_access_.get_calls_of(parent.name):
-            if call.name in self.included_:
-                call_tree += quote(parent_name) + ' -> ' + quote(call.participant) + ': ' + call.callable + '\n'
-                # TODO(KNR): avoid redundant activations
-                call_tree += 'activate {}\n'.format(quote(call.participant))
-            call_tree += self.export_calls_(parent=call, included_parent_name=parent_name)
-            if call.name in self.included_:
-                call_tree += 'deactivate {}\n'.format(quote(call.participant))
-        return call_tree
-
-    def dump(self, file_name, entry_point, include_system_headers=False, extra_arguments=None):
+    def export(self, stream=None):
+        '''Writes the PlantUML diagram of the included calls to stream or returns it if no stream is given.'''
+        if stream is None:
+            stream = io.StringIO()
+            self.export(stream)
+            return stream.getvalue()
+        exporter = PlantUmlExporter(get_calls_of=self.call_graph_access_.get_calls_of, included=self.included_)
+        with self.statistics_.measure('export'):
+            exporter.export(root=self.root_, stream=stream)
+        self.statistics_.count('exports')
+
+    def dump(self, file_name, entry_point, include_system_headers=False, extra_arguments=None, jobs=1,
+             exclude_patterns=None, stream=None, format='text', max_depth=None):
+        '''Parses all TUs and writes the call tree of entry_point to stream while walking it.
+
+        Returns the dump instead if no stream is given.
+        '''
+        self.parse_all(file_name=file_name, include_system_headers=include_system_headers,
+                       extra_arguments=extra_arguments, jobs=jobs, exclude_patterns=exclude_patterns)
+        return self.write_dump(entry_point=entry_point, stream=stream, format=format, max_depth=max_depth)
+
+    def parse_all(self, file_name, include_system_headers=False, extra_arguments=None, jobs=1,
+                  exclude_patterns=None):
+        '''Parses all TUs, so write_dump can write the call tree of any entry point without parsing again.
+
+        A project index built by call_tree_indexer is queried instead of parsing.
+        '''
+        if is_project_index(file_name):
+            if not os.path.exists(file_name):
+                raise FileNotFoundError(file_name)
+            project_index = ProjectIndex(file_name)
+            if project_index.version != FORMAT_VERSION:
+                raise ValueError('Project index {} has an unsupported format, rebuild it'.format(file_name))
+            set_global_common_path(find_common_path(list(project_index.files)))
+            self.call_graph_access_ = IndexedCallGraphAccess(project_index)
+            return
         tu_access = ClangTUAccess(file_name=file_name, extra_arguments=extra_arguments)
-        self.call_graph_access_ = ClangCallGraphAccess(include_system_headers=include_system_headers)
-        for file_name, compiler_arguments in tu_access.files.items():
-            self.call_graph_access_.parse_tu(tu_file_name=file_name, compiler_arguments=compiler_arguments)
+        set_global_common_path(find_common_path(list(tu_access.files)))
+        self.call_graph_access_ = ClangCallGraphAccess(include_system_headers=include_system_headers,
+                                                       exclude_patterns=exclude_patterns,
+                                                       parse_options=self.parse_options_, cache=self.cache_,
+                                                       statistics=self.statistics_)
+        self.call_graph_access_.parse_tus(files=tu_access.files, jobs=jobs)
+
+    def write_dump(self, entry_point, stream=None, format='text', max_depth=None):
+        '''Writes the call tree of entry_point to stream, or returns it if no stream is given.'''
         root = self.call_graph_access_.get_callable(entry_point)
-        return self.dump_callable_(root, 0)
+        if stream is None:
+            stream = io.StringIO()
+            self.write_dump_(root, stream, format, max_depth)
+            return stream.getvalue()
+        self.write_dump_(root, stream, format, max_depth)
+
+    def export_batch(self, roots, output_directory, jobs=1):
+        '''Writes one PlantUML diagram per root of the graph loaded by parse_all, in up to jobs worker processes.
+
+        Returns the names of the written files.
+        '''
+        exporter = BatchExporter(get_calls_of=self.call_graph_access_.get_calls_of,
+                                 get_callable=self.call_graph_access_.callables.get)
+        with self.statistics_.measure('batch export'):
+            file_names = exporter.export(roots=roots, output_directory=output_directory, jobs=jobs)
+        self.statistics_.count('exports', len(file_names))
+        return file_names
+
+    def write_dump_(self, root, stream, format, max_depth):
+        writer = DUMP_FORMATS[format](stream)
+        with self.statistics_.measure('dump'):
+            writer.begin(root)
+            for level, caller, callee, is_cycle in self.walk_calls_(root, max_depth, writer.expand_once):
+                writer.write_call(level, caller, callee, is_cycle)
+            writer.end()
+
+    def walk_calls_(self, root, max_depth=None, expand_once=False):
+        '''Yields the calls below root depth-first as (level, caller, callee, is_cycle).
+
+        Calls of a callable already on the current path are yielded as cycle without descending into them.
+        If expand_once is set, the calls of each callable are only walked the first time it is reached.
+        '''
+        if max_depth is not None and max_depth <= 0:
+            return
+        expanded = {root.name}
+        path = [root]
+        path_names = {root.name}
+        stack = [iter(self.call_graph_access_.get_calls_of(root.name))]
+        while stack:
+            for callee in stack[-1]:
+                is_cycle = callee.name in path_names
+                yield len(stack), path[-1], callee, is_cycle
+                if is_cycle or (max_depth is not None and len(stack) >= max_depth):
+                    continue
+                if expand_once:
+                    if callee.name in expanded:
+                        continue
+                    expanded.add(callee.name)
+                path.append(callee)
+                path_names.add(callee.name)
+                stack.append(iter(self.call_graph_access_.get_calls_of(callee.name)))
+                break
+            else:
+                stack.pop()
+                path_names.discard(path.pop().name)
 
     def list_tu_candidates_(self, callable_name):
-        callable = self.call_graph_access_.get_callable(callable_name)
+        with self.lock_:
+            callable = self.call_graph_access_.get_callable(callable_name)
         assert callable  # TODO(KNR): be nicer
 
         search_key = callable.get_spelling()
-        tu_candidates = {file_name: compiler_arguments
-                         for file_name, compiler_arguments in self.tu_access_.files.items()
-                         if find_text_in_file_(file_name=file_name, text=search_key)}
+        # only look up the compiler arguments of candidates, as they are tokenized on first access
+        if is_identifier(search_key):
+            matching_files = self.get_identifier_index_().find(search_key)
+        else:
+            # e.g. operators and destructors are not single identifier tokens
+            indexed_files = self.get_indexed_files_()
+            self.statistics_.count('files searched for text', len(indexed_files))
+            matching_files = {file_name for file_name in indexed_files
+                              if find_text_in_file_(file_name=file_name, text=search_key)}
+        tu_candidates = {file_name: self.tu_access_.files[file_name]
+                         for file_name in self.tu_access_.files
+                         if file_name in matching_files}
         # TODO(KNR): figure out how to avoid Decorate-Sort-Undecorate idiom
         decorated = [(rate_path_commonality_(callable.used_in_file, file_name), file_name, compiler_arguments)
                      for file_name, compiler_arguments in tu_candidates.items()]
         decorated.sort(reverse=True)
         tu_candidates = {file_name: compiler_arguments for _, file_name, compiler_arguments in decorated}
-        return tu_candidates
-
-    def dump_callable_(self, callable, level):
-        indentation = level * '  '
-        call_tree = '{}{}\n'.format(indentation, callable.name)
-        for call in self.call_graph_access_.get_calls_of(callable.name):
-            call_tree += self.dump_callable_(call, level + 1)
-        return call_tree
+        # a definition in a header is found fastest by parsing the cheapest TU including it
+        return {**self.list_header_tu_candidates_(matching_files), **tu_candidates}
+
+    def list_header_tu_candidates_(self, matching_files):
+        include_graph = self.get_include_graph_()
+        # headers reached by loaded TUs cannot contain the definition, otherwise it would have been found already
+        reached = set()
+        with self.lock_:
+            for file_name in self.loaded_files_:
+                reached.update(self.call_graph_access_.get_dependencies(file_name))
+        decorated = []
+        for header in matching_files:
+            tu_file_name, cost = include_graph.find_cheapest_tu(header)
+            if tu_file_name and header not in reached:
+                decorated.append((cost, tu_file_name))
+        decorated.sort()
+        return {tu_file_name: self.tu_access_.files[tu_file_name] for _, tu_file_name in decorated}
+
+    def add_loaded_file_(self, file_name, compiler_arguments):
+        self.loaded_files_[file_name] = compiler_arguments
+        if self.watching_:
+            self.record_mtimes_(file_name)
+
+    def record_mtimes_(self, file_name):
+        self.file_mtimes_[file_name] = {dependency: get_mtime(dependency)
+                                        for dependency in self.call_graph_access_.get_dependencies(file_name)}
+
+    def is_modified_(self, file_name):
+        return any(get_mtime(dependency) != mtime for dependency, mtime in self.file_mtimes_[file_name].items())
+
+    def get_identifier_index_(self):
+        # built lazily on the first lookup after opening a compilation database to keep open() fast
+        with self.lock_:
+            if self.identifier_index_ is None:
+                identifier_index = IdentifierIndex(get_index_file_name(self.compilation_database_file_name_))
+                identifier_index.update(self.get_indexed_files_())
+                self.identifier_index_ = identifier_index
+            return self.identifier_index_
+
+    def get_include_graph_(self):
+        with self.lock_:
+            if self.include_graph_ is None:
+                self.include_graph_ = IncludeGraph(get_include_graph_file_name(self.compilation_database_file_name_))
+                self.include_graph_is_current_ = False
+            if not self.include_graph_is_current_:
+                # only re-scans files modified since the last update
+                self.include_graph_.update(self.tu_access_.files)
+                self.include_graph_is_current_ = True
+            return self.include_graph_
+
+    def get_indexed_files_(self):
+        return set(self.tu_access_.files.keys()) | set(self.get_include_graph_().headers)
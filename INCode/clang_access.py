@@ -1,15 +1,24 @@
 # Copyright (C) 2020 R. Knuus
 
-from clang.cindex import Cursor, CursorKind, Index
+from clang.cindex import Cursor, CursorKind, Index, SourceLocation, TranslationUnit
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
+from INCode.compilation_database import CompilationDatabase
+from INCode.statistics import Statistics
 from os import path
-import json
-import os
-import re
+from types import MappingProxyType
 import shlex
+import sys
 
 
 GLOBAL_COMMON_PATH = ''
+# older libclang bindings cannot tell whether a location is in a system header
+HAS_SYSTEM_HEADER_LOCATIONS = hasattr(SourceLocation, 'is_in_system_header')
+DEFAULT_PARSE_OPTIONS = TranslationUnit.PARSE_NONE
+# TUs parsed to find a definition are only searched, so skip instantiating pending templates at their end
+DEFINITION_PARSE_OPTIONS = TranslationUnit.PARSE_INCOMPLETE
+WORKER_ACCESS = None
 
 
 def set_global_common_path(path):
@@ -19,6 +28,17 @@ def set_global_common_path(path):
         GLOBAL_COMMON_PATH += '/'
 
 
+def get_parse_options(names):
+    '''Converts option names like 'precompiled-preamble' into libclang parse option flags.'''
+    options = TranslationUnit.PARSE_NONE
+    for name in names:
+        attribute = 'PARSE_' + name.upper().replace('-', '_')
+        if not hasattr(TranslationUnit, attribute):
+            raise ValueError('Unknown parse option {}'.format(name))
+        options |= getattr(TranslationUnit, attribute)
+    return options
+
+
 clang_severity_str = {
     0: 'Ignored',
     1: 'Note',
@@ -28,10 +48,27 @@ clang_severity_str = {
 }
 
 
-def get_file_name(diag_or_ast_node):
+def get_working_directory(compiler_arguments):
+    '''Returns the directory relative paths of compiler_arguments are resolved against, None if not given.'''
+    for index, argument in enumerate(compiler_arguments):
+        if argument == '-working-directory' and index + 1 < len(compiler_arguments):
+            return compiler_arguments[index + 1]
+        if argument.startswith('-working-directory='):
+            return argument[len('-working-directory='):]
+    return None
+
+
+def resolve_file_name(file_name, directory):
+    '''Returns file_name relative to directory as normalized path, libclang reports it as passed to the compiler.'''
+    if not file_name or not directory or path.isabs(file_name):
+        return file_name
+    return path.normpath(path.join(directory, file_name))
+
+
+def get_file_name(diag_or_ast_node, directory=None):
     if diag_or_ast_node is None or diag_or_ast_node.location is None or diag_or_ast_node.location.file is None:
         return ''
-    return diag_or_ast_node.location.file.name
+    return resolve_file_name(diag_or_ast_node.location.file.name, directory)
 
 
 def get_diagnostic_message(diag):
@@ -41,135 +78,445 @@ def get_diagnostic_message(diag):
         file, diag.location.line, diag.location.column)
 
 
-def qualify_name(cursor):
+def qualify_name(cursor, qualified_names=None):
+    '''Returns the name of cursor prefixed by the names of its semantic parents.
+
+    If given, qualified_names memoizes the interned names by USR, so names of shared namespaces and classes are
+    computed only once.
+    '''
     if cursor is None or type(cursor) != Cursor or cursor.kind == CursorKind.TRANSLATION_UNIT:
         return ''
-    qualifier = qualify_name(cursor.semantic_parent)
+    usr = None
+    if qualified_names is not None:
+        usr = cursor.get_usr()
+        if usr in qualified_names:
+            return qualified_names[usr]
+    qualifier = qualify_name(cursor.semantic_parent, qualified_names)
     if qualifier != '':
         qualifier += '::'
-    return qualifier + cursor.displayname
+    name = sys.intern(qualifier + cursor.displayname)
+    if usr:
+        qualified_names[usr] = name
+    return name
 
 
 class Callable(object):
-    def __init__(self, cursor):
+    '''Value record of a callable, detached from the translation unit it was extracted from.
+
+    Participant is None for free functions, whose participant is the file they are used in.
+    '''
+    __slots__ = ('name_', 'spelling_', 'callable_', 'file_name_', 'used_in_file_', 'participant_',
+                 'is_definition_', 'usr_')
+
+    def __init__(self, name, spelling, callable, file_name, used_in_file, participant, is_definition, usr):
         super(Callable, self).__init__()
-        self.cursor_ = cursor
+        self.name_ = name
+        self.spelling_ = spelling
+        self.callable_ = callable
+        self.file_name_ = file_name
+        self.used_in_file_ = used_in_file
+        self.participant_ = participant
+        self.is_definition_ = is_definition
+        self.usr_ = usr
+
+    @classmethod
+    def from_cursor(cls, cursor, qualified_names=None, directory=None):
+        participant = None
+        if cursor.kind != CursorKind.FUNCTION_DECL:
+            participant = qualify_name(cursor.semantic_parent, qualified_names)
+        return cls(name=qualify_name(cursor, qualified_names),
+                   spelling=cursor.spelling,
+                   callable=cursor.displayname,
+                   file_name=get_file_name(cursor, directory),
+                   used_in_file=cursor.translation_unit.spelling,
+                   participant=participant,
+                   is_definition=cursor.is_definition(),
+                   usr=cursor.get_usr())
+
+    def __eq__(self, other):
+        if not isinstance(other, Callable):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def __hash__(self):
+        return hash((self.name_, self.file_name_, self.used_in_file_, self.is_definition_))
+
+    def __repr__(self):
+        return 'Callable({!r}, file_name={!r}, is_definition={!r})'.format(self.name_, self.file_name_,
+                                                                           self.is_definition_)
 
     @property
     def name(self):
-        return qualify_name(self.cursor_)
+        return self.name_
 
     @property
     def file_name(self):
-        return get_file_name(self.cursor_)
+        return self.file_name_
 
     @property
     def used_in_file(self):
-        return self.cursor_.translation_unit.spelling
+        return self.used_in_file_
 
     @property
     def participant(self):
-        if self.cursor_.kind == CursorKind.FUNCTION_DECL:
+        if self.participant_ is None:
             return self.used_in_file.replace(GLOBAL_COMMON_PATH, '')
-        return qualify_name(self.cursor_.semantic_parent)
+        return self.participant_
+
+    @property
+    def raw_participant(self):
+        '''The participant as extracted, None for free functions.'''
+        return self.participant_
 
     @property
     def callable(self):
-        return self.cursor_.displayname
+        return self.callable_
 
     def get_spelling(self):
-        return self.cursor_.spelling
+        return self.spelling_
+
+    @property
+    def usr(self):
+        return self.usr_
 
     def is_definition(self):
-        return self.cursor_.is_definition()
+        return self.is_definition_
+
+
+class CallGraphFragment(object):
+    '''Call graph extracted from a single TU, ready to be merged into a ClangCallGraphAccess.'''
+    def __init__(self, tu_file_name):
+        super(CallGraphFragment, self).__init__()
+        self.tu_file_name = tu_file_name
+        self.dependencies = []
+        self.callables = dict()
+        self.declared = set()
+        self.calls_of = defaultdict(list)
+        self.callers_of = defaultdict(dict)  # used as ordered set of caller names
+        self.statistics = None  # of the parse or cache lookup the fragment was loaded by
+
+
+def get_changed_callable_names(old_fragment, new_fragment):
+    '''Returns the names of callables declared differently or calling differently in new_fragment.'''
+    old_callables = old_fragment.callables if old_fragment else {}
+    old_declared = old_fragment.declared if old_fragment else set()
+    old_calls_of = old_fragment.calls_of if old_fragment else {}
+    changed_names = set()
+    for name in old_declared | new_fragment.declared:
+        if old_callables.get(name) != new_fragment.callables.get(name):
+            changed_names.add(name)
+    for name in set(old_calls_of) | set(new_fragment.calls_of):
+        if old_calls_of.get(name, []) != new_fragment.calls_of.get(name, []):
+            changed_names.add(name)
+    return changed_names
+
+
+def init_worker_(include_system_headers, exclude_patterns, parse_options, cache):
+    global WORKER_ACCESS
+    # one access per worker process, so its TUs share the index, the memoized qualified names and the cache,
+    # whose size is only counted once
+    WORKER_ACCESS = ClangCallGraphAccess(include_system_headers=include_system_headers,
+                                         exclude_patterns=exclude_patterns, parse_options=parse_options, cache=cache)
+
+
+def load_fragment_(tu_file_name, compiler_arguments):
+    '''Worker entry point of ClangCallGraphAccess.parse_tus, must be picklable.'''
+    return WORKER_ACCESS.load_fragment(tu_file_name=tu_file_name, compiler_arguments=compiler_arguments)
 
 
 class ClangCallGraphAccess(object):
-    '''Constructs a call tree from given TUs.'''
-    def __init__(self, include_system_headers=False):
+    '''Constructs a call tree from given TUs.
+
+    Subtrees of the AST located in system headers or in files matching one of the exclude patterns are skipped.
+    A pattern is either a path prefix or a shell-style wildcard pattern.
+
+    The fragment of each TU is kept, so a modified TU can be re-parsed and its callables and calls replaced.
+    Parse times and counts are collected in statistics, which can be shared with the owner of the access.
+    '''
+    def __init__(self, include_system_headers=False, exclude_patterns=None, parse_options=DEFAULT_PARSE_OPTIONS,
+                 cache=None, statistics=None):
         super(ClangCallGraphAccess, self).__init__()
         self.calls_of_ = defaultdict(list)
+        self.callers_of_ = defaultdict(dict)
         self.callables_ = dict()
+        self.callables_view_ = MappingProxyType(self.callables_)
+        self.callables_in_ = defaultdict(dict)
         self.include_system_headers_ = include_system_headers
+        self.exclude_patterns_ = list(exclude_patterns or [])
+        self.parse_options_ = parse_options
+        self.cache_ = cache
+        self.index_ = None
+        self.qualified_names_ = dict()
+        self.fragments_ = dict()
+        self.keep_translation_units_ = False
+        self.translation_units_ = dict()
+        self.statistics_ = statistics if statistics is not None else Statistics()
+
+    @property
+    def statistics(self):
+        return self.statistics_
+
+    def set_keep_translation_units(self, keep):
+        '''Keeps TUs parsed from now on alive, so reparse_tu can use libclang's faster reparse.'''
+        self.keep_translation_units_ = keep
+        if not keep:
+            self.translation_units_.clear()
 
-    def parse_tu(self, tu_file_name, compiler_arguments):
+    @property
+    def index(self):
+        # created on first use, so a session served from the cache never loads libclang's index
+        if self.index_ is None:
+            self.index_ = Index.create()
+        return self.index_
+
+    def parse_tu(self, tu_file_name, compiler_arguments, options=None):
+        '''Parses a TU with the given libclang parse options, or with the default options of the session.'''
+        self.merge_fragment(self.load_fragment(tu_file_name=tu_file_name, compiler_arguments=compiler_arguments,
+                                               options=options))
+
+    def parse_tus(self, files, jobs=1):
+        '''Parses all TUs of the files dictionary, in up to jobs worker processes.
+
+        Fragments are merged in the order of files, so the result is identical to calling parse_tu one by one.
+        '''
+        for fragment in self.iter_fragments(files=files, jobs=jobs):
+            self.merge_fragment(fragment)
+
+    def iter_fragments(self, files, jobs=1):
+        '''Yields the fragments of all TUs of the files dictionary in its order, without merging them.'''
+        if jobs <= 1 or len(files) <= 1:
+            for tu_file_name, compiler_arguments in files.items():
+                yield self.load_fragment(tu_file_name=tu_file_name, compiler_arguments=compiler_arguments)
+            return
+        initargs = (self.include_system_headers_, self.exclude_patterns_, self.parse_options_, self.cache_)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker_, initargs=initargs) as executor:
+            yield from executor.map(load_fragment_, files.keys(), files.values())
+
+    def extract_fragment(self, tu_file_name, compiler_arguments, options=None):
         if not path.exists(tu_file_name):
             raise FileNotFoundError(tu_file_name)
-        index = Index.create()
-        tu = index.parse(tu_file_name, compiler_arguments)
+        options = self.parse_options_ if options is None else options
+        statistics = Statistics()
+        with statistics.measure('parsing', tu_file_name):
+            tu = self.index.parse(tu_file_name, compiler_arguments, options=options)
         assert tu
+        fragment = self.extract_fragment_from_tu_(tu, tu_file_name, compiler_arguments, statistics)
+        if self.keep_translation_units_:
+            self.translation_units_[tu_file_name] = (tu, options)
+        # otherwise the fragment holds no cursors, so the TU and its AST are released when returning
+        return fragment
+
+    def reparse_tu(self, tu_file_name, compiler_arguments, options=None):
+        '''Re-parses a modified TU and replaces its callables and calls.
+
+        Returns the replaced and the new fragment of the TU.
+        '''
+        tu, tu_options = self.translation_units_.get(tu_file_name, (None, None))
+        if tu is None:
+            fragment = self.load_fragment(tu_file_name=tu_file_name, compiler_arguments=compiler_arguments,
+                                          options=options)
+        else:
+            statistics = Statistics()
+            with statistics.measure('parsing', tu_file_name):
+                tu.reparse()
+            fragment = self.extract_fragment_from_tu_(tu, tu_file_name, compiler_arguments, statistics)
+            # libclang re-parses with the options the TU was parsed with first
+            self.store_fragment_(tu_file_name, compiler_arguments, tu_options, fragment)
+        old_fragment = self.fragments_.get(tu_file_name)
+        self.fragments_[tu_file_name] = fragment
+        self.statistics_.merge(fragment.statistics)
+        self.rebuild_()
+        return old_fragment, fragment
+
+    def get_dependencies(self, tu_file_name):
+        '''Returns the TU file and all files it includes.'''
+        if tu_file_name not in self.fragments_:
+            return []
+        return [tu_file_name] + self.fragments_[tu_file_name].dependencies
 
+    def extract_fragment_from_tu_(self, tu, tu_file_name, compiler_arguments, statistics=None):
         error_messages = [get_diagnostic_message(d) for d in tu.diagnostics
                           if d.severity in [d.Error, d.Fatal]]
         if len(error_messages) > 0:
             raise SyntaxError('\n'.join(error_messages))
 
-        self.exclude_prefixes_ = []
+        # extraction state is kept local, so several TUs can be extracted in concurrent threads
+        # file names of a TU parsed in another working directory are relative to it, e.g. of headers found by -I
+        directory = get_working_directory(compiler_arguments)
+        exclude_prefixes = list(self.exclude_patterns_)
         if not self.include_system_headers_:
-            self.exclude_prefixes_ = self.get_system_header_exclude_prefixes_(compiler_arguments)
-
-        self.build_tree_(ast_node=tu.cursor, parent_node=None)
+            exclude_prefixes += [resolve_file_name(prefix, directory)
+                                 for prefix in self.get_system_header_exclude_prefixes_(compiler_arguments)]
+
+        fragment = CallGraphFragment(tu_file_name)
+        fragment.statistics = statistics or Statistics()
+        fragment.dependencies = [resolve_file_name(inclusion.include.name, directory)
+                                 for inclusion in tu.get_includes()]
+        with fragment.statistics.measure('traversal', tu_file_name):
+            visited = self.build_tree_(ast_node=tu.cursor, parent_node=None, fragment=fragment,
+                                       exclude_prefixes=exclude_prefixes, directory=directory)
+        fragment.statistics.count('TUs parsed')
+        fragment.statistics.count('cursors visited', visited)
+        return fragment
+
+    def load_fragment(self, tu_file_name, compiler_arguments, options=None):
+        '''Returns the fragment of a TU from the cache or by parsing it, without merging it.'''
+        if self.cache_ is None:
+            return self.extract_fragment(tu_file_name=tu_file_name, compiler_arguments=compiler_arguments,
+                                         options=options)
+        # e.g. a TU parsed incompletely to find a definition must not be served as a complete parse later
+        options = self.parse_options_ if options is None else options
+        fragment = self.cache_.load(tu_file_name=tu_file_name, compiler_arguments=compiler_arguments,
+                                    settings=self.get_cache_settings_(), options=options)
+        if fragment is None:
+            fragment = self.extract_fragment(tu_file_name=tu_file_name, compiler_arguments=compiler_arguments,
+                                             options=options)
+            self.store_fragment_(tu_file_name, compiler_arguments, options, fragment)
+        else:
+            # replaces the statistics of the parse the fragment was cached by
+            fragment.statistics = Statistics()
+            fragment.statistics.count('TUs loaded from cache')
+        return fragment
+
+    def store_fragment_(self, tu_file_name, compiler_arguments, options, fragment):
+        if self.cache_ is None:
+            return
+        self.cache_.store(tu_file_name=tu_file_name, compiler_arguments=compiler_arguments,
+                          settings=self.get_cache_settings_(), options=options, fragment=fragment,
+                          dependencies=fragment.dependencies)
+
+    def get_cache_settings_(self):
+        return [str(self.include_system_headers_)] + self.exclude_patterns_
+
+    def merge_fragment(self, fragment):
+        self.fragments_[fragment.tu_file_name] = fragment
+        known_callable_count = len(self.callables_)
+        self.apply_fragment_(fragment)
+        self.statistics_.merge(fragment.statistics)
+        self.statistics_.count('callables added', len(self.callables_) - known_callable_count)
+        self.statistics_.count('calls added', sum(len(calls) for calls in fragment.calls_of.values()))
+
+    def rebuild_(self):
+        self.callables_.clear()
+        self.callables_in_.clear()
+        self.calls_of_.clear()
+        self.callers_of_.clear()
+        for fragment in self.fragments_.values():
+            self.apply_fragment_(fragment)
+
+    def apply_fragment_(self, fragment):
+        # callables declared in the TU replace known ones, merely referenced ones are only added if unknown
+        for name, callable in fragment.callables.items():
+            if name in fragment.declared or name not in self.callables_:
+                self.set_callable_(name, callable)
+        for caller_name, calls in fragment.calls_of.items():
+            self.calls_of_[caller_name].extend(calls)
+        for callee_name, caller_names in fragment.callers_of.items():
+            self.callers_of_[callee_name].update(caller_names)
+
+    def set_callable_(self, name, callable):
+        # keeps the per-file index in sync when a declaration is replaced by one in another file
+        known_callable = self.callables_.get(name)
+        if known_callable is not None and known_callable.file_name != callable.file_name:
+            del self.callables_in_[known_callable.file_name][name]
+        self.callables_[name] = callable
+        self.callables_in_[callable.file_name][name] = callable
 
     @property
     def callables(self):
-        return {name: Callable(callable) for name, callable in self.callables_.items()}
+        '''Read-only view of all known callables by name, kept up to date while parsing further TUs.'''
+        return self.callables_view_
 
     def get_callable(self, callable_name):
-        return Callable(self.callables_[callable_name])
+        return self.callables_[callable_name]
 
     def get_callables_in(self, file_name):
-        return [callable for callable in self.callables.values() if callable.file_name == file_name]
+        if file_name not in self.callables_in_:
+            return []
+        return list(self.callables_in_[file_name].values())
 
     def get_calls_of(self, callable_name):
         if callable_name not in self.calls_of_:
             return []
-        return [Callable(child) for child in self.calls_of_[callable_name]]
-
-    def build_tree_(self, ast_node, parent_node, depth=0):
-        if ast_node.kind == CursorKind.FUNCTION_DECL or ast_node.kind == CursorKind.CXX_METHOD:
-            name = qualify_name(ast_node)
-            self.callables_[name] = ast_node
-            parent_node = ast_node
-        if ast_node.kind == CursorKind.CALL_EXPR and ast_node.referenced:
-            caller_name = qualify_name(parent_node)
-            self.calls_of_[caller_name].append(ast_node.referenced)
-            callee_name = qualify_name(ast_node.referenced)
-            if callee_name not in self.callables_:
-                self.callables_[callee_name] = ast_node.referenced
-        for child_ast_node in ast_node.get_children():
-            self.build_tree_(ast_node=child_ast_node, parent_node=parent_node, depth=depth + 1)
+        return list(self.calls_of_[callable_name])
+
+    def get_callers_of(self, callable_name):
+        '''Returns the callables calling callable_name in the TUs parsed so far, each once.'''
+        if callable_name not in self.callers_of_:
+            return []
+        return [self.callables_[caller_name] for caller_name in self.callers_of_[callable_name]
+                if caller_name in self.callables_]
+
+    def build_tree_(self, ast_node, parent_node, fragment, exclude_prefixes=(), directory=None):
+        '''Adds the callables and calls below ast_node to fragment and returns the number of cursors visited.'''
+        # pre-order traversal with an explicit stack to neither hit the recursion limit on deeply nested code
+        # nor descend into excluded subtrees
+        callees = dict()  # all calls of the same declaration share one record, keyed by cursor hash
+        excluded_files = dict()
+        visited = 0
+        stack = [(ast_node, parent_node)]
+        while stack:
+            ast_node, parent_node = stack.pop()
+            visited += 1
+            if self.should_exclude_node_(ast_node, exclude_prefixes, excluded_files, directory):
+                continue
+            if ast_node.kind == CursorKind.FUNCTION_DECL or ast_node.kind == CursorKind.CXX_METHOD:
+                callable = Callable.from_cursor(ast_node, self.qualified_names_, directory)
+                fragment.callables[callable.name] = callable
+                fragment.declared.add(callable.name)
+                parent_node = ast_node
+            referenced = ast_node.referenced if ast_node.kind == CursorKind.CALL_EXPR else None
+            if referenced:
+                caller_name = qualify_name(parent_node, self.qualified_names_)
+                if referenced.hash not in callees or callees[referenced.hash][0] != referenced:
+                    callees[referenced.hash] = (referenced,
+                                                Callable.from_cursor(referenced, self.qualified_names_, directory))
+                callee = callees[referenced.hash][1]
+                fragment.calls_of[caller_name].append(callee)
+                fragment.callers_of[callee.name][caller_name] = None
+                if callee.name not in fragment.callables:
+                    fragment.callables[callee.name] = callee
+            children = list(ast_node.get_children())
+            stack.extend((child_ast_node, parent_node) for child_ast_node in reversed(children))
+        return visited
 
     def get_system_header_exclude_prefixes_(self, compiler_arguments):
-        # -isystem <path>
+        # -isystem <path> or -isystem<path>
         exclude_prefixes = []
-        for i in range(len(compiler_arguments)-1):
-            if compiler_arguments[i] == 'isystem':
+        for i in range(len(compiler_arguments)):
+            if compiler_arguments[i] == '-isystem' and i + 1 < len(compiler_arguments):
                 exclude_prefixes.append(compiler_arguments[i + 1])
+            elif compiler_arguments[i].startswith('-isystem') and len(compiler_arguments[i]) > len('-isystem'):
+                exclude_prefixes.append(compiler_arguments[i][len('-isystem'):])
         return exclude_prefixes
 
-    def should_exclude_(self, file_name):
-        for pattern in self.exclude_prefixes_:
-            if file_name.startswith(pattern):
+    def should_exclude_node_(self, ast_node, exclude_prefixes, excluded_files, directory=None):
+        location = ast_node.location
+        if location is None or location.file is None:
+            return False
+        if not self.include_system_headers_ and HAS_SYSTEM_HEADER_LOCATIONS and location.is_in_system_header:
+            return True
+        file_name = location.file.name
+        if file_name not in excluded_files:
+            excluded_files[file_name] = self.should_exclude_(resolve_file_name(file_name, directory),
+                                                             exclude_prefixes)
+        return excluded_files[file_name]
+
+    def should_exclude_(self, file_name, exclude_prefixes):
+        for pattern in exclude_prefixes:
+            if file_name.startswith(pattern) or fnmatch(file_name, pattern):
                 return True
         return False
 
 
-def filter_redundant_file_name_(file_name, command):
-    dash_c_option_pattern = re.compile('(-c\\s+{})'.format(file_name))
-    command_string = ' '.join(command)
-    match = dash_c_option_pattern.search(command_string)
-    if match:
-        return shlex.split(command_string.replace(match.group(0), ''))
-    return command
-
-
 class ClangTUAccess(object):
     '''Returns files and their compiler arguments from a compilation database.'''
     def __init__(self, file_name, extra_arguments=None):
         super(ClangTUAccess, self).__init__()
         args = extra_arguments or ''
-        args = shlex.split(args)
-        self.extra_arguments_ = args
+        if isinstance(args, str):
+            args = shlex.split(args)
+        self.extra_arguments_ = list(args)
         self.files_ = self.collect_files_(file_name)
 
     @property
@@ -182,21 +529,4 @@ class ClangTUAccess(object):
         if not file_name.endswith('compile_commands.json'):
             # TODO(KNR): might have to filter redundant file name from compiler arguments
             return {file_name: self.extra_arguments_}
-
-        with open(file_name) as compdb:
-            db = json.load(compdb)
-        extra = self.extra_arguments_ if self.extra_arguments_ else []
-
-        # arbitrarily change to first directory to handle relative paths
-        # which only works as long as all directories are identical
-        # so verify that this is the case
-        if len(db) > 0 and 'directory' in db[0]:
-            directory = db[0]['directory']
-            all_directories = {item['directory'] for item in db}
-            # if the following assertion fails not all directories are identical
-            # we have to change directories on a per-file basis
-            assert len(all_directories) == 1
-            os.chdir(directory)
-
-        return {entry['file']: filter_redundant_file_name_(entry['file'], shlex.split(entry['command']) + extra)
-                for entry in db}
+        return CompilationDatabase(file_name, extra_arguments=self.extra_arguments_)
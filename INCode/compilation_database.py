@@ -0,0 +1,112 @@
+# Copyright (C) 2020 R. Knuus
+
+from collections.abc import Mapping
+from os import path
+import json
+import shlex
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE):
+    '''Yields the elements of the JSON array in file one by one without loading the whole array at once.'''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    at_end = False
+    while True:
+        # skip whitespace and separators until the next element starts
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if not started and position < len(buffer):
+            if buffer[position] != '[':
+                raise ValueError('compilation database is not a JSON array')
+            started = True
+            position += 1
+            continue
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            # the element is not complete yet
+            if at_end:
+                raise
+            chunk = file.read(chunk_size)
+            at_end = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield element
+        position = end
+
+
+def remove_file_arguments_(file_name, arguments):
+    '''Removes the compiler executable and the compiled file, which libclang does not expect as arguments.'''
+    if arguments and not arguments[0].startswith('-'):
+        arguments = arguments[1:]
+    result = []
+    skip_next = False
+    for index, argument in enumerate(arguments):
+        if skip_next:
+            skip_next = False
+            continue
+        if argument == '-c' and index + 1 < len(arguments) and arguments[index + 1] == file_name:
+            skip_next = True
+            continue
+        if argument == file_name:
+            continue
+        result.append(argument)
+    return result
+
+
+class CompilationDatabase(Mapping):
+    '''Maps the files of a compile_commands.json to their compiler arguments.
+
+    The database is read entry by entry and only indexed by file, arguments are tokenized on first access.
+    Relative paths are resolved against the directory of each entry, which is passed on to clang as working
+    directory instead of changing the working directory of the process.
+    '''
+    def __init__(self, file_name, extra_arguments=None):
+        super(CompilationDatabase, self).__init__()
+        self.extra_arguments_ = list(extra_arguments or [])
+        self.entries_ = dict()
+        self.arguments_ = dict()
+        with open(file_name) as compdb:
+            for entry in iter_json_array(compdb):
+                directory = entry.get('directory')
+                file = entry['file']
+                if directory:
+                    file = path.normpath(path.join(directory, file))
+                self.entries_[file] = (entry['file'], directory, entry.get('arguments'), entry.get('command'))
+
+    def __getitem__(self, file_name):
+        arguments = self.arguments_.get(file_name)
+        if arguments is None:
+            arguments = self.tokenize_(*self.entries_[file_name])
+            self.arguments_[file_name] = arguments
+        return arguments
+
+    def __contains__(self, file_name):
+        return file_name in self.entries_
+
+    def __iter__(self):
+        return iter(self.entries_)
+
+    def __len__(self):
+        return len(self.entries_)
+
+    def get_raw_arguments(self, file_name):
+        '''Returns the compiler arguments of file_name as written in the database, without tokenizing them.'''
+        file, directory, arguments, command = self.entries_[file_name]
+        return json.dumps([directory, arguments, command, self.extra_arguments_])
+
+    def tokenize_(self, file, directory, arguments, command):
+        if arguments is None:
+            arguments = shlex.split(command or '')
+        arguments = remove_file_arguments_(file, arguments)
+        if directory:
+            arguments = ['-working-directory', directory] + arguments
+        return arguments + self.extra_arguments_
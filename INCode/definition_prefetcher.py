@@ -0,0 +1,115 @@
+# Copyright (C) 2020 R. Knuus
+
+from collections import deque
+import threading
+
+
+DEFAULT_DEPTH = 1
+DEFAULT_MAX_TUS = 16
+
+
+class DefinitionPrefetcher(object):
+    '''Speculatively loads the definitions of callees in a background thread.
+
+    Callees of the most recently expanded callable are loaded first, deeper levels only after all shallower ones.
+    The candidate TUs are parsed in the order ranked by the manager, and prefetching stops once max_tus TUs have
+    been added to the call graph, as each of them stays in memory.
+    '''
+    def __init__(self, parse_definition, merge_definition, get_callable, get_calls_of, depth=DEFAULT_DEPTH,
+                 max_tus=DEFAULT_MAX_TUS):
+        super(DefinitionPrefetcher, self).__init__()
+        self.parse_definition_ = parse_definition
+        self.merge_definition_ = merge_definition
+        self.get_callable_ = get_callable
+        self.get_calls_of_ = get_calls_of
+        self.depth_ = depth
+        self.max_tus_ = max_tus
+        self.loaded_tus_ = 0
+        self.pending_ = deque()
+        self.current_ = None
+        self.stopped_ = False
+        self.condition_ = threading.Condition()
+        self.thread_ = None
+
+    @property
+    def loaded_tus(self):
+        return self.loaded_tus_
+
+    def prefetch(self, callable_name):
+        '''Queues the callees of callable_name ahead of everything queued before.'''
+        with self.condition_:
+            if self.stopped_ or self.loaded_tus_ >= self.max_tus_:
+                return
+            for call in reversed(self.get_calls_of_(callable_name)):
+                self.pending_.appendleft((call.name, 1))
+            self.start_()
+            self.condition_.notify()
+
+    def wait_for(self, callable_name):
+        '''Drops callable_name from the queue and waits until the definition being loaded, if any, is merged.
+
+        The definition might reside in the TU parsed right now, which is skipped by concurrent loads.
+        '''
+        with self.condition_:
+            self.pending_ = deque(entry for entry in self.pending_ if entry[0] != callable_name)
+            while self.current_ is not None:
+                self.condition_.wait()
+
+    def wait_until_idle(self):
+        with self.condition_:
+            while self.pending_ or self.current_ is not None:
+                self.condition_.wait()
+
+    def clear(self):
+        with self.condition_:
+            self.pending_.clear()
+            while self.current_ is not None:
+                self.condition_.wait()
+            self.loaded_tus_ = 0
+
+    def stop(self):
+        with self.condition_:
+            self.stopped_ = True
+            self.pending_.clear()
+            self.condition_.notify_all()
+        if self.thread_:
+            self.thread_.join()
+
+    def start_(self):
+        if not self.thread_:
+            self.thread_ = threading.Thread(target=self.run_, daemon=True)
+            self.thread_.start()
+
+    def run_(self):
+        while True:
+            with self.condition_:
+                self.current_ = None
+                self.condition_.notify_all()
+                while not self.pending_ and not self.stopped_:
+                    self.condition_.wait()
+                if self.stopped_:
+                    return
+                if self.loaded_tus_ >= self.max_tus_:
+                    self.pending_.clear()
+                    continue
+                self.current_ = self.pending_.popleft()
+            self.load_(*self.current_)
+
+    def load_(self, callable_name, level):
+        callable = self.get_callable_(callable_name)
+        if not callable:
+            return
+        if not callable.is_definition():
+            try:
+                parsed = self.parse_definition_(callable_name, is_cancelled=self.is_stopped_)
+            except Exception:
+                return  # a speculative load must not bother the user, who gets the error when loading explicitly
+            callable = self.merge_definition_(callable_name, parsed)
+            with self.condition_:
+                self.loaded_tus_ += len(parsed)
+        if callable and level < self.depth_:
+            with self.condition_:
+                self.pending_.extend((call.name, level + 1) for call in self.get_calls_of_(callable_name))
+
+    def is_stopped_(self):
+        return self.stopped_
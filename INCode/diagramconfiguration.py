@@ -1,17 +1,17 @@
 # Copyright (C) 2020 R. Knuus
 
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from enum import IntEnum
+from INCode.plantuml_renderer import PlantUmlRenderer, RenderError
+from INCode.render_cache import RenderCache
 from INCode.ui_diagramconfiguration import Ui_DiagramConfiguration
-from os import path
 from plantweb.render import render
 from PyQt5.QtCore import Qt, QTimer, pyqtSignal
-from PyQt5.QtWidgets import QApplication, QMainWindow, QTreeWidgetItem
+from PyQt5.QtWidgets import QApplication, QListWidget, QMainWindow, QTreeWidgetItem, QTreeWidgetItemIterator
 from PyQt5.QtWidgets import QFileDialog
 from requests import RequestException
-from threading import Thread
-import subprocess
-import tempfile
+from threading import Event, Thread
+import warnings
 
 
 class TreeColumns(IntEnum):
@@ -25,6 +25,7 @@ class CallableTreeItem(QTreeWidgetItem):
 
         self.callable = callable
         self.manager_ = manager
+        self.pending_load = None
         self.setText(TreeColumns.FIRST_COLUMN, callable.name)
         self.setFlags(self.flags() | Qt.ItemIsUserCheckable)
         self.setCheckState(TreeColumns.FIRST_COLUMN, Qt.Unchecked)
@@ -33,9 +34,16 @@ class CallableTreeItem(QTreeWidgetItem):
     def is_included(self):
         return self.checkState(TreeColumns.FIRST_COLUMN) == Qt.Checked
 
+    def set_loading(self, cancelled):
+        # cancelled is the event set when the user gives up waiting for the definition
+        self.pending_load = cancelled
+        text = '{} (loading...)' if cancelled else '{}'
+        self.setText(TreeColumns.FIRST_COLUMN, text.format(self.callable.name))
+
 
 class DiagramConfiguration(QMainWindow, Ui_DiagramConfiguration):
     load_view_signal = pyqtSignal(bytes)
+    definition_loaded_signal = pyqtSignal(object, object)
 
     def __init__(self, manager, entry_point_item, parent=None):
         super(DiagramConfiguration, self).__init__(parent)
@@ -45,8 +53,11 @@ class DiagramConfiguration(QMainWindow, Ui_DiagramConfiguration):
         self.setupUi(self)
 
         self.current_diagram_ = None
+        self.callers_view_ = None
+        self.render_cache_ = RenderCache()
+        self.local_renderer_ = PlantUmlRenderer()
+        self.definition_loader_ = ThreadPoolExecutor(max_workers=4)
 
-        self.temp_dir_ = tempfile.mkdtemp()
         self.tree_.setColumnCount(TreeColumns.COLUMN_COUNT)
         self.tree_.header().hide()
         self.entry_point_item_ = CallableTreeItem(callable=entry_point, manager=self.manager_, parent=self.tree_)
@@ -61,15 +72,27 @@ class DiagramConfiguration(QMainWindow, Ui_DiagramConfiguration):
 
         self.tree_.itemChanged.connect(self.update_included_callables)
         self.revealChildrenAction_.triggered.connect(self.reveal_children)
+        self.cancelLoadingAction_.triggered.connect(self.cancel_loading)
+        self.showCallersAction_.triggered.connect(self.show_callers)
+        self.definition_loaded_signal.connect(self.insert_loaded_children)
+        self.watchFilesAction_.toggled.connect(self.toggle_watch)
         self.exportAction_.triggered.connect(self.export)
         self.togglePreviewAction_.triggered.connect(self.toggle_preview)
         self.toggleLayoutAction_.triggered.connect(self.toggle_layout)
         self.load_view_signal.connect(self.load_svg_view)
 
+        self.manager_.subscribe(self.update_changed_callables)
+        self.watch_timer_ = QTimer()
+        self.watch_timer_.timeout.connect(self.manager_.refresh)
+
         self.preview_timer = QTimer()
         self.preview_timer.timeout.connect(lambda: Thread(target=self.init_preview).start())
         self.preview_timer.start(2000)
 
+    def closeEvent(self, event):
+        self.local_renderer_.stop()
+        super(DiagramConfiguration, self).closeEvent(event)
+
     def update_included_callables(self, item, column):
         if item.is_included():
             self.manager_.include(item.callable.name)
@@ -78,17 +101,93 @@ class DiagramConfiguration(QMainWindow, Ui_DiagramConfiguration):
 
     def reveal_children(self):
         current_item = self.tree_.currentItem()
-        if not current_item or current_item.childCount() > 0:
+        if not current_item or current_item.childCount() > 0 or current_item.pending_load:
+            return
+
+        if current_item.callable.is_definition():
+            self.insert_children_(current_item)
+            return
+
+        # parse in the background and insert the children when definition_loaded_signal arrives
+        cancelled = Event()
+        current_item.set_loading(cancelled)
+        self.definition_loader_.submit(self.load_definition_, current_item, current_item.callable.name, cancelled)
+
+    def load_definition_(self, item, callable_name, cancelled):
+        # runs in a worker thread, so must not touch any widget
+        try:
+            result = self.manager_.parse_definition_candidates(callable_name, is_cancelled=cancelled.is_set)
+        except Exception as error:
+            result = error
+        self.definition_loaded_signal.emit(item, result)
+
+    def insert_loaded_children(self, item, result):
+        cancelled = item.pending_load
+        if isinstance(result, Exception):
+            item.set_loading(None)
+            warnings.warn('Failed to load definition of {}: {}'.format(item.callable.name, result))
             return
+        if not cancelled or cancelled.is_set():
+            self.manager_.release_definition_candidates(result)
+            return
+        callable = self.manager_.merge_definition_candidates(item.callable.name, result)
+        if callable:
+            item.callable = callable
+        item.set_loading(None)
+        self.insert_children_(item)
 
-        callable = current_item.callable
-        if not callable.is_definition():
-            callable = self.manager_.load_definition(callable.name)
-            current_item.callable = callable
+    def cancel_loading(self):
+        current_item = self.tree_.currentItem()
+        if not current_item or not current_item.pending_load:
+            return
+        # the running parse cannot be interrupted, so its result is dropped when it arrives
+        current_item.pending_load.set()
+        current_item.set_loading(None)
 
-        for call in self.manager_.get_calls_of(callable.name):
-            child_tree_item = CallableTreeItem(callable=call, manager=self.manager_, parent=current_item)
+    def insert_children_(self, item):
+        for call in self.manager_.get_calls_of(item.callable.name):
+            child_tree_item = CallableTreeItem(callable=call, manager=self.manager_, parent=item)
             child_tree_item.setExpanded(True)
+        item.setExpanded(True)
+
+    def show_callers(self):
+        current_item = self.tree_.currentItem()
+        if not current_item:
+            return
+        # kept as member, otherwise the window would be closed right away
+        self.callers_view_ = QListWidget()
+        self.callers_view_.setWindowTitle('Callers of {}'.format(current_item.callable.name))
+        for caller in self.manager_.get_callers_of(current_item.callable.name):
+            self.callers_view_.addItem('{} ({})'.format(caller.name, caller.file_name))
+        self.callers_view_.show()
+
+    def toggle_watch(self, enabled):
+        self.manager_.set_watch(enabled)
+        if enabled:
+            self.watch_timer_.start(2000)
+        else:
+            self.watch_timer_.stop()
+
+    def update_changed_callables(self, names):
+        # only replace the children of changed callables instead of rebuilding the whole tree
+        changed_items = []
+        iterator = QTreeWidgetItemIterator(self.tree_)
+        while iterator.value():
+            if iterator.value().callable.name in names:
+                changed_items.append(iterator.value())
+            iterator += 1
+        for item in changed_items:
+            if item.treeWidget() is None:
+                continue  # removed together with the children of another changed item
+            item.callable = self.manager_.get_callable(item.callable.name) or item.callable
+            if item.childCount() == 0 and item is not self.entry_point_item_:
+                continue  # children not revealed yet
+            item.takeChildren()
+            for call in self.manager_.get_calls_of(item.callable.name):
+                child_tree_item = CallableTreeItem(callable=call, manager=self.manager_, parent=item)
+                child_tree_item.setCheckState(TreeColumns.FIRST_COLUMN,
+                                              Qt.Checked if self.manager_.is_included(call.name) else Qt.Unchecked)
+            item.setExpanded(True)
 
     def init_preview(self):
         if self.svg_view_.isVisible():
@@ -97,12 +196,18 @@ class DiagramConfiguration(QMainWindow, Ui_DiagramConfiguration):
                 self.load_view_signal.emit(content)
 
     def export(self):
-        # TODO(KNR): support other file formats by appending ;;SVG file (*.svg);;PNG file (*.png)
-        # to the last argument
-        path, _ = QFileDialog.getSaveFileName(self, 'Export diagram', '', 'Plantuml file (*.plantuml)')
+        # TODO(KNR): support other file formats by appending ;;PNG file (*.png) to the last argument
+        path, _ = QFileDialog.getSaveFileName(self, 'Export diagram', '',
+                                              'Plantuml file (*.plantuml);;SVG file (*.svg)')
         if not path:
             return
         content = self.manager_.export()
+        if path.endswith('.svg'):
+            output = self.render_cache_.render(content, self.render_uml_)
+            if output:
+                with open(path, 'wb') as file:
+                    file.write(output)
+            return
         with open(path, 'w') as file:
             file.write(content)
 
@@ -121,6 +226,10 @@ class DiagramConfiguration(QMainWindow, Ui_DiagramConfiguration):
         if content == self.current_diagram_ or content == '@startuml\n\n\n@enduml':
             return False
         self.current_diagram_ = content
+        # toggling a callable back and forth yields diagrams rendered before
+        return self.render_cache_.render(content, self.render_uml_)
+
+    def render_uml_(self, content):
         try:
             output = render(content,
                             engine='plantuml',
@@ -129,12 +238,11 @@ class DiagramConfiguration(QMainWindow, Ui_DiagramConfiguration):
                                 'use_cache': False
                             })[0]
         except RequestException:
-            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')  # TODO(KNR): replace by mktemp
-            temp_file_name = path.join(self.temp_dir_, timestamp) + '.svg'
-            cmd = "echo '{}' | plantuml -pipe > {} -tsvg".format(content, temp_file_name)
-            subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT).communicate()
-            output = open(temp_file_name, 'rb').read()
-            subprocess.call(['rm', temp_file_name])  # TODO(KNR): replace by pythoning file remove (if still necessary for mktemp)
+            try:
+                output = self.local_renderer_.render(content)
+            except (OSError, RenderError) as error:
+                warnings.warn('Failed to render diagram locally: {}'.format(error))
+                return None
         return output
 
     def load_svg_view(self, content):
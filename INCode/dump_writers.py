@@ -0,0 +1,81 @@
+# Copyright (C) 2020 R. Knuus
+
+import json
+
+
+class TextDumpWriter(object):
+    '''Writes the call tree as indented callable names.'''
+    expand_once = False
+
+    def __init__(self, stream):
+        super(TextDumpWriter, self).__init__()
+        self.stream_ = stream
+
+    def begin(self, root):
+        self.stream_.write('{}\n'.format(root.name))
+
+    def write_call(self, level, caller, callee, is_cycle):
+        suffix = ' (recursive)' if is_cycle else ''
+        self.stream_.write('{}{}{}\n'.format(level * '  ', callee.name, suffix))
+
+    def end(self):
+        pass
+
+
+class JsonLinesDumpWriter(object):
+    '''Writes one JSON object per call, starting with the root which has no caller.'''
+    expand_once = False
+
+    def __init__(self, stream):
+        super(JsonLinesDumpWriter, self).__init__()
+        self.stream_ = stream
+
+    def begin(self, root):
+        self.write_line_(level=0, caller=None, callee=root, is_cycle=False)
+
+    def write_call(self, level, caller, callee, is_cycle):
+        self.write_line_(level=level, caller=caller.name, callee=callee, is_cycle=is_cycle)
+
+    def end(self):
+        pass
+
+    def write_line_(self, level, caller, callee, is_cycle):
+        record = {
+            'depth': level,
+            'caller': caller,
+            'callee': callee.name,
+            'file': callee.file_name,
+            'cycle': is_cycle
+        }
+        self.stream_.write(json.dumps(record) + '\n')
+
+
+class DotDumpWriter(object):
+    '''Writes the call graph as DOT digraph, each edge once.'''
+    expand_once = True
+
+    def __init__(self, stream):
+        super(DotDumpWriter, self).__init__()
+        self.stream_ = stream
+        self.edges_ = set()
+
+    def begin(self, root):
+        self.stream_.write('digraph calls {\n')
+        self.stream_.write('  {};\n'.format(json.dumps(root.name)))
+
+    def write_call(self, level, caller, callee, is_cycle):
+        edge = (caller.name, callee.name)
+        if edge in self.edges_:
+            return
+        self.edges_.add(edge)
+        self.stream_.write('  {} -> {};\n'.format(json.dumps(caller.name), json.dumps(callee.name)))
+
+    def end(self):
+        self.stream_.write('}\n')
+
+
+DUMP_FORMATS = {
+    'text': TextDumpWriter,
+    'json': JsonLinesDumpWriter,
+    'dot': DotDumpWriter
+}
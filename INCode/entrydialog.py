@@ -1,5 +1,6 @@
 # Copyright (C) 2020 R. Knuus
 
+from INCode.call_graph_cache import CallGraphCache
 from INCode.call_tree_manager import CallTreeManager, CallTreeManagerState
 from INCode.diagramconfiguration import DiagramConfiguration
 from INCode.ui_entrydialog import Ui_EntryDialog
@@ -26,7 +27,7 @@ class EntryDialog(QDialog, Ui_EntryDialog):
 
         # TODO(KNR): prevent editing the entry file and entry point lists
 
-        self.manager_ = CallTreeManager()
+        self.manager_ = CallTreeManager(cache=CallGraphCache())
 
         self.browse_compilation_database_button_.clicked.connect(self.on_browse)
         self.compilation_database_path_.editingFinished.connect(self.on_edit_db_path)
@@ -36,6 +37,10 @@ class EntryDialog(QDialog, Ui_EntryDialog):
         self.entry_file_selection_ = self.entry_file_list_.selectionModel()
         self.entry_file_selection_.currentChanged.connect(self.on_select_entry_file)
         self.entry_points_ = QStandardItemModel(self.entry_point_list_)
+        self.prefetch_definitions_.toggled.connect(self.on_toggle_prefetch)
+
+    def on_toggle_prefetch(self, checked):
+        self.manager_.set_prefetch(enabled=checked)
 
     def on_edit_extra_args(self):
         args = self.extra_arguments_.text()
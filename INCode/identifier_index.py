@@ -0,0 +1,124 @@
+# Copyright (C) 2020 R. Knuus
+
+from collections import defaultdict
+from os import path
+import json
+import os
+import re
+import tempfile
+
+
+FORMAT_VERSION = 1
+INDEX_FILE_SUFFIX = '.identifiers'
+IDENTIFIER_PATTERN = re.compile('[A-Za-z_][A-Za-z0-9_]*')
+
+
+def is_identifier(text):
+    return IDENTIFIER_PATTERN.fullmatch(text) is not None
+
+
+def get_index_file_name(compilation_database_file_name):
+    '''The index of a compilation database is stored next to it.'''
+    if not compilation_database_file_name.endswith('compile_commands.json'):
+        return None
+    return compilation_database_file_name + INDEX_FILE_SUFFIX
+
+
+def tokenize_file_(file_name):
+    with open(file_name, errors='replace') as file:
+        return set(IDENTIFIER_PATTERN.findall(file.read()))
+
+
+def get_mtime(file_name):
+    '''Returns the modification time of a file in nanoseconds, None if it does not exist.'''
+    try:
+        return os.stat(file_name).st_mtime_ns
+    except OSError:
+        return None
+
+
+def write_json_atomically(file_name, content):
+    '''Writes content as JSON to file_name, which is replaced only once it is written completely.
+
+    Indexes are optimizations only, so failing to write them is ignored, e.g. in a read-only directory.
+    '''
+    # written next to the index and renamed, so concurrent sessions never load a partially written index
+    try:
+        handle, temp_file_name = tempfile.mkstemp(dir=path.dirname(path.abspath(file_name)))
+    except OSError:
+        return
+    try:
+        with os.fdopen(handle, 'w') as file:
+            json.dump(content, file)
+        os.replace(temp_file_name, file_name)
+    except OSError:
+        os.remove(temp_file_name)
+
+
+class IdentifierIndex(object):
+    '''Inverted index from identifier tokens to the files containing them.'''
+    def __init__(self, index_file_name=None):
+        super(IdentifierIndex, self).__init__()
+        self.index_file_name_ = index_file_name
+        self.files_of_ = defaultdict(set)
+        self.tokens_of_ = dict()
+        self.mtimes_ = dict()
+        self.load_()
+
+    def update(self, file_names):
+        '''Re-tokenizes new and modified files, drops files no longer listed and stores the index if it changed.'''
+        file_names = set(file_names)
+        changed = False
+        for file_name in set(self.tokens_of_) - file_names:
+            self.remove_(file_name)
+            changed = True
+        for file_name in file_names:
+            mtime = get_mtime(file_name)
+            if mtime is not None and mtime == self.mtimes_.get(file_name):
+                continue
+            self.remove_(file_name)
+            if mtime is not None:
+                self.add_(file_name, mtime, tokenize_file_(file_name))
+            changed = True
+        if changed:
+            self.store_()
+
+    def find(self, identifier):
+        return self.files_of_.get(identifier, set())
+
+    def add_(self, file_name, mtime, tokens):
+        self.tokens_of_[file_name] = tokens
+        self.mtimes_[file_name] = mtime
+        for token in tokens:
+            self.files_of_[token].add(file_name)
+
+    def remove_(self, file_name):
+        for token in self.tokens_of_.pop(file_name, ()):
+            files = self.files_of_[token]
+            files.discard(file_name)
+            if not files:
+                del self.files_of_[token]
+        self.mtimes_.pop(file_name, None)
+
+    def load_(self):
+        if not self.index_file_name_ or not path.exists(self.index_file_name_):
+            return
+        try:
+            with open(self.index_file_name_) as index_file:
+                content = json.load(index_file)
+        except (OSError, ValueError):
+            return
+        if content.get('version') != FORMAT_VERSION:
+            return
+        for file_name, (mtime, tokens) in content['files'].items():
+            self.add_(file_name, mtime, set(tokens))
+
+    def store_(self):
+        if not self.index_file_name_:
+            return
+        content = {
+            'version': FORMAT_VERSION,
+            'files': {file_name: [self.mtimes_[file_name], sorted(tokens)]
+                      for file_name, tokens in self.tokens_of_.items()}
+        }
+        write_json_atomically(self.index_file_name_, content)
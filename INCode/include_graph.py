@@ -0,0 +1,199 @@
+# Copyright (C) 2020 R. Knuus
+
+from INCode.identifier_index import write_json_atomically
+from os import path
+import json
+import os
+import re
+
+
+FORMAT_VERSION = 1
+INCLUDE_GRAPH_FILE_SUFFIX = '.includes'
+INCLUDE_PATTERN = re.compile(r'^\s*#\s*include\s*([<"])([^>"]+)[>"]', re.MULTILINE)
+INCLUDE_DIRECTORY_OPTIONS = ['-I', '-iquote']
+
+
+def scan_includes(file_name):
+    '''Returns the (name, is_quoted) pairs of all include directives, ignoring conditional compilation.'''
+    try:
+        with open(file_name, errors='replace') as file:
+            content = file.read()
+    except OSError:
+        return []
+    return [(name, bracket == '"') for bracket, name in INCLUDE_PATTERN.findall(content)]
+
+
+def get_include_directories(compiler_arguments):
+    '''Returns the user include directories of compiler_arguments, system include directories are not searched.'''
+    working_directory = ''
+    directories = []
+    arguments = iter(compiler_arguments)
+    for argument in arguments:
+        if argument == '-working-directory':
+            working_directory = next(arguments, '')
+            continue
+        for option in INCLUDE_DIRECTORY_OPTIONS:
+            if argument == option:
+                directories.append(next(arguments, ''))
+            elif argument.startswith(option):
+                directories.append(argument[len(option):])
+    return tuple(path.normpath(path.join(working_directory, directory)) for directory in directories)
+
+
+def get_include_graph_file_name(compilation_database_file_name):
+    '''The include graph of a compilation database is stored next to it.'''
+    if not compilation_database_file_name or not compilation_database_file_name.endswith('compile_commands.json'):
+        return None
+    return compilation_database_file_name + INCLUDE_GRAPH_FILE_SUFFIX
+
+
+def get_status_(file_name):
+    try:
+        status = os.stat(file_name)
+    except OSError:
+        return None, 0
+    return status.st_mtime_ns, status.st_size
+
+
+def get_arguments_key_(files, tu_file_name):
+    # a compilation database provides the arguments as written, so only new or changed entries are tokenized
+    get_raw_arguments = getattr(files, 'get_raw_arguments', None)
+    if get_raw_arguments is not None:
+        return get_raw_arguments(tu_file_name)
+    return json.dumps(files[tu_file_name])
+
+
+class IncludeGraph(object):
+    '''Maps each header to the TU reaching it with the least source to parse.
+
+    Include directives are found by a regular expression instead of a preprocessor run, so headers included
+    only under conditions never met are reached, too. The cost of a TU is the size of all files it reaches.
+
+    The include directives of each file and the include directories of each TU are stored next to the
+    compilation database, so an update only re-scans modified files and re-tokenizes modified entries.
+    '''
+    def __init__(self, index_file_name=None):
+        super(IncludeGraph, self).__init__()
+        self.index_file_name_ = index_file_name
+        self.scanned_ = dict()  # file name -> (mtime, size, include directives)
+        self.include_directories_of_ = dict()  # TU file name -> (arguments key, include directories)
+        self.checked_ = set()
+        self.resolved_ = dict()
+        self.cheapest_tu_ = dict()
+        self.is_modified_ = False
+        self.load_()
+
+    def update(self, files):
+        '''Scans the TUs of files, a mapping from TU to compiler arguments, and all headers they reach.
+
+        Files not modified since the last update are not read again, the graph is stored if anything changed.
+        '''
+        self.checked_ = set()
+        self.resolved_ = dict()
+        self.cheapest_tu_ = dict()
+        self.is_modified_ = False
+        all_reached = set()
+        for tu_file_name in files:
+            reached = self.collect_reached_files_(tu_file_name, self.get_include_directories_(files, tu_file_name))
+            all_reached |= reached
+            cost = sum(self.get_scanned_(file_name)[1] for file_name in reached)
+            for header in reached:
+                if header == tu_file_name:
+                    continue
+                cheapest = self.cheapest_tu_.get(header)
+                if not cheapest or (cost, tu_file_name) < cheapest:
+                    self.cheapest_tu_[header] = (cost, tu_file_name)
+        for tu_file_name in set(self.include_directories_of_) - set(files):
+            del self.include_directories_of_[tu_file_name]
+            self.is_modified_ = True
+        for file_name in set(self.scanned_) - all_reached:
+            del self.scanned_[file_name]
+            self.is_modified_ = True
+        if self.is_modified_:
+            self.store_()
+
+    @property
+    def headers(self):
+        return self.cheapest_tu_.keys()
+
+    def find_cheapest_tu(self, header):
+        '''Returns the TU including header with the least source to parse and its cost or (None, None).'''
+        cost, tu_file_name = self.cheapest_tu_.get(header, (None, None))
+        return tu_file_name, cost
+
+    def get_include_directories_(self, files, tu_file_name):
+        key = get_arguments_key_(files, tu_file_name)
+        known = self.include_directories_of_.get(tu_file_name)
+        if known and known[0] == key:
+            return known[1]
+        include_directories = get_include_directories(files[tu_file_name])
+        self.include_directories_of_[tu_file_name] = (key, include_directories)
+        self.is_modified_ = True
+        return include_directories
+
+    def get_scanned_(self, file_name):
+        scanned = self.scanned_.get(file_name)
+        if file_name in self.checked_:
+            return scanned
+        self.checked_.add(file_name)
+        mtime, size = get_status_(file_name)
+        if scanned is None or scanned[0] != mtime:
+            scanned = (mtime, size, scan_includes(file_name) if mtime is not None else [])
+            self.scanned_[file_name] = scanned
+            self.is_modified_ = True
+        return scanned
+
+    def collect_reached_files_(self, tu_file_name, include_directories):
+        reached = {tu_file_name}
+        pending = [tu_file_name]
+        while pending:
+            file_name = pending.pop()
+            for header in self.get_includes_(file_name, include_directories):
+                if header not in reached:
+                    reached.add(header)
+                    pending.append(header)
+        return reached
+
+    def get_includes_(self, file_name, include_directories):
+        key = (file_name, include_directories)
+        includes = self.resolved_.get(key)
+        if includes is None:
+            includes = []
+            for name, is_quoted in self.get_scanned_(file_name)[2]:
+                header = self.resolve_(name, is_quoted, path.dirname(file_name), include_directories)
+                if header:
+                    includes.append(header)
+            self.resolved_[key] = includes
+        return includes
+
+    def resolve_(self, name, is_quoted, directory, include_directories):
+        candidates = ((directory,) if is_quoted else ()) + include_directories
+        for candidate in candidates:
+            file_name = path.normpath(path.join(candidate, name))
+            if path.isfile(file_name):
+                return file_name
+        return None
+
+    def load_(self):
+        if not self.index_file_name_ or not path.exists(self.index_file_name_):
+            return
+        try:
+            with open(self.index_file_name_) as index_file:
+                content = json.load(index_file)
+        except (OSError, ValueError):
+            return
+        if content.get('version') != FORMAT_VERSION:
+            return
+        for file_name, (mtime, size, includes) in content['files'].items():
+            self.scanned_[file_name] = (mtime, size, [(name, is_quoted) for name, is_quoted in includes])
+        for tu_file_name, (key, include_directories) in content['tus'].items():
+            self.include_directories_of_[tu_file_name] = (key, tuple(include_directories))
+
+    def store_(self):
+        if not self.index_file_name_:
+            return
+        write_json_atomically(self.index_file_name_, {
+            'version': FORMAT_VERSION,
+            'files': {file_name: list(scanned) for file_name, scanned in self.scanned_.items()},
+            'tus': {tu_file_name: list(known) for tu_file_name, known in self.include_directories_of_.items()}
+        })
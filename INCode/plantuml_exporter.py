@@ -0,0 +1,177 @@
+# Copyright (C) 2020 R. Knuus
+
+
+def quote(text):
+    if not text:
+        return text
+    return '"{}"'.format(text)
+
+
+def write_rope_(rope, stream):
+    '''Writes a fragment made of strings and nested fragments without concatenating it first.'''
+    stack = [iter(rope)]
+    while stack:
+        for part in stack[-1]:
+            if isinstance(part, str):
+                stream.write(part)
+            else:
+                stack.append(iter(part))
+                break
+        else:
+            stack.pop()
+
+
+class RenderFrame(object):
+    def __init__(self, name, parent_name, calls, included):
+        super(RenderFrame, self).__init__()
+        self.name = name
+        self.parent_name = parent_name
+        self.calls = calls
+        self.index = 0
+        self.included = included
+        self.parts = []
+
+
+class PlantUmlExporter(object):
+    '''Renders the included calls below a root callable as PlantUML sequence diagram.
+
+    Calls closing a cycle are marked instead of followed and subtrees without included callables are skipped.
+    The fragment below a callable outside of any cycle does not depend on the path it is reached by, so it is
+    rendered only once.
+    '''
+    def __init__(self, get_calls_of, included):
+        super(PlantUmlExporter, self).__init__()
+        self.get_calls_of_ = get_calls_of
+        self.included_ = included
+        self.relevant_ = set()
+        self.acyclic_ = set()
+        self.fragments_ = dict()
+
+    def export(self, root, stream):
+        successors = self.collect_successors_(root.name)
+        self.relevant_ = self.find_relevant_(successors)
+        self.acyclic_ = self.find_acyclic_(root.name, successors)
+        self.fragments_ = dict()
+
+        stream.write('@startuml\n\n')
+        root_is_included = root.name in self.included_
+        if root_is_included:
+            stream.write(' -> ' + quote(root.participant) + ': ' + root.callable + '\n')
+            stream.write('activate {}\n'.format(quote(root.participant)))
+        if root.name in self.relevant_:
+            parent_name = root.participant if root_is_included else ''
+            write_rope_(self.render_calls_(root.name, parent_name), stream)
+        if root_is_included:
+            stream.write('deactivate {}\n'.format(quote(root.participant)))
+        stream.write('\n@enduml')
+
+    def collect_successors_(self, root_name):
+        successors = dict()
+        pending = [root_name]
+        while pending:
+            name = pending.pop()
+            if name in successors:
+                continue
+            successors[name] = {call.name for call in self.get_calls_of_(name)}
+            pending.extend(successors[name])
+        return successors
+
+    def find_relevant_(self, successors):
+        '''Returns the reachable callables that are included or reach an included callable.'''
+        predecessors = {name: [] for name in successors}
+        for name, callees in successors.items():
+            for callee in callees:
+                predecessors[callee].append(name)
+        relevant = {name for name in successors if name in self.included_}
+        pending = list(relevant)
+        while pending:
+            for caller in predecessors[pending.pop()]:
+                if caller not in relevant:
+                    relevant.add(caller)
+                    pending.append(caller)
+        return relevant
+
+    def find_acyclic_(self, root_name, successors):
+        '''Returns the callables not sharing a cycle with another callable, i.e. forming a trivial SCC.'''
+        # iterative version of Tarjan's algorithm
+        indices = dict()
+        low_links = dict()
+        scc_stack = []
+        on_scc_stack = set()
+        acyclic = set()
+        stack = [(root_name, iter(successors[root_name]))]
+        indices[root_name] = low_links[root_name] = 0
+        scc_stack.append(root_name)
+        on_scc_stack.add(root_name)
+        while stack:
+            name, callees = stack[-1]
+            for callee in callees:
+                if callee not in indices:
+                    indices[callee] = low_links[callee] = len(indices)
+                    scc_stack.append(callee)
+                    on_scc_stack.add(callee)
+                    stack.append((callee, iter(successors[callee])))
+                    break
+                if callee in on_scc_stack:
+                    low_links[name] = min(low_links[name], indices[callee])
+            else:
+                stack.pop()
+                if stack:
+                    caller = stack[-1][0]
+                    low_links[caller] = min(low_links[caller], low_links[name])
+                if low_links[name] == indices[name]:
+                    component = []
+                    while True:
+                        member = scc_stack.pop()
+                        on_scc_stack.discard(member)
+                        component.append(member)
+                        if member == name:
+                            break
+                    if len(component) == 1:
+                        acyclic.add(name)
+        return acyclic
+
+    def render_calls_(self, name, parent_name):
+        stack = [RenderFrame(name, parent_name, self.get_calls_of_(name), included=False)]
+        on_stack = {name}
+        while True:
+            frame = stack[-1]
+            if frame.index < len(frame.calls):
+                call = frame.calls[frame.index]
+                frame.index += 1
+                if call.name not in self.relevant_:
+                    continue
+                included = call.name in self.included_
+                if included:
+                    frame.parts.append(quote(frame.parent_name) + ' -> ' + quote(call.participant) + ': ' +
+                                       call.callable + '\n')
+                if call.name in on_stack:
+                    if included:
+                        frame.parts.append('note right: recursive call\n')
+                        frame.parts.append('activate {}\n'.format(quote(call.participant)))
+                        frame.parts.append('deactivate {}\n'.format(quote(call.participant)))
+                    continue
+                if included:
+                    # TODO(KNR): avoid redundant activations
+                    frame.parts.append('activate {}\n'.format(quote(call.participant)))
+                child_parent_name = call.participant if included else frame.parent_name
+                fragment = self.fragments_.get((call.name, child_parent_name))
+                if fragment is None:
+                    stack.append(RenderFrame(call.name, child_parent_name, self.get_calls_of_(call.name), included))
+                    on_stack.add(call.name)
+                    continue
+                frame.parts.append(fragment)
+                if included:
+                    frame.parts.append('deactivate {}\n'.format(quote(call.participant)))
+            else:
+                stack.pop()
+                on_stack.discard(frame.name)
+                fragment = tuple(frame.parts)
+                if frame.name in self.acyclic_:
+                    self.fragments_[(frame.name, frame.parent_name)] = fragment
+                if not stack:
+                    return fragment
+                caller_frame = stack[-1]
+                caller_frame.parts.append(fragment)
+                if frame.included:
+                    caller_frame.parts.append('deactivate {}\n'.format(quote(frame.parent_name)))
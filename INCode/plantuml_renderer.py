@@ -0,0 +1,109 @@
+# Copyright (C) 2020 R. Knuus
+
+import os
+import select
+import subprocess
+import threading
+import time
+
+
+DEFAULT_COMMAND = ['plantuml']
+DEFAULT_TIMEOUT = 60
+DELIMITER = b'--INCode-end-of-diagram--'
+WHITESPACE = b' \t\r\n'
+
+
+class RenderError(RuntimeError):
+    pass
+
+
+class RenderTimeoutError(RenderError):
+    pass
+
+
+class PlantUmlRenderer(object):
+    '''Renders diagrams with one long-lived plantuml process instead of starting a JVM per diagram.
+
+    Diagrams are piped to the process one after the other, each output is terminated by a delimiter line.
+    The process is started on the first render and restarted if it died. A process that does not finish a diagram
+    within timeout seconds is killed and replaced by a fresh one.
+    '''
+    def __init__(self, command=None, format='svg', timeout=DEFAULT_TIMEOUT):
+        super(PlantUmlRenderer, self).__init__()
+        self.command_ = list(command or DEFAULT_COMMAND) + ['-pipe', '-pipedelimitor', DELIMITER.decode(),
+                                                            '-t' + format]
+        self.timeout_ = timeout
+        self.process_ = None
+        self.lock_ = threading.Lock()
+
+    def render(self, source):
+        '''Returns the rendered diagram. Blocks until it is rendered, so call it outside the GUI thread.'''
+        with self.lock_:
+            try:
+                return self.render_(source)
+            except RenderTimeoutError:
+                raise
+            except RenderError:
+                # the process crashed, possibly on a previous diagram, so retry once with a fresh one
+                self.stop_()
+                return self.render_(source)
+
+    def stop(self):
+        with self.lock_:
+            self.stop_()
+
+    def render_(self, source):
+        if not self.process_ or self.process_.poll() is not None:
+            self.start_()
+        try:
+            self.process_.stdin.write(source.encode('utf-8').rstrip() + b'\n')
+            self.process_.stdin.flush()
+        except BrokenPipeError:
+            raise RenderError('plantuml terminated before rendering')
+        # reads the raw file descriptor, data buffered by stdout would not wake up select
+        output_fd = self.process_.stdout.fileno()
+        deadline = time.monotonic() + self.timeout_
+        output = bytearray()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([output_fd], [], [], remaining)[0]:
+                self.kill_()
+                self.start_()
+                raise RenderTimeoutError('plantuml did not render within {} s'.format(self.timeout_))
+            chunk = os.read(output_fd, 65536)
+            if not chunk:
+                raise RenderError('plantuml terminated while rendering')
+            output += chunk
+            end = len(output)
+            while end and output[end - 1] in WHITESPACE:
+                end -= 1
+            if output[max(end - len(DELIMITER), 0):end] == DELIMITER:
+                return bytes(output[:end - len(DELIMITER)]).rstrip()
+
+    def start_(self):
+        self.process_ = subprocess.Popen(self.command_, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL)
+
+    def kill_(self):
+        self.process_.kill()
+        self.process_.wait()
+        for stream in (self.process_.stdin, self.process_.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+        self.process_ = None
+
+    def stop_(self):
+        if not self.process_:
+            return
+        try:
+            self.process_.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process_.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process_.kill()
+            self.process_.wait()
+        self.process_ = None
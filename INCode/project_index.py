@@ -0,0 +1,233 @@
+# Copyright (C) 2020 R. Knuus
+
+from collections.abc import Mapping
+from INCode.clang_access import Callable
+import json
+import sqlite3
+import threading
+
+
+FORMAT_VERSION = 2
+PROJECT_INDEX_SUFFIX = '.sqlite'
+CALLABLE_COLUMNS = ('name', 'spelling', 'callable', 'file_name', 'used_in_file', 'participant', 'is_definition',
+                    'usr')
+SCHEMA = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE tus (file_name TEXT PRIMARY KEY, arguments TEXT, position INTEGER);
+CREATE TABLE callables (name TEXT PRIMARY KEY, spelling TEXT, callable TEXT, file_name TEXT, used_in_file TEXT,
+                        participant TEXT, is_definition INTEGER, usr TEXT, tu_file_name TEXT);
+CREATE INDEX callables_by_file ON callables (file_name);
+CREATE TABLE calls (id INTEGER PRIMARY KEY, caller TEXT, name TEXT, spelling TEXT, callable TEXT, file_name TEXT,
+                    used_in_file TEXT, participant TEXT, is_definition INTEGER, usr TEXT);
+CREATE INDEX calls_by_caller ON calls (caller);
+CREATE INDEX calls_by_callee ON calls (name);
+'''
+
+
+def get_project_index_file_name(compilation_database_file_name):
+    '''The project index of a compilation database is stored next to it by default.'''
+    return compilation_database_file_name + PROJECT_INDEX_SUFFIX
+
+
+def is_project_index(file_name):
+    return file_name.endswith(PROJECT_INDEX_SUFFIX)
+
+
+def to_row_(callable):
+    return (callable.name, callable.get_spelling(), callable.callable, callable.file_name, callable.used_in_file,
+            callable.raw_participant, int(callable.is_definition()), callable.usr)
+
+
+def from_row_(row):
+    name, spelling, callable, file_name, used_in_file, participant, is_definition, usr = row
+    return Callable(name=name, spelling=spelling, callable=callable, file_name=file_name, used_in_file=used_in_file,
+                    participant=participant, is_definition=bool(is_definition), usr=usr)
+
+
+class ProjectIndex(object):
+    '''Call graph of a whole compilation database stored in a SQLite file.
+
+    Unlike merging fragments in memory, a definition is never replaced by a declaration from a later TU, so each
+    callable is stored as defined, together with the TU defining it.
+    '''
+    def __init__(self, file_name):
+        super(ProjectIndex, self).__init__()
+        self.file_name_ = file_name
+        self.lock_ = threading.Lock()
+        self.connection_ = sqlite3.connect(file_name, check_same_thread=False)
+        self.files_view_ = IndexedFiles(self)
+
+    @property
+    def file_name(self):
+        return self.file_name_
+
+    def close(self):
+        self.connection_.close()
+
+    def build(self, access, files, jobs=1):
+        '''Replaces the content by the fragments of all TUs of files, parsed by access in up to jobs processes.'''
+        with self.lock_, self.connection_:
+            self.connection_.executescript('''
+                DROP TABLE IF EXISTS meta; DROP TABLE IF EXISTS tus;
+                DROP TABLE IF EXISTS callables; DROP TABLE IF EXISTS calls;''')
+            self.connection_.executescript(SCHEMA)
+            self.connection_.execute('INSERT INTO meta VALUES (?, ?)', ('version', str(FORMAT_VERSION)))
+            self.connection_.executemany('INSERT INTO tus VALUES (?, ?, ?)',
+                                         ((file_name, json.dumps(files[file_name]), position)
+                                          for position, file_name in enumerate(files)))
+            for fragment in access.iter_fragments(files=files, jobs=jobs):
+                self.add_fragment_(fragment)
+
+    def add_fragment_(self, fragment):
+        # same precedence as ClangCallGraphAccess.apply_fragment_, except that definitions are kept
+        for name, callable in fragment.callables.items():
+            if name in fragment.declared:
+                # an upsert needs SQLite 3.24, so an existing row is updated separately
+                row = to_row_(callable) + (fragment.tu_file_name,)
+                inserted = self.connection_.execute(
+                    'INSERT OR IGNORE INTO callables VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', row).rowcount
+                if not inserted:
+                    self.connection_.execute('''
+                        UPDATE callables SET spelling = ?, callable = ?, file_name = ?, used_in_file = ?,
+                                             participant = ?, is_definition = ?, usr = ?, tu_file_name = ?
+                        WHERE name = ? AND (? OR NOT is_definition)''', row[1:] + (name, row[6]))
+            else:
+                self.connection_.execute('INSERT OR IGNORE INTO callables VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)',
+                                         to_row_(callable))
+        self.connection_.executemany('INSERT INTO calls ({}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'.format(
+                                         ', '.join(('caller',) + CALLABLE_COLUMNS)),
+                                     ((caller_name,) + to_row_(callee)
+                                      for caller_name, calls in fragment.calls_of.items() for callee in calls))
+
+    @property
+    def version(self):
+        try:
+            row = self.query_('SELECT value FROM meta WHERE key = ?', ('version',))
+        except sqlite3.OperationalError:
+            return None  # not built yet
+        return int(row[0][0]) if row else None
+
+    @property
+    def files(self):
+        '''The TUs of the indexed compilation database and their compiler arguments, read on access.'''
+        return self.files_view_
+
+    def get_file_names(self):
+        return [row[0] for row in self.query_('SELECT file_name FROM tus ORDER BY position')]
+
+    def count_files(self):
+        return self.query_('SELECT COUNT(*) FROM tus')[0][0]
+
+    def get_raw_arguments(self, file_name):
+        '''Returns the compiler arguments of a TU as JSON text, None if the TU is not indexed.'''
+        rows = self.query_('SELECT arguments FROM tus WHERE file_name = ?', (file_name,))
+        return rows[0][0] if rows else None
+
+    def get_callable(self, callable_name):
+        rows = self.query_('SELECT {} FROM callables WHERE name = ?'.format(', '.join(CALLABLE_COLUMNS)),
+                           (callable_name,))
+        return from_row_(rows[0]) if rows else None
+
+    def get_callable_names(self):
+        return [row[0] for row in self.query_('SELECT name FROM callables')]
+
+    def count_callables(self):
+        return self.query_('SELECT COUNT(*) FROM callables')[0][0]
+
+    def get_callables_in(self, file_name):
+        return [from_row_(row) for row in self.query_(
+            'SELECT {} FROM callables WHERE file_name = ? ORDER BY rowid'.format(', '.join(CALLABLE_COLUMNS)),
+            (file_name,))]
+
+    def get_calls_of(self, callable_name):
+        return [from_row_(row) for row in self.query_(
+            'SELECT {} FROM calls WHERE caller = ? ORDER BY id'.format(', '.join(CALLABLE_COLUMNS)),
+            (callable_name,))]
+
+    def get_callers_of(self, callable_name):
+        return [from_row_(row) for row in self.query_(
+            '''SELECT {} FROM callables WHERE name IN (SELECT caller FROM calls WHERE name = ?)
+               ORDER BY rowid'''.format(', '.join(CALLABLE_COLUMNS)), (callable_name,))]
+
+    def get_definition_tu(self, callable_name):
+        rows = self.query_('SELECT tu_file_name FROM callables WHERE name = ? AND is_definition', (callable_name,))
+        return rows[0][0] if rows else None
+
+    def query_(self, statement, parameters=()):
+        with self.lock_:
+            return self.connection_.execute(statement, parameters).fetchall()
+
+
+class IndexedFiles(Mapping):
+    '''Read-only view of the TUs of a project index and their compiler arguments, decoded one TU at a time.'''
+    def __init__(self, project_index):
+        super(IndexedFiles, self).__init__()
+        self.project_index_ = project_index
+
+    def __getitem__(self, file_name):
+        arguments = self.project_index_.get_raw_arguments(file_name)
+        if arguments is None:
+            raise KeyError(file_name)
+        return json.loads(arguments)
+
+    def __contains__(self, file_name):
+        return self.project_index_.get_raw_arguments(file_name) is not None
+
+    def __iter__(self):
+        return iter(self.project_index_.get_file_names())
+
+    def __len__(self):
+        return self.project_index_.count_files()
+
+    def get_raw_arguments(self, file_name):
+        return self.project_index_.get_raw_arguments(file_name)
+
+
+class IndexedCallables(Mapping):
+    '''Read-only view of the callables of a project index by name.'''
+    def __init__(self, project_index):
+        super(IndexedCallables, self).__init__()
+        self.project_index_ = project_index
+
+    def __getitem__(self, callable_name):
+        callable = self.project_index_.get_callable(callable_name)
+        if callable is None:
+            raise KeyError(callable_name)
+        return callable
+
+    def __iter__(self):
+        return iter(self.project_index_.get_callable_names())
+
+    def __len__(self):
+        return self.project_index_.count_callables()
+
+
+class IndexedCallGraphAccess(object):
+    '''Answers the call graph queries of ClangCallGraphAccess from a project index instead of parsing TUs.'''
+    def __init__(self, project_index):
+        super(IndexedCallGraphAccess, self).__init__()
+        self.project_index_ = project_index
+        self.callables_view_ = IndexedCallables(project_index)
+
+    @property
+    def callables(self):
+        return self.callables_view_
+
+    def get_callable(self, callable_name):
+        return self.callables_view_[callable_name]
+
+    def get_callables_in(self, file_name):
+        return self.project_index_.get_callables_in(file_name)
+
+    def get_calls_of(self, callable_name):
+        return self.project_index_.get_calls_of(callable_name)
+
+    def get_callers_of(self, callable_name):
+        return self.project_index_.get_callers_of(callable_name)
+
+    def get_dependencies(self, tu_file_name):
+        # modifications are picked up by rebuilding the index, not by watching files
+        return []
+
+    def set_keep_translation_units(self, keep):
+        pass
@@ -0,0 +1,112 @@
+# Copyright (C) 2020 R. Knuus
+
+from collections import OrderedDict
+from os import path
+import appdirs
+import hashlib
+import os
+import tempfile
+import threading
+
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+
+def default_render_cache_directory():
+    return path.join(appdirs.user_data_dir('INCode', 'rknuus'), 'renders')
+
+
+def get_render_key(source, format='svg'):
+    return hashlib.sha256(format.encode('utf-8') + b'\0' + source.encode('utf-8')).hexdigest()
+
+
+class RenderCache(object):
+    '''Rendered diagrams keyed by a hash of their PlantUML source.
+
+    The max_entries most recently used renderings are kept in memory, all others in a directory limited to
+    max_size bytes, which survives sessions.
+    '''
+    def __init__(self, directory=None, max_entries=DEFAULT_MAX_ENTRIES, max_size=DEFAULT_MAX_SIZE):
+        super(RenderCache, self).__init__()
+        self.directory_ = directory or default_render_cache_directory()
+        self.max_entries_ = max_entries
+        self.max_size_ = max_size
+        self.entries_ = OrderedDict()
+        self.lock_ = threading.Lock()
+        os.makedirs(self.directory_, exist_ok=True)
+
+    @property
+    def directory(self):
+        return self.directory_
+
+    def get(self, source, format='svg'):
+        key = get_render_key(source, format)
+        with self.lock_:
+            if key in self.entries_:
+                self.entries_.move_to_end(key)
+                return self.entries_[key]
+        file_name = self.get_path_(key, format)
+        try:
+            with open(file_name, 'rb') as file:
+                output = file.read()
+            os.utime(file_name)
+        except OSError:
+            return None
+        self.remember_(key, output)
+        return output
+
+    def put(self, source, output, format='svg'):
+        key = get_render_key(source, format)
+        self.remember_(key, output)
+        try:
+            self.write_atomically_(self.get_path_(key, format), output)
+            self.evict()
+        except OSError:
+            pass  # the disk store is an optimization only
+
+    def render(self, source, render_function, format='svg'):
+        '''Returns the cached rendering of source or renders it with render_function and caches the result.'''
+        output = self.get(source, format)
+        if output is None:
+            output = render_function(source)
+            if output:
+                self.put(source, output, format)
+        return output
+
+    def evict(self, max_size=None):
+        '''Removes least recently used renderings from disk until they fit into max_size bytes.'''
+        max_size = self.max_size_ if max_size is None else max_size
+        entries = []
+        for file_name in os.listdir(self.directory_):
+            try:
+                status = os.stat(path.join(self.directory_, file_name))
+            except FileNotFoundError:
+                continue
+            entries.append((status.st_mtime, status.st_size, file_name))
+        entries.sort()
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, file_name in entries:
+            if size <= max_size:
+                break
+            try:
+                os.remove(path.join(self.directory_, file_name))
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+    def remember_(self, key, output):
+        with self.lock_:
+            self.entries_[key] = output
+            self.entries_.move_to_end(key)
+            while len(self.entries_) > self.max_entries_:
+                self.entries_.popitem(last=False)
+
+    def get_path_(self, key, format):
+        return path.join(self.directory_, '{}.{}'.format(key, format))
+
+    def write_atomically_(self, file_name, content):
+        handle, temp_file_name = tempfile.mkstemp(dir=self.directory_, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as file:
+            file.write(content)
+        os.replace(temp_file_name, file_name)
@@ -0,0 +1,92 @@
+# Copyright (C) 2020 R. Knuus
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+import threading
+import time
+
+
+class Statistics(object):
+    '''Counters and accumulated times of a session, updated from worker threads and processes alike.
+
+    Statistics collected in a worker process travel with the fragment they describe and are merged into the
+    ones of the session when the fragment is merged.
+    '''
+    def __init__(self):
+        super(Statistics, self).__init__()
+        self.lock_ = threading.Lock()
+        self.counters_ = Counter()
+        self.seconds_ = defaultdict(float)
+        self.tu_seconds_ = defaultdict(float)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['lock_']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock_ = threading.Lock()
+
+    @property
+    def counters(self):
+        with self.lock_:
+            return dict(self.counters_)
+
+    @property
+    def seconds(self):
+        with self.lock_:
+            return dict(self.seconds_)
+
+    @property
+    def tu_seconds(self):
+        '''Seconds spent parsing and traversing each TU.'''
+        with self.lock_:
+            return dict(self.tu_seconds_)
+
+    def count(self, name, value=1):
+        with self.lock_:
+            self.counters_[name] += value
+
+    def add_seconds(self, name, seconds, tu_file_name=None):
+        with self.lock_:
+            self.seconds_[name] += seconds
+            if tu_file_name:
+                self.tu_seconds_[tu_file_name] += seconds
+
+    @contextmanager
+    def measure(self, name, tu_file_name=None):
+        '''Adds the time spent in the with block to name and, if given, to tu_file_name.'''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_seconds(name, time.perf_counter() - start, tu_file_name)
+
+    def merge(self, other):
+        if other is None or other is self:
+            return
+        counters, seconds, tu_seconds = other.counters, other.seconds, other.tu_seconds
+        with self.lock_:
+            self.counters_.update(counters)
+            for name, value in seconds.items():
+                self.seconds_[name] += value
+            for tu_file_name, value in tu_seconds.items():
+                self.tu_seconds_[tu_file_name] += value
+
+    def reset(self):
+        with self.lock_:
+            self.counters_.clear()
+            self.seconds_.clear()
+            self.tu_seconds_.clear()
+
+    def report(self, max_tus=10):
+        '''Returns times, counters and the max_tus slowest TUs as text.'''
+        counters, seconds, tu_seconds = self.counters, self.seconds, self.tu_seconds
+        lines = ['{:>10.3f} s  {}'.format(seconds[name], name) for name in sorted(seconds)]
+        lines += ['{:>10}    {}'.format(counters[name], name) for name in sorted(counters)]
+        slowest = sorted(tu_seconds.items(), key=lambda item: item[1], reverse=True)[:max_tus]
+        if slowest:
+            lines.append('slowest TUs:')
+            lines += ['{:>10.3f} s  {}'.format(value, tu_file_name) for tu_file_name, value in slowest]
+        return '\n'.join(lines) + '\n'
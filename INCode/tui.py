@@ -1,45 +1,126 @@
 # Copyright (C) 2020 R. Knuus
 
 from anytree import Node, RenderTree
-from anytree.search import find
+from collections import defaultdict
 from INCode.call_tree_manager import CallTreeManager
 
 
 class TuiViewModel(object):
-    '''Maintains a view model based on pub/sub updated from actual data model.'''
+    '''Maintains a view model based on pub/sub updated from actual data model.
+
+    The children of a node are only added when it is expanded, so recursive calls end the tree instead of
+    expanding forever. Nodes are indexed by callable name to update all occurrences of a callable at once.
+    '''
     def __init__(self, manager):
         super(TuiViewModel, self).__init__()
         self.manager_ = manager
+        self.manager_.subscribe(self.callables_changed)
         self.root_ = None
+        self.nodes_of_ = defaultdict(list)
         self.included_ = set()
 
     def set_root(self, root):
-        self.root_ = Node(root.name, data=root)
-        self.build_tree_(self.root_)
+        self.nodes_of_ = defaultdict(list)
+        self.root_ = self.add_node_(root, parent=None)
+        self.expand_node_(self.root_)
 
     @property
     def view(self):
+        return self.render()
+
+    def render(self, node_name=None, max_depth=None):
+        '''Renders the expanded nodes below the root or below the first node of node_name, down to max_depth.'''
+        top = self.root_ if node_name is None else next(iter(self.nodes_of_.get(node_name, [])), None)
+        if top is None:
+            return ''
         tree = ''
-        for pre, _, node in RenderTree(self.root_):
+        for pre, _, node in RenderTree(top, maxlevel=None if max_depth is None else max_depth + 1):
             state = 'y' if node.name in self.included_ else ' '
-            tree += ('%s  %s%s\n' % (state, pre, node.name))
+            tree += ('%s  %s%s%s\n' % (state, pre, node.name, self.get_suffix_(node)))
         return tree
 
-    def build_tree_(self, parent):
-        for old_child in parent.children:
-            old_child.parent = None
-        for call in self.manager_.get_calls_of(parent.name):
-            child = Node(call.name, parent=parent)
-            self.build_tree_(child)
+    def get_suffix_(self, node):
+        if node.is_recursive:
+            return ' (recursive)'
+        if not node.is_expanded and self.manager_.get_calls_of(node.name):
+            return ' [+]'
+        return ''
+
+    def expand(self, node_name, depth=1):
+        '''Adds depth levels of children below all collapsed nodes of node_name, returns whether any exists.'''
+        nodes = list(self.nodes_of_.get(node_name, []))
+        for _ in range(depth):
+            expanded = []
+            for node in nodes:
+                self.expand_node_(node)
+                expanded.extend(node.children)
+            nodes = expanded
+        return node_name in self.nodes_of_
+
+    def collapse(self, node_name):
+        for node in list(self.nodes_of_.get(node_name, [])):
+            self.remove_descendants_(node)
+            node.is_expanded = False
 
     def update_node_data(self, new_data):
-        node = find(self.root_, lambda node: node.name == new_data.name)
-        assert node
-        node.data = new_data
-        self.build_tree_(node)
+        nodes = self.nodes_of_.get(new_data.name)
+        assert nodes
+        for node in list(nodes):
+            node.data = new_data
+            if node.is_expanded:
+                self.rebuild_children_(node)
+
+    def callables_changed(self, names):
+        if self.root_ is None:
+            return
+        for name in names:
+            for node in list(self.nodes_of_.get(name, [])):
+                if node.root is not self.root_:
+                    continue  # removed while rebuilding the subtree of another changed node
+                node.data = self.manager_.get_callable(node.name) or node.data
+                if node.is_expanded:
+                    self.rebuild_children_(node)
 
     def node_included(self, node_name):
         self.included_.add(node_name)
 
     def node_excluded(self, node_name):
         self.included_.remove(node_name)
+
+    def add_node_(self, data, parent):
+        is_recursive = parent is not None and any(node.name == data.name for node in parent.path)
+        node = Node(data.name, parent=parent, data=data, is_expanded=False, is_recursive=is_recursive)
+        self.nodes_of_[data.name].append(node)
+        return node
+
+    def expand_node_(self, node):
+        if node.is_expanded or node.is_recursive:
+            return
+        for call in self.manager_.get_calls_of(node.name):
+            self.add_node_(call, parent=node)
+        node.is_expanded = True
+
+    def remove_descendants_(self, node):
+        for descendant in node.descendants:
+            nodes = self.nodes_of_[descendant.name]
+            nodes.remove(descendant)
+            if not nodes:
+                del self.nodes_of_[descendant.name]
+        node.children = ()
+
+    def rebuild_children_(self, node):
+        # descendants expanded before are expanded again if they are still reached by the same path of names
+        expanded_paths = sorted((tuple(ancestor.name for ancestor in descendant.path[len(node.path):])
+                                 for descendant in node.descendants if descendant.is_expanded), key=len)
+        self.remove_descendants_(node)
+        node.is_expanded = False
+        self.expand_node_(node)
+        for expanded_path in expanded_paths:
+            for descendant in self.find_path_(node, expanded_path):
+                self.expand_node_(descendant)
+
+    def find_path_(self, node, names):
+        nodes = [node]
+        for name in names:
+            nodes = [child for parent in nodes for child in parent.children if child.name == name]
+        return nodes
@@ -67,6 +67,13 @@ class Ui_DiagramConfiguration(object):
         self.exitAction_.setObjectName("exitAction_")
         self.revealChildrenAction_ = QtWidgets.QAction(DiagramConfiguration)
         self.revealChildrenAction_.setObjectName("revealChildrenAction_")
+        self.cancelLoadingAction_ = QtWidgets.QAction(DiagramConfiguration)
+        self.cancelLoadingAction_.setObjectName("cancelLoadingAction_")
+        self.showCallersAction_ = QtWidgets.QAction(DiagramConfiguration)
+        self.showCallersAction_.setObjectName("showCallersAction_")
+        self.watchFilesAction_ = QtWidgets.QAction(DiagramConfiguration)
+        self.watchFilesAction_.setCheckable(True)
+        self.watchFilesAction_.setObjectName("watchFilesAction_")
         self.exportAction_ = QtWidgets.QAction(DiagramConfiguration)
         self.exportAction_.setObjectName("exportAction_")
         self.togglePreviewAction_ = QtWidgets.QAction(DiagramConfiguration)
@@ -75,6 +82,9 @@ class Ui_DiagramConfiguration(object):
         self.toggleLayoutAction_.setObjectName("toggleLayoutAction_")
         self.fileMenu_.addAction(self.exitAction_)
         self.actionsMenu_.addAction(self.revealChildrenAction_)
+        self.actionsMenu_.addAction(self.cancelLoadingAction_)
+        self.actionsMenu_.addAction(self.showCallersAction_)
+        self.actionsMenu_.addAction(self.watchFilesAction_)
         self.actionsMenu_.addSeparator()
         self.actionsMenu_.addAction(self.exportAction_)
         self.actionsMenu_.addSeparator()
@@ -94,6 +104,12 @@ class Ui_DiagramConfiguration(object):
         self.exitAction_.setShortcut(_translate("DiagramConfiguration", "Ctrl+Q"))
         self.revealChildrenAction_.setText(_translate("DiagramConfiguration", "Reveal Children"))
         self.revealChildrenAction_.setShortcut(_translate("DiagramConfiguration", "Ctrl+R"))
+        self.cancelLoadingAction_.setText(_translate("DiagramConfiguration", "Cancel Loading"))
+        self.cancelLoadingAction_.setShortcut(_translate("DiagramConfiguration", "Esc"))
+        self.showCallersAction_.setText(_translate("DiagramConfiguration", "Show Callers"))
+        self.showCallersAction_.setShortcut(_translate("DiagramConfiguration", "Ctrl+U"))
+        self.watchFilesAction_.setText(_translate("DiagramConfiguration", "Watch Files"))
+        self.watchFilesAction_.setShortcut(_translate("DiagramConfiguration", "Ctrl+W"))
         self.exportAction_.setText(_translate("DiagramConfiguration", "Export"))
         self.exportAction_.setShortcut(_translate("DiagramConfiguration", "Ctrl+S"))
         self.togglePreviewAction_.setText(_translate("DiagramConfiguration", "Toggle UML"))
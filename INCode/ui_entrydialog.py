@@ -52,6 +52,10 @@ class Ui_EntryDialog(object):
         self.entry_point_list_ = QtWidgets.QListView(EntryDialog)
         self.entry_point_list_.setObjectName("entry_point_list_")
         self.form_layout_.setWidget(6, QtWidgets.QFormLayout.SpanningRole, self.entry_point_list_)
+        self.prefetch_definitions_ = QtWidgets.QCheckBox(EntryDialog)
+        self.prefetch_definitions_.setChecked(False)
+        self.prefetch_definitions_.setObjectName("prefetch_definitions_")
+        self.form_layout_.setWidget(7, QtWidgets.QFormLayout.SpanningRole, self.prefetch_definitions_)
         self.outer_button_box_ = QtWidgets.QHBoxLayout()
         self.outer_button_box_.setSizeConstraint(QtWidgets.QLayout.SetFixedSize)
         self.outer_button_box_.setObjectName("outer_button_box_")
@@ -63,7 +67,7 @@ class Ui_EntryDialog(object):
         self.button_box_.setCenterButtons(False)
         self.button_box_.setObjectName("button_box_")
         self.outer_button_box_.addWidget(self.button_box_)
-        self.form_layout_.setLayout(7, QtWidgets.QFormLayout.SpanningRole, self.outer_button_box_)
+        self.form_layout_.setLayout(8, QtWidgets.QFormLayout.SpanningRole, self.outer_button_box_)
 
         self.retranslateUi(EntryDialog)
         self.button_box_.accepted.connect(EntryDialog.accept)
@@ -78,3 +82,4 @@ class Ui_EntryDialog(object):
         self.browse_compilation_database_button_.setText(_translate("EntryDialog", "Browse..."))
         self.entry_file_label_.setText(_translate("EntryDialog", "Entry file"))
         self.entry_point_label_.setText(_translate("EntryDialog", "Entry point"))
+        self.prefetch_definitions_.setText(_translate("EntryDialog", "Load definitions of callees in the background"))
@@ -1,8 +1,125 @@
 # Copyright (C) 2020 R. Knuus
 
-from PyQt5.QtCore import Qt
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import Qt, QRectF, pyqtSignal
+from PyQt5.QtGui import QImage, QPainter
 from PyQt5.QtSvg import QGraphicsSvgItem, QSvgRenderer
-from PyQt5.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsItem
+from PyQt5.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsItem, QGraphicsObject, QStyleOptionGraphicsItem
+import math
+
+
+TILE_SIZE = 256
+MAX_TILES = 512
+TILING_THRESHOLD = 4096
+FALLBACK_LEVELS = 4
+
+
+def get_zoom_level(level_of_detail):
+    '''Quantizes the scale to powers of two, so tiles are only re-rasterized after zooming by a factor of two.'''
+    return math.ceil(math.log2(max(level_of_detail, 1e-6)))
+
+
+def get_tile_rect(level, column, row):
+    extent = TILE_SIZE / 2 ** level
+    return QRectF(column * extent, row * extent, extent, extent)
+
+
+def get_tile_keys(rect, bounds, level):
+    '''Returns the keys (level, column, row) of the tiles at the zoom level covering rect within bounds.'''
+    rect = rect.intersected(bounds)
+    if rect.isEmpty():
+        return []
+    extent = TILE_SIZE / 2 ** level
+    columns = range(int(rect.left() // extent), int(math.ceil(rect.right() / extent)))
+    rows = range(int(rect.top() // extent), int(math.ceil(rect.bottom() / extent)))
+    return [(level, column, row) for row in rows for column in columns]
+
+
+def rasterize_tile(renderer, bounds, key):
+    level, column, row = key
+    image = QImage(TILE_SIZE, TILE_SIZE, QImage.Format_ARGB32_Premultiplied)
+    image.fill(Qt.transparent)
+    painter = QPainter(image)
+    scale = 2 ** level
+    painter.scale(scale, scale)
+    tile_rect = get_tile_rect(level, column, row)
+    painter.translate(-tile_rect.left(), -tile_rect.top())
+    renderer.render(painter, bounds)
+    painter.end()
+    return image
+
+
+class TiledSvgItem(QGraphicsObject):
+    '''Draws an SVG from tiles rasterized per zoom level in a background thread.
+
+    Only tiles intersecting the exposed area are rasterized. Until they are ready, cached tiles of neighbouring
+    zoom levels are drawn scaled instead.
+    '''
+    tile_rasterized_signal = pyqtSignal(object, object)
+
+    def __init__(self, content, size, parent=None):
+        super(TiledSvgItem, self).__init__(parent)
+        self.content_ = content
+        self.bounds_ = QRectF(0, 0, size.width(), size.height())
+        self.tiles_ = OrderedDict()
+        self.requested_ = set()
+        self.level_ = None
+        self.rasterizer_ = ThreadPoolExecutor(max_workers=1)
+        self.worker_renderer_ = None
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.tile_rasterized_signal.connect(self.add_tile_)
+
+    def boundingRect(self):
+        return self.bounds_
+
+    def paint(self, painter, option, widget=None):
+        level = get_zoom_level(QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform()))
+        if level != self.level_:
+            # tiles requested for the previous zoom level are not needed anymore
+            self.level_ = level
+            self.requested_ = {key for key in self.requested_ if key[0] == level}
+        for key in get_tile_keys(option.exposedRect, self.boundingRect(), level):
+            tile = self.tiles_.get(key)
+            if tile is not None:
+                self.tiles_.move_to_end(key)
+                painter.drawImage(get_tile_rect(*key), tile)
+                continue
+            self.draw_fallback_(painter, get_tile_rect(*key), level)
+            if key not in self.requested_:
+                self.requested_.add(key)
+                self.rasterizer_.submit(self.rasterize_, key)
+
+    def draw_fallback_(self, painter, rect, level):
+        for distance in range(1, FALLBACK_LEVELS + 1):
+            for fallback_level in (level - distance, level + distance):
+                keys = get_tile_keys(rect, self.boundingRect(), fallback_level)
+                if keys and all(key in self.tiles_ for key in keys):
+                    painter.save()
+                    painter.setClipRect(rect)
+                    for key in keys:
+                        painter.drawImage(get_tile_rect(*key), self.tiles_[key])
+                    painter.restore()
+                    return
+
+    def rasterize_(self, key):
+        # runs in the rasterizer thread, which uses its own renderer as QSvgRenderer is not thread-safe
+        if key not in self.requested_:
+            return
+        if not self.worker_renderer_:
+            self.worker_renderer_ = QSvgRenderer(self.content_)
+        self.tile_rasterized_signal.emit(key, rasterize_tile(self.worker_renderer_, self.boundingRect(), key))
+
+    def add_tile_(self, key, tile):
+        self.requested_.discard(key)
+        self.tiles_[key] = tile
+        while len(self.tiles_) > MAX_TILES:
+            self.tiles_.popitem(last=False)
+        self.update(get_tile_rect(*key))
+
+    def stop(self):
+        self.requested_ = set()
+        self.rasterizer_.shutdown(wait=False)
 
 
 class SvgView(QGraphicsView):
@@ -12,15 +129,31 @@ class SvgView(QGraphicsView):
         self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
         self.setDragMode(QGraphicsView.ScrollHandDrag)
         self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
+        self.tiling_threshold_ = TILING_THRESHOLD
+
+    def setTilingThreshold(self, threshold):
+        '''Diagrams wider or higher than threshold pixels are drawn tiled, pass 0 to draw all diagrams tiled.'''
+        self.tiling_threshold_ = threshold
 
     def loadSvgContent(self, content):
         s = self.scene()
+        for item in s.items():
+            if isinstance(item, TiledSvgItem):
+                item.stop()
         s.clear()
         self.resetTransform()
-        item = QGraphicsSvgItem()
-        item.setSharedRenderer(QSvgRenderer(content))
-        item.setFlags(QGraphicsItem.ItemClipsToShape)
-        item.setCacheMode(QGraphicsItem.NoCache)
+        renderer = QSvgRenderer(content)
+        size = renderer.defaultSize()
+        if max(size.width(), size.height()) > self.tiling_threshold_:
+            item = TiledSvgItem(content, size)
+            # only exposed tiles are drawn, so there is no need to redraw the whole viewport
+            self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+        else:
+            item = QGraphicsSvgItem()
+            item.setSharedRenderer(renderer)
+            item.setFlags(QGraphicsItem.ItemClipsToShape)
+            item.setCacheMode(QGraphicsItem.NoCache)
+            self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
         item.setZValue(0)
         s.addItem(item)
 
@@ -22,7 +22,10 @@ setup(
     ],
     scripts=[
         'INCode/bin/tui_client.py',
-        'INCode/bin/call_tree_dumper.py'
+        'INCode/bin/call_tree_dumper.py',
+        'INCode/bin/call_graph_cache.py',
+        'INCode/bin/call_tree_indexer.py',
+        'INCode/bin/call_tree_batch_exporter.py'
     ],
     python_requires='>=3',
     install_requires=[
@@ -0,0 +1,53 @@
+# Copyright (C) 2020 R. Knuus
+
+from contextlib import contextmanager
+from INCode.analysis_server import AnalysisClient, AnalysisServer, RemoteCallTreeManager, ServerError
+from tests.test_environment_generation import generate_file, generate_project
+import os
+import pytest
+import tempfile
+import threading
+
+
+@contextmanager
+def run_server():
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, 'server.sock')
+        server = AnalysisServer(socket_path)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        client = AnalysisClient(socket_path)
+        try:
+            yield client
+        finally:
+            client.close()
+            server.shutdown()
+            thread.join()
+            server.server_close()
+
+
+def test_given_opened_file__remote_manager_answers_calls_of_selected_root():
+    with run_server() as client, generate_file('file.cpp', 'void g() {}\nvoid f() { g(); }\n') as file_name:
+        manager = RemoteCallTreeManager(client)
+        assert list(manager.open(file_name)) == [file_name]
+        assert [callable.name for callable in manager.select_tu(file_name)] == ['g()', 'f()']
+        root = manager.select_root('f()')
+        assert root.is_definition()
+        assert [callable.name for callable in manager.get_calls_of(root.name)] == ['g()']
+
+
+def test_given_dump_requested_twice__server_parses_compilation_database_once():
+    with run_server() as client, generate_project() as file_name:
+        first = client.request('dump', file_name=file_name, entry_point='f_0_0()')
+        second = client.request('dump', file_name=file_name, entry_point='f_0_1()', max_depth=1)
+    assert first['dump'].startswith('f_0_0()\n  f_0_1()\n')
+    assert second['dump'] == 'f_0_1()\n  f_0_2()\n  f_1_5()\n'
+    assert '         4    TUs parsed' in second['statistics'].splitlines()
+
+
+def test_given_command_without_opened_file__client_raises_server_error():
+    with run_server() as client:
+        with pytest.raises(ServerError, match='No file opened'):
+            client.request('calls_of', callable_name='f()')
+        with pytest.raises(ServerError, match='Unknown command'):
+            client.request('parse_everything')
@@ -0,0 +1,52 @@
+# Copyright (C) 2020 R. Knuus
+
+from INCode.batch_exporter import get_diagram_file_name, load_roots
+from INCode.call_tree_manager import CallTreeManager
+from tests.test_environment_generation import generate_file, generate_project
+import json
+import os
+import pytest
+import tempfile
+
+
+def export_batch(roots, jobs):
+    with generate_project() as file_name, tempfile.TemporaryDirectory() as output_directory:
+        manager = CallTreeManager()
+        manager.parse_all(file_name=file_name)
+        file_names = manager.export_batch(roots=roots, output_directory=output_directory, jobs=jobs)
+        diagrams = dict()
+        for diagram_file_name in file_names:
+            with open(diagram_file_name) as diagram:
+                diagrams[os.path.basename(diagram_file_name)] = diagram.read()
+    return diagrams
+
+
+def test_given_roots_with_own_include_patterns__export_batch_writes_diagram_per_root_in_parallel():
+    roots = [{'root': 'f_0_0()', 'include': ['f_0_1()']},
+             {'root': 'f_1_0()', 'include': ['f_2_*'], 'output': 'second.plantuml'}]
+    diagrams = export_batch(roots, jobs=2)
+    assert sorted(diagrams) == ['f_0_0.plantuml', 'second.plantuml']
+    assert 'f_0_1()' in diagrams['f_0_0.plantuml'] and 'f_1_4()' not in diagrams['f_0_0.plantuml']
+    assert 'f_2_' in diagrams['second.plantuml'] and diagrams['second.plantuml'].count('f_1_') == 1  # the root
+
+
+def test_given_unknown_root__export_batch_warns_and_exports_other_roots():
+    with pytest.warns(UserWarning, match='Root g\\(\\) not found'):
+        diagrams = export_batch([{'root': 'g()'}, {'root': 'f_0_0()'}], jobs=1)
+    assert list(diagrams) == ['f_0_0.plantuml']
+
+
+@pytest.mark.parametrize('output', ['../escaped.plantuml', '/tmp/escaped.plantuml', 'sub/../../escaped.plantuml'])
+def test_given_output_outside_of_output_directory__export_batch_warns_and_skips_root(output):
+    with pytest.warns(UserWarning, match='is outside of'):
+        diagrams = export_batch([{'root': 'f_1_0()', 'output': output}, {'root': 'f_0_0()'}], jobs=1)
+    assert list(diagrams) == ['f_0_0.plantuml']
+
+
+def test_given_json_roots_file__load_roots_applies_default_include_patterns_to_plain_names():
+    content = json.dumps(['ns::f(int)', {'root': 'g()', 'include': ['h*']}])
+    with generate_file('roots.json', content) as file_name:
+        roots = load_roots(file_name, include_patterns=['ns::*'])
+    assert roots == [{'root': 'ns::f(int)', 'include': ['ns::*'], 'output': None},
+                     {'root': 'g()', 'include': ['h*'], 'output': None}]
+    assert get_diagram_file_name(roots[0]['root']) == 'ns_f_int.plantuml'
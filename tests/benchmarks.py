@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+'''Measures wall time and peak memory of the analysis pipeline stages on synthetic projects of growing size.
+
+Run from the repository root with: python -m tests.benchmarks [options]
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+from INCode.call_tree_manager import CallTreeManager
+from INCode.clang_access import ClangCallGraphAccess, ClangTUAccess
+from optparse import OptionParser
+from tests.test_environment_generation import generate_project
+import io
+import json
+import resource
+import time
+import tracemalloc
+
+
+ROOT = 'f_0_0()'
+# a sequence diagram unrolls each path until it closes a cycle, so only the small project is recursive
+SIZES = {
+    'small': dict(tu_count=4, functions_per_tu=16, fan_out=2, depth=4, recursion=True, shared_headers=1,
+                  header_functions=50),
+    'medium': dict(tu_count=8, functions_per_tu=32, fan_out=3, depth=5, recursion=False, shared_headers=2,
+                   header_functions=50),
+    'large': dict(tu_count=32, functions_per_tu=64, fan_out=3, depth=6, recursion=False, shared_headers=4,
+                  header_functions=100)
+}
+
+
+def open_session_(compilation_database_file_name):
+    manager = CallTreeManager()
+    files = list(manager.open(compilation_database_file_name))
+    manager.select_tu(files[0])
+    manager.select_root(ROOT)
+    return manager
+
+
+def include_all_(manager):
+    pending = [ROOT]
+    while pending:
+        name = pending.pop()
+        if manager.is_included(name):
+            continue
+        manager.include(name)
+        for call in manager.get_calls_of(name):
+            manager.load_definition(call.name)
+            pending.append(call.name)
+
+
+def prepare_parse_tu(compilation_database_file_name):
+    files = ClangTUAccess(compilation_database_file_name).files
+    tu_file_name = next(iter(files))
+    return lambda: ClangCallGraphAccess().parse_tu(tu_file_name=tu_file_name, compiler_arguments=files[tu_file_name])
+
+
+def prepare_parse_tus(compilation_database_file_name):
+    files = ClangTUAccess(compilation_database_file_name).files
+    return lambda: ClangCallGraphAccess().parse_tus(files=files)
+
+
+def prepare_build_tree(compilation_database_file_name):
+    files = ClangTUAccess(compilation_database_file_name).files
+    tu_file_name = next(iter(files))
+    access = ClangCallGraphAccess()
+    tu = access.index.parse(tu_file_name, files[tu_file_name])
+    return lambda: access.extract_fragment_from_tu_(tu, tu_file_name, files[tu_file_name])
+
+
+def prepare_load_definition(compilation_database_file_name):
+    manager = open_session_(compilation_database_file_name)
+    # the first callee defined in another TU
+    callee = next(call for call in manager.get_calls_of(ROOT) if not call.is_definition())
+    return lambda: manager.load_definition(callee.name)
+
+
+def prepare_export(compilation_database_file_name):
+    manager = open_session_(compilation_database_file_name)
+    include_all_(manager)
+    return lambda: manager.export(io.StringIO())
+
+
+def prepare_dump(compilation_database_file_name):
+    return lambda: CallTreeManager().dump(compilation_database_file_name, ROOT, stream=io.StringIO(), max_depth=8)
+
+
+STAGES = {
+    'parse_tu': prepare_parse_tu,
+    'parse_tus': prepare_parse_tus,
+    'build_tree_': prepare_build_tree,
+    'load_definition': prepare_load_definition,
+    'export': prepare_export,
+    'dump': prepare_dump
+}
+
+
+def measure_(stage, compilation_database_file_name):
+    '''Runs in a fresh worker process, which the preparation of the stage has already grown.
+
+    The peak resident set size only ever grows, so the stage is charged with how far it raised the peak reached
+    while preparing it. Memory the stage allocates below that peak is not seen.
+    '''
+    run = STAGES[stage](compilation_database_file_name)
+    prepared_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # ru_maxrss also covers memory allocated by libclang, which tracemalloc does not see
+    rss_increase = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - prepared_rss) * 1024
+    return {'seconds': seconds, 'python_peak': python_peak, 'rss_increase': rss_increase}
+
+
+def run_benchmarks(sizes, stages, repeat=1):
+    results = []
+    for size in sizes:
+        with generate_project(**SIZES[size]) as compilation_database_file_name:
+            for stage in stages:
+                measurements = []
+                for _ in range(repeat):
+                    with ProcessPoolExecutor(max_workers=1) as executor:
+                        measurements.append(executor.submit(measure_, stage, compilation_database_file_name).result())
+                result = min(measurements, key=lambda measurement: measurement['seconds'])
+                result.update({'size': size, 'stage': stage})
+                results.append(result)
+    return results
+
+
+def format_results(results, baseline=None):
+    baseline_seconds = {(result['size'], result['stage']): result['seconds'] for result in baseline or []}
+    lines = ['{:<8} {:<16} {:>10} {:>12} {:>12} {:>9}'.format('size', 'stage', 'seconds', 'python MiB', 'RSS +MiB',
+                                                                 'vs. base')]
+    for result in results:
+        reference = baseline_seconds.get((result['size'], result['stage']))
+        change = '{:+.0%}'.format(result['seconds'] / reference - 1) if reference else ''
+        lines.append('{:<8} {:<16} {:>10.4f} {:>12.1f} {:>12.1f} {:>9}'.format(
+            result['size'], result['stage'], result['seconds'], result['python_peak'] / 1024 / 1024,
+            result['rss_increase'] / 1024 / 1024, change))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = OptionParser('usage: %prog [options]')
+    parser.add_option('', '--size', action='append', dest='sizes', default=[],
+                      help='Benchmark projects of size NAME, one of {} (repeatable) [default: all]'.format(
+                          ', '.join(SIZES)),
+                      metavar='NAME')
+    parser.add_option('', '--stage', action='append', dest='stages', default=[],
+                      help='Benchmark stage NAME, one of {} (repeatable) [default: all]'.format(', '.join(STAGES)),
+                      metavar='NAME')
+    parser.add_option('-r', '--repeat', dest='repeat', type=int, default=3,
+                      help='Report the fastest of N runs [default: %default]', metavar='N')
+    parser.add_option('', '--output', dest='output', default=None,
+                      help='Write the results as JSON to FILE', metavar='FILE')
+    parser.add_option('', '--baseline', dest='baseline', default=None,
+                      help='Compare with results written by --output before', metavar='FILE')
+    (opts, args) = parser.parse_args()
+
+    if len(args) > 0:
+        parser.error('invalid number arguments')
+    for name, choices in [(size, SIZES) for size in opts.sizes] + [(stage, STAGES) for stage in opts.stages]:
+        if name not in choices:
+            parser.error('unknown size or stage {}'.format(name))
+
+    results = run_benchmarks(sizes=opts.sizes or list(SIZES), stages=opts.stages or list(STAGES),
+                             repeat=opts.repeat)
+    baseline = None
+    if opts.baseline:
+        with open(opts.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    print(format_results(results, baseline))
+    if opts.output:
+        with open(opts.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+# Copyright (C) 2020 R. Knuus
+
+from INCode.call_tree_manager import CallTreeManager
+from tests.benchmarks import format_results, run_benchmarks
+from tests.test_environment_generation import generate_project
+
+
+def test_given_generated_recursive_project__dump_marks_recursive_call():
+    with generate_project(tu_count=2, functions_per_tu=4, fan_out=1, depth=2, recursion=True) as file_name:
+        dump = CallTreeManager().dump(file_name, 'f_0_0()')
+    assert dump.splitlines()[:3] == ['f_0_0()', '  f_0_1()', '    f_0_0() (recursive)']
+
+
+def test_given_baseline__format_results_compares_seconds():
+    results = run_benchmarks(sizes=['small'], stages=['build_tree_'])
+    assert set(results[0]) == {'size', 'stage', 'seconds', 'python_peak', 'rss_increase'}
+    baseline = [dict(results[0], seconds=results[0]['seconds'] / 2)]
+    assert format_results(results, baseline).splitlines()[1].endswith('+100%')
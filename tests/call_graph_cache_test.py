@@ -0,0 +1,75 @@
+# Copyright (C) 2020 R. Knuus
+
+from INCode.call_graph_cache import CallGraphCache
+from INCode.clang_access import ClangCallGraphAccess, get_parse_options
+from tests.test_environment_generation import generate_file
+import INCode.clang_access
+import os
+import tempfile
+
+
+def fail_to_create_index():
+    raise AssertionError('unexpected parse')
+
+
+def test_given_cached_tu__parse_tu_does_not_parse_again(monkeypatch):
+    with tempfile.TemporaryDirectory() as cache_directory:
+        cache = CallGraphCache(directory=cache_directory)
+        with generate_file('two-functions.cpp', 'void f() {}\nvoid g() {f();}') as file_name:
+            ClangCallGraphAccess(cache=cache).parse_tu(tu_file_name=file_name, compiler_arguments=[])
+            monkeypatch.setattr(INCode.clang_access.Index, 'create', fail_to_create_index)
+            access = ClangCallGraphAccess(cache=CallGraphCache(directory=cache_directory))
+            access.parse_tu(tu_file_name=file_name, compiler_arguments=[])
+    assert [callable.name for callable in access.get_calls_of('g()')] == ['f()']
+
+
+def test_given_changed_include__parse_tu_parses_again():
+    with tempfile.TemporaryDirectory() as cache_directory:
+        cache = CallGraphCache(directory=cache_directory)
+        with generate_file('include.h', 'void f() {}') as include_file_name:
+            content = '#include "{}"\nvoid g() {{f();}}'.format(include_file_name)
+            with generate_file('main_file.cpp', content) as main_file_name:
+                ClangCallGraphAccess(cache=cache).parse_tu(tu_file_name=main_file_name, compiler_arguments=[])
+                with open(include_file_name, 'w') as include_file:
+                    include_file.write('void f() {}\nvoid h() {}')
+                access = ClangCallGraphAccess(cache=cache)
+                access.parse_tu(tu_file_name=main_file_name, compiler_arguments=[])
+        assert len(cache.entries) == 2
+    assert 'h()' in access.callables
+
+
+def test_given_cache_exceeding_max_size__evict_removes_least_recently_used_entries():
+    with tempfile.TemporaryDirectory() as cache_directory:
+        cache = CallGraphCache(directory=cache_directory)
+        with generate_file('f.cpp', 'void f() {}') as file_name:
+            ClangCallGraphAccess(cache=cache).parse_tu(tu_file_name=file_name, compiler_arguments=[])
+        with generate_file('g.cpp', 'void g() {}') as file_name:
+            ClangCallGraphAccess(cache=cache).parse_tu(tu_file_name=file_name, compiler_arguments=[])
+        cache.evict(max_size=max(entry.size for entry in cache.entries))
+        assert len(cache.entries) == 1
+
+
+def test_given_store_exceeding_max_size__store_evicts_fragment_with_its_manifest():
+    with tempfile.TemporaryDirectory() as cache_directory:
+        with generate_file('f.cpp', 'void f() {}') as file_name:
+            ClangCallGraphAccess(cache=CallGraphCache(directory=cache_directory)).parse_tu(
+                tu_file_name=file_name, compiler_arguments=[])
+        fragment_size = CallGraphCache(directory=cache_directory).size
+        cache = CallGraphCache(directory=cache_directory, max_size=fragment_size * 3 // 2)
+        with generate_file('g.cpp', 'void g() {}') as file_name:
+            ClangCallGraphAccess(cache=cache).parse_tu(tu_file_name=file_name, compiler_arguments=[])
+        manifests = [file_name for file_name in os.listdir(cache_directory) if file_name.endswith('.manifest')]
+        assert len(manifests) == 1
+        assert [entry.file_name.split('-')[0] for entry in cache.entries] == [manifests[0][:-len('.manifest')]]
+
+
+def test_given_tu_cached_with_other_parse_options__parse_tu_parses_again():
+    with tempfile.TemporaryDirectory() as cache_directory:
+        with generate_file('f.cpp', 'void h() {}\nvoid f() { h(); }\n') as file_name:
+            skipping_bodies = ClangCallGraphAccess(cache=CallGraphCache(directory=cache_directory),
+                                                   parse_options=get_parse_options(['skip-function-bodies']))
+            skipping_bodies.parse_tu(tu_file_name=file_name, compiler_arguments=[])
+            access = ClangCallGraphAccess(cache=CallGraphCache(directory=cache_directory))
+            access.parse_tu(tu_file_name=file_name, compiler_arguments=[])
+    assert skipping_bodies.get_calls_of('f()') == []
+    assert [callable.name for callable in access.get_calls_of('f()')] == ['h()']
@@ -1,8 +1,13 @@
 # Copyright (C) 2020 R. Knuus
 
+from INCode.call_graph_cache import CallGraphCache
 from INCode.call_tree_manager import CallTreeManager, CallTreeManagerState
 from tests.test_environment_generation import generate_file
+import io
+import json
+import os
 import pytest
+import tempfile
 
 
 def test_given_call_tree_depth_of_two__dump_returns_extected_output():
@@ -13,6 +18,56 @@ def test_given_call_tree_depth_of_two__dump_returns_extected_output():
     assert actual == excepted
 
 
+def test_given_compilation_database_with_two_tus__parallel_dump_returns_same_output_as_serial_dump():
+    with generate_file('f.cpp', 'void h() {}\nvoid f() { h(); }') as f_file_name:
+        with generate_file('g.cpp', 'extern void f();\nvoid g() { f(); }') as g_file_name:
+            content = json.dumps([{'command': '', 'file': g_file_name}, {'command': '', 'file': f_file_name}])
+            with generate_file('compile_commands.json', content) as file_name:
+                serial = CallTreeManager().dump(file_name, 'g()')
+                parallel = CallTreeManager().dump(file_name, 'g()', jobs=2)
+    assert serial == 'g()\n  f()\n    h()\n'
+    assert parallel == serial
+
+
+def test_given_mutually_recursive_functions__dump_marks_cycles_and_terminates():
+    manager = CallTreeManager()
+    excepted = 'f()\n  g()\n    f() (recursive)\n'
+    with generate_file('recursion.cpp', 'void f();\nvoid g() {f();}\nvoid f() {g();}') as file_name:
+        actual = manager.dump(file_name, 'f()')
+    assert actual == excepted
+
+
+def test_given_max_depth_of_one__dump_returns_direct_calls_only():
+    manager = CallTreeManager()
+    with generate_file('three-functions.cpp', 'void h() {}\nvoid g() {h();}\nvoid f() {g();}') as file_name:
+        actual = manager.dump(file_name, 'f()', max_depth=1)
+    assert actual == 'f()\n  g()\n'
+
+
+def test_given_max_depth_of_zero__dump_returns_root_only():
+    manager = CallTreeManager()
+    with generate_file('three-functions.cpp', 'void h() {}\nvoid g() {h();}\nvoid f() {g();}') as file_name:
+        actual = manager.dump(file_name, 'f()', max_depth=0)
+    assert actual == 'f()\n'
+
+
+def test_given_json_format__dump_writes_one_json_line_per_call():
+    manager = CallTreeManager()
+    with generate_file('two-functions.cpp', 'void g() {}\nvoid f() {g();}') as file_name:
+        stream = io.StringIO()
+        manager.dump(file_name, 'f()', stream=stream, format='json')
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(record['caller'], record['callee']) for record in records] == [(None, 'f()'), ('f()', 'g()')]
+
+
+def test_given_dot_format__dump_writes_each_edge_once():
+    manager = CallTreeManager()
+    content = 'void h() {}\nvoid g() {h();}\nvoid f() {g(); h(); g();}'
+    with generate_file('three-functions.cpp', content) as file_name:
+        actual = manager.dump(file_name, 'f()', format='dot')
+    assert actual == 'digraph calls {\n  "f()";\n  "f()" -> "g()";\n  "g()" -> "h()";\n  "f()" -> "h()";\n}\n'
+
+
 def test_given_source_file__open_returns_tu_list_with_one_item():
     manager = CallTreeManager()
     with generate_file('file.cpp', '') as file_name:
@@ -85,6 +140,21 @@ def test_given_tu_referencing_function_in_other_tu__load_definition_grows_call_t
     assert len(grand_children) == 1
 
 
+def test_given_released_definition_candidates__call_tree_is_unchanged_and_definition_loads_again():
+    manager = CallTreeManager()
+    with generate_file('g.cpp', 'extern void f();\nvoid g() { f(); }') as file_name:
+        manager.open(file_name)
+        manager.select_tu(file_name)
+    with generate_file('f.cpp', 'void h() {}\nvoid f() { h(); }\n') as file_name:
+        manager.state_ = CallTreeManagerState.READY_TO_SELECT_TU
+        manager.open(file_name)
+        manager.release_definition_candidates(manager.parse_definition_candidates('f()'))
+        assert manager.get_calls_of('f()') == []
+        definition = manager.merge_definition_candidates('f()', manager.parse_definition_candidates('f()'))
+    assert definition.is_definition()
+    assert [callable.name for callable in manager.get_calls_of('f()')] == ['h()']
+
+
 def test_given_no_callable_included__export_returns_empty_diagram():
     manager = CallTreeManager()
     with generate_file('file.cpp', 'void f();\nvoid g() { f(); }') as file_name:
@@ -149,3 +219,120 @@ def test_given_methods_of_same_class__use_class_as_participant():
     expected = '@startuml\n\n -> "Foo": baz()\nactivate "Foo"\n"Foo" -> "Foo": bar()\nactivate "Foo"\ndeactivate "Foo"\ndeactivate "Foo"\n\n@enduml'
     actual = manager.export()
     assert actual == expected
+
+
+def test_given_watched_tu_modified__refresh_replaces_its_calls_and_notifies_observers():
+    manager = CallTreeManager()
+    notifications = []
+    manager.subscribe(notifications.append)
+    with generate_file('file.cpp', 'void f();\nvoid g() { f(); }') as file_name:
+        manager.open(file_name)
+        manager.select_tu(file_name)
+        manager.set_watch(True)
+        assert manager.refresh() == set()
+        with open(file_name, 'w') as file:
+            file.write('void f();\nvoid h();\nvoid g() { h(); }')
+        os.utime(file_name, ns=(0, 0))
+        changed = manager.refresh()
+    assert [callable.name for callable in manager.get_calls_of('g()')] == ['h()']
+    assert changed == {'g()', 'h()'}
+    assert notifications == [changed]
+
+
+def test_given_compilation_database_with_relative_paths__select_tu_resolves_them_against_entry_directory():
+    with generate_file('f.cpp', '#include "g.h"\nvoid f() { g(); }') as tu_file_name:
+        directory = os.path.dirname(tu_file_name)
+        os.mkdir(os.path.join(directory, 'include'))
+        with open(os.path.join(directory, 'include', 'g.h'), 'w') as header_file:
+            header_file.write('void g() {}')
+        content = json.dumps([{'directory': directory, 'arguments': ['c++', '-Iinclude', '-c', 'f.cpp'],
+                               'file': 'f.cpp'}])
+        with generate_file('compile_commands.json', content) as file_name:
+            manager = CallTreeManager()
+            assert list(manager.open(file_name)) == [tu_file_name]
+            manager.select_tu(tu_file_name)
+            root = manager.select_root('f()')
+    assert [callable.name for callable in manager.get_calls_of(root.name)] == ['g()']
+
+
+def test_given_header_found_by_relative_include_path__cache_stores_tu_and_refresh_notices_header_change():
+    with generate_file('f.cpp', '#include "g.h"\nvoid f() { g(); }') as tu_file_name:
+        directory = os.path.dirname(tu_file_name)
+        header_file_name = os.path.join(directory, 'include', 'g.h')
+        os.mkdir(os.path.dirname(header_file_name))
+        with open(header_file_name, 'w') as header_file:
+            header_file.write('void g();')
+        content = json.dumps([{'directory': directory, 'arguments': ['c++', '-Iinclude', '-c', 'f.cpp'],
+                               'file': 'f.cpp'}])
+        with generate_file('compile_commands.json', content) as file_name, \
+                tempfile.TemporaryDirectory() as cache_directory:
+            cache = CallGraphCache(directory=cache_directory)
+            manager = CallTreeManager(cache=cache)
+            manager.open(file_name)
+            manager.select_tu(tu_file_name)
+            assert len(cache.entries) == 1
+            assert manager.get_callable('g()').file_name == header_file_name
+            manager.set_watch(True)
+            with open(header_file_name, 'w') as header_file:
+                header_file.write('void h();\ninline void g() { h(); }')
+            os.utime(header_file_name, ns=(0, 0))
+            changed = manager.refresh()
+    assert 'g()' in changed
+    assert [callable.name for callable in manager.get_calls_of('g()')] == ['h()']
+
+def test_given_definition_in_header_of_other_tu__load_definition_parses_tu_including_header():
+    with generate_file('f.h', 'void f();') as declaration_file_name:
+        directory = os.path.dirname(declaration_file_name)
+        files = {'f_impl.h': 'void h() {}\nvoid f() { h(); }',
+                 'f.cpp': '#include "f_impl.h"\n',
+                 'main.cpp': '#include "f.h"\nvoid g() { f(); }'}
+        for file_name, content in files.items():
+            with open(os.path.join(directory, file_name), 'w') as file:
+                file.write(content)
+        content = json.dumps([{'directory': directory, 'command': '', 'file': file_name}
+                              for file_name in ['main.cpp', 'f.cpp']])
+        with generate_file('compile_commands.json', content) as file_name:
+            manager = CallTreeManager()
+            manager.open(file_name)
+            manager.select_tu(os.path.join(directory, 'main.cpp'))
+            manager.select_root('g()')
+            definition = manager.load_definition('f()')
+    assert definition.is_definition()
+    assert [callable.name for callable in manager.get_calls_of('f()')] == ['h()']
+
+
+def test_given_function_called_by_two_functions__get_callers_of_returns_both():
+    manager = CallTreeManager()
+    with generate_file('callers.cpp', 'void h() {}\nvoid g() { h(); }\nvoid f() { h(); g(); }') as file_name:
+        manager.open(file_name)
+        manager.select_tu(file_name)
+    assert [callable.name for callable in manager.get_callers_of('h()')] == ['g()', 'f()']
+
+
+def test_given_definition_in_other_tu__statistics_count_parsed_candidates_and_added_calls():
+    manager = CallTreeManager()
+    with generate_file('g.cpp', 'extern void f();\nvoid g() { f(); }') as file_name:
+        manager.open(file_name)
+        manager.select_tu(file_name)
+    with generate_file('f.cpp', 'void h() {}\nvoid f() { h(); }\n') as file_name:
+        manager.state_ = CallTreeManagerState.READY_TO_SELECT_TU
+        manager.open(file_name)
+        manager.load_definition('f()')
+    counters = manager.statistics.counters
+    assert counters['TUs parsed'] == 2
+    assert counters['definition lookups'] == 1
+    assert counters['candidate TUs parsed'] == 1
+    assert counters['calls added'] == 2
+    assert file_name in manager.statistics.tu_seconds
+
+
+def test_given_watched_tu_deleted__refresh_warns_and_keeps_call_graph():
+    manager = CallTreeManager()
+    with generate_file('file.cpp', 'void f();\nvoid g() { f(); }') as file_name:
+        manager.open(file_name)
+        manager.select_tu(file_name)
+        manager.set_watch(True)
+        os.remove(file_name)
+        with pytest.warns(UserWarning, match='Failed to re-parse'):
+            assert manager.refresh() == set()
+    assert [callable.name for callable in manager.get_calls_of('g()')] == ['f()']
@@ -1,9 +1,14 @@
 # Copyright (C) 2020 R. Knuus
 
 
-from INCode.clang_access import ClangCallGraphAccess
+from clang.cindex import TranslationUnit
+from INCode.clang_access import ClangCallGraphAccess, DEFINITION_PARSE_OPTIONS, get_parse_options
 from tests.test_environment_generation import generate_file
+import INCode.clang_access
+import os
+import pickle
 import pytest
+import sys
 
 
 def get_names_of_calls(calls):
@@ -83,3 +88,125 @@ def test__given_parsed_tu_with_one_function__get_callable_returns_callable_with_
     expected = 'f()'
     actual = callable.name
     assert expected == actual
+
+
+def test__given_excluded_header__parse_tu_skips_its_calls():
+    with generate_file('include.h', 'void f() {}\ninline void g() { f(); }') as include_file_name:
+        content = '#include "{}"\nvoid h() {{ g(); }}'.format(include_file_name)
+        with generate_file('main_file.cpp', content) as main_file_name:
+            access = ClangCallGraphAccess(exclude_patterns=[include_file_name])
+            access.parse_tu(tu_file_name=main_file_name, compiler_arguments=[])
+    assert get_names_of_calls(access.get_calls_of('h()')) == ['g()']
+    assert access.get_calls_of('g()') == []
+
+
+def test__given_system_include_directory__parse_tu_skips_its_calls():
+    with generate_file('include.h', 'void f() {}\ninline void g() { f(); }') as include_file_name:
+        content = '#include <include.h>\nvoid h() { g(); }'
+        with generate_file('main_file.cpp', content) as main_file_name:
+            access = ClangCallGraphAccess()
+            access.parse_tu(tu_file_name=main_file_name,
+                            compiler_arguments=['-isystem', os.path.dirname(include_file_name)])
+    assert get_names_of_calls(access.get_calls_of('h()')) == ['g()']
+    assert access.get_calls_of('g()') == []
+
+
+def test__given_deeply_nested_expression__parse_tu_does_not_exceed_recursion_limit():
+    depth = sys.getrecursionlimit()
+    content = 'int f(int i) {{ return {}0{}; }}'.format('(' * depth, ')' * depth)
+    with generate_file('nested.cpp', content) as file_name:
+        access = ClangCallGraphAccess()
+        access.parse_tu(tu_file_name=file_name, compiler_arguments=['-fbracket-depth={}'.format(depth + 1)])
+    assert 'f(int)' in access.callables
+
+
+def test__given_functions_in_nested_namespaces__callables_are_qualified_with_shared_interned_names():
+    content = 'namespace a { namespace b { void f() {}\nvoid g() { f(); } } }'
+    with generate_file('namespaces.cpp', content) as file_name:
+        access = ClangCallGraphAccess()
+        access.parse_tu(tu_file_name=file_name, compiler_arguments=[])
+    assert get_names_of_calls(access.get_calls_of('a::b::g()')) == ['a::b::f()']
+    assert sorted(access.qualified_names_.values()) == ['a', 'a::b', 'a::b::f()', 'a::b::g()']
+    assert access.get_calls_of('a::b::g()')[0].name is access.callables['a::b::f()'].name
+
+
+def test__given_parsed_tu__callables_are_picklable_value_records_with_usr():
+    access = ClangCallGraphAccess()
+    with generate_file('two-functions.cpp', 'void f() {}\nvoid g() {f();}') as file_name:
+        access.parse_tu(tu_file_name=file_name, compiler_arguments=[])
+    callable = access.get_callable('f()')
+    assert not hasattr(callable, '__dict__')
+    assert callable.usr == 'c:@F@f#'
+    assert pickle.loads(pickle.dumps(callable)) == callable
+
+
+def test__given_two_tus__parse_tu_creates_one_index(monkeypatch):
+    created_indices = []
+    create_index = INCode.clang_access.Index.create
+
+    def create_counted_index():
+        created_indices.append(create_index())
+        return created_indices[-1]
+
+    monkeypatch.setattr(INCode.clang_access.Index, 'create', create_counted_index)
+    access = ClangCallGraphAccess()
+    with generate_file('f.cpp', 'void f() {}') as file_name:
+        access.parse_tu(tu_file_name=file_name, compiler_arguments=[])
+    with generate_file('g.cpp', 'void g() {}') as file_name:
+        access.parse_tu(tu_file_name=file_name, compiler_arguments=[], options=DEFINITION_PARSE_OPTIONS)
+    assert len(created_indices) == 1
+    assert len(access.callables) == 2
+
+
+def test__given_worker_loading_two_tus__worker_creates_one_index(monkeypatch):
+    created_indices = []
+    create_index = INCode.clang_access.Index.create
+
+    def create_counted_index():
+        created_indices.append(create_index())
+        return created_indices[-1]
+
+    monkeypatch.setattr(INCode.clang_access.Index, 'create', create_counted_index)
+    monkeypatch.setattr(INCode.clang_access, 'WORKER_ACCESS', None)
+    INCode.clang_access.init_worker_(include_system_headers=False, exclude_patterns=[],
+                                     parse_options=TranslationUnit.PARSE_NONE, cache=None)
+    with generate_file('f.cpp', 'void f() {}') as file_name:
+        f_fragment = INCode.clang_access.load_fragment_(file_name, [])
+    with generate_file('g.cpp', 'void g() {}') as file_name:
+        g_fragment = INCode.clang_access.load_fragment_(file_name, [])
+    assert len(created_indices) == 1
+    assert list(f_fragment.callables) == ['f()'] and list(g_fragment.callables) == ['g()']
+
+
+def test__given_parse_option_names__get_parse_options_combines_flags():
+    expected = TranslationUnit.PARSE_INCOMPLETE | TranslationUnit.PARSE_PRECOMPILED_PREAMBLE
+    assert get_parse_options(['incomplete', 'precompiled-preamble']) == expected
+    with pytest.raises(ValueError):
+        get_parse_options(['no-such-option'])
+
+
+def test__given_declaration_in_header_and_definition_in_tu__get_callables_in_lists_definition_in_tu_only():
+    with generate_file('include.h', 'void f();') as include_file_name:
+        content = '#include "{}"\nvoid f() {{}}'.format(include_file_name)
+        with generate_file('main_file.cpp', content) as main_file_name:
+            access = ClangCallGraphAccess()
+            access.parse_tu(tu_file_name=main_file_name, compiler_arguments=[])
+            assert get_names_of_calls(access.get_callables_in(main_file_name)) == ['f()']
+            assert access.get_callables_in(include_file_name) == []
+
+
+def test__given_parsed_tu__callables_is_read_only():
+    access = ClangCallGraphAccess()
+    with generate_file('one-function.cpp', 'void f() {}') as file_name:
+        access.parse_tu(tu_file_name=file_name, compiler_arguments=[])
+    with pytest.raises(TypeError):
+        access.callables['g()'] = access.callables['f()']
+
+
+def test__given_function_called_twice_by_one_and_once_by_another_function__get_callers_of_returns_each_caller_once():
+    access = ClangCallGraphAccess()
+    content = 'void h() {}\nvoid g() { h(); h(); }\nvoid f() { h(); }'
+    with generate_file('callers.cpp', content) as file_name:
+        access.parse_tu(tu_file_name=file_name, compiler_arguments=[])
+    assert get_names_of_calls(access.get_callers_of('h()')) == ['g()', 'f()']
+    assert access.get_callers_of('f()') == []
@@ -1,7 +1,11 @@
 # Copyright (C) 2020 R. Knuus
 
 from INCode.clang_access import ClangTUAccess
+from INCode.compilation_database import iter_json_array
 from tests.test_environment_generation import generate_file
+import io
+import json
+import os
 import pytest
 
 
@@ -41,3 +45,27 @@ def test__given_compilation_database_with_one_file__return_file_and_args():
 def test__given_non_existing_file__parse_tu_throws():
     with pytest.raises(FileNotFoundError):
         ClangTUAccess(file_name='a-file-that-doesnt-exist')
+
+
+def test__given_compilation_database_with_arguments_form__return_file_and_args_without_compiler_and_file():
+    content = '[{ "arguments": ["clang++", "-DNDEBUG", "-c", "file.cpp"], "file": "file.cpp" }]'
+    with generate_file('compile_commands.json', content) as file_name:
+        access = ClangTUAccess(file_name=file_name, extra_arguments=['-std=c++11'])
+    assert access.files == {'file.cpp': ['-DNDEBUG', '-std=c++11']}
+
+
+def test__given_entries_in_different_directories__resolve_files_per_entry_without_changing_directory():
+    content = json.dumps([{'directory': '/a', 'command': 'c++ -Iinclude -c a.cpp', 'file': 'a.cpp'},
+                          {'directory': '/b', 'command': 'c++ -c ../b/b.cpp', 'file': '../b/b.cpp'}])
+    working_directory = os.getcwd()
+    with generate_file('compile_commands.json', content) as file_name:
+        access = ClangTUAccess(file_name=file_name)
+    assert os.getcwd() == working_directory
+    assert access.files == {'/a/a.cpp': ['-working-directory', '/a', '-Iinclude'],
+                            '/b/b.cpp': ['-working-directory', '/b']}
+
+
+def test__given_compilation_database_larger_than_one_chunk__iter_json_array_returns_all_entries():
+    entries = [{'command': '-DINDEX={}'.format(index), 'file': 'file{}.cpp'.format(index)} for index in range(100)]
+    actual = list(iter_json_array(io.StringIO(json.dumps(entries, indent=2)), chunk_size=7))
+    assert actual == entries
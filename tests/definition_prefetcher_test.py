@@ -0,0 +1,39 @@
+# Copyright (C) 2020 R. Knuus
+
+from INCode.call_tree_manager import CallTreeManager
+from tests.test_environment_generation import generate_file
+import json
+
+
+def select_root_with_prefetch(compilation_database_file_name, tu_file_name, root_name, depth=1, max_tus=16):
+    manager = CallTreeManager()
+    manager.set_prefetch(depth=depth, max_tus=max_tus)
+    manager.open(compilation_database_file_name)
+    manager.select_tu(tu_file_name)
+    manager.select_root(root_name)
+    manager.prefetcher_.wait_until_idle()
+    return manager
+
+
+def test_given_callee_defined_in_other_tu__select_root_prefetches_its_definition():
+    with generate_file('f.cpp', 'void h() {}\nvoid f() { h(); }') as f_file_name:
+        with generate_file('g.cpp', 'extern void f();\nvoid g() { f(); }') as g_file_name:
+            content = json.dumps([{'command': '', 'file': g_file_name}, {'command': '', 'file': f_file_name}])
+            with generate_file('compile_commands.json', content) as file_name:
+                manager = select_root_with_prefetch(file_name, g_file_name, 'g()')
+    assert manager.get_callable('f()').is_definition()
+    assert [callable.name for callable in manager.get_calls_of('f()')] == ['h()']
+    assert manager.load_definition('f()').is_definition()
+
+
+def test_given_exhausted_budget__select_root_stops_prefetching():
+    with generate_file('f.cpp', 'extern void h();\nvoid f() { h(); }') as f_file_name:
+        with generate_file('h.cpp', 'void h() {}') as h_file_name:
+            with generate_file('g.cpp', 'extern void f();\nvoid g() { f(); }') as g_file_name:
+                content = json.dumps([{'command': '', 'file': file_name}
+                                      for file_name in [g_file_name, f_file_name, h_file_name]])
+                with generate_file('compile_commands.json', content) as file_name:
+                    manager = select_root_with_prefetch(file_name, g_file_name, 'g()', depth=2, max_tus=1)
+    assert manager.get_callable('f()').is_definition()
+    assert not manager.get_callable('h()').is_definition()
+    assert manager.prefetcher_.loaded_tus == 1
@@ -0,0 +1,45 @@
+# Copyright (C) 2020 R. Knuus
+
+from INCode.identifier_index import get_index_file_name, IdentifierIndex
+from tests.test_environment_generation import generate_file
+import os
+import tempfile
+
+
+def test_given_file_with_identifier__find_returns_file():
+    with generate_file('file.cpp', 'void foo() { bar(); }') as file_name:
+        index = IdentifierIndex()
+        index.update([file_name])
+    assert index.find('bar') == {file_name}
+    assert index.find('ba') == set()
+
+
+def test_given_modified_file__update_replaces_its_identifiers():
+    with generate_file('file.cpp', 'void foo();') as file_name:
+        index = IdentifierIndex()
+        index.update([file_name])
+        with open(file_name, 'w') as file:
+            file.write('void bar();')
+        os.utime(file_name, ns=(0, 0))
+        index.update([file_name])
+    assert index.find('foo') == set()
+    assert index.find('bar') == {file_name}
+
+
+def test_given_stored_index__new_index_loads_it_without_reading_files():
+    with generate_file('file.cpp', 'void foo();') as file_name:
+        index_file_name = get_index_file_name(os.path.join(os.path.dirname(file_name), 'compile_commands.json'))
+        IdentifierIndex(index_file_name).update([file_name])
+        index = IdentifierIndex(index_file_name)
+    assert index.find('foo') == {file_name}
+
+
+def test_given_index_stored_twice__directory_contains_only_index_file():
+    with tempfile.TemporaryDirectory() as directory, generate_file('file.cpp', 'void foo();') as file_name:
+        index_file_name = get_index_file_name(os.path.join(directory, 'compile_commands.json'))
+        index = IdentifierIndex(index_file_name)
+        index.update([file_name])
+        os.utime(file_name, ns=(0, 0))
+        index.update([file_name])
+        assert os.listdir(directory) == [os.path.basename(index_file_name)]
+        assert IdentifierIndex(index_file_name).find('foo') == {file_name}
@@ -0,0 +1,64 @@
+# Copyright (C) 2020 R. Knuus
+
+from INCode.compilation_database import CompilationDatabase
+from INCode.include_graph import get_include_directories, get_include_graph_file_name, IncludeGraph
+from tests.test_environment_generation import generate_file
+import INCode.compilation_database
+import INCode.include_graph
+import json
+import os
+
+
+def write_file(directory, file_name, content):
+    with open(os.path.join(directory, file_name), 'w') as file:
+        file.write(content)
+    return os.path.join(directory, file_name)
+
+
+def test_given_header_included_by_two_tus__find_cheapest_tu_returns_smaller_one():
+    with generate_file('a.h', '#include "b.h"\n') as a_file_name:
+        directory = os.path.dirname(a_file_name)
+        b_file_name = write_file(directory, 'b.h', 'void b() {}\n')
+        big_file_name = write_file(directory, 'big.cpp', '#include "a.h"\n' + 1000 * '// padding\n')
+        small_file_name = write_file(directory, 'small.cpp', '#include "a.h"\n')
+        include_graph = IncludeGraph()
+        include_graph.update({big_file_name: [], small_file_name: []})
+    assert include_graph.find_cheapest_tu(b_file_name)[0] == small_file_name
+    assert include_graph.find_cheapest_tu(small_file_name) == (None, None)
+
+
+def test_given_angle_bracket_include__header_is_only_found_in_include_directories():
+    with generate_file('main.cpp', '#include <lib.h>\n') as main_file_name:
+        directory = os.path.dirname(main_file_name)
+        os.mkdir(os.path.join(directory, 'include'))
+        header_file_name = write_file(directory, os.path.join('include', 'lib.h'), '')
+        write_file(directory, 'lib.h', '')
+        include_graph = IncludeGraph()
+        include_graph.update({main_file_name: ['-working-directory', directory, '-Iinclude']})
+    assert set(include_graph.headers) == {header_file_name}
+
+
+def test_given_include_options__get_include_directories_returns_user_include_directories_only():
+    arguments = ['-working-directory', '/src', '-I', 'a', '-I/b', '-iquote', 'c', '-isystem', '/d', '-DX']
+    assert get_include_directories(arguments) == ('/src/a', '/b', '/src/c')
+
+
+def test_given_stored_include_graph__update_only_scans_modified_files_and_tokenizes_no_arguments(monkeypatch):
+    with generate_file('a.h', '') as a_file_name:
+        directory = os.path.dirname(a_file_name)
+        b_file_name = write_file(directory, 'b.h', '')
+        main_file_name = write_file(directory, 'main.cpp', '#include "a.h"\n')
+        content = json.dumps([{'directory': directory, 'command': 'c++ -c main.cpp', 'file': 'main.cpp'}])
+        with generate_file('compile_commands.json', content) as file_name:
+            IncludeGraph(get_include_graph_file_name(file_name)).update(CompilationDatabase(file_name))
+            write_file(directory, 'a.h', '#include "b.h"\n')
+            os.utime(a_file_name, ns=(0, 0))
+            scanned = []
+            scan_includes = INCode.include_graph.scan_includes
+            monkeypatch.setattr(INCode.include_graph, 'scan_includes',
+                                lambda file_name: scanned.append(file_name) or scan_includes(file_name))
+            monkeypatch.setattr(INCode.compilation_database.CompilationDatabase, 'tokenize_', None)
+            include_graph = IncludeGraph(get_include_graph_file_name(file_name))
+            include_graph.update(CompilationDatabase(file_name))
+    assert scanned == [a_file_name, b_file_name]
+    assert include_graph.find_cheapest_tu(b_file_name)[0] == main_file_name
@@ -0,0 +1,51 @@
+# Copyright (C) 2020 R. Knuus
+
+from INCode.plantuml_exporter import PlantUmlExporter
+import io
+
+
+class FakeCallable(object):
+    def __init__(self, name, participant='P'):
+        self.name = name
+        self.participant = participant
+        self.callable = name
+
+
+def export(calls_of, included, root_name='f()'):
+    stream = io.StringIO()
+    exporter = PlantUmlExporter(get_calls_of=lambda name: calls_of.get(name, []), included=included)
+    exporter.export(root=FakeCallable(root_name), stream=stream)
+    return stream.getvalue()
+
+
+def test_given_recursive_function__export_marks_recursive_call():
+    calls_of = {'f()': [FakeCallable('f()')]}
+    expected = ('@startuml\n\n -> "P": f()\nactivate "P"\n"P" -> "P": f()\nnote right: recursive call\n'
+                'activate "P"\ndeactivate "P"\ndeactivate "P"\n\n@enduml')
+    assert export(calls_of, included={'f()'}) == expected
+
+
+def test_given_mutually_recursive_functions_excluded__export_terminates_with_empty_diagram():
+    calls_of = {'f()': [FakeCallable('g()')], 'g()': [FakeCallable('f()')]}
+    assert export(calls_of, included=set()) == '@startuml\n\n\n@enduml'
+
+
+def test_given_subtree_without_included_callables__export_does_not_visit_its_calls():
+    requested = []
+    calls_of = {'f()': [FakeCallable('g()'), FakeCallable('h()')], 'h()': [FakeCallable('i()')]}
+    stream = io.StringIO()
+
+    def get_calls_of(name):
+        requested.append(name)
+        return calls_of.get(name, [])
+
+    PlantUmlExporter(get_calls_of=get_calls_of, included={'g()'}).export(root=FakeCallable('f()'), stream=stream)
+    assert '"P": g()' in stream.getvalue()
+    assert requested.count('h()') == 1  # only while collecting the reachable callables
+
+
+def test_given_callable_reached_on_two_paths__export_renders_its_calls_twice():
+    calls_of = {'f()': [FakeCallable('g()'), FakeCallable('h()')], 'g()': [FakeCallable('i()')],
+                'h()': [FakeCallable('i()')], 'i()': [FakeCallable('j()')]}
+    actual = export(calls_of, included={'j()'})
+    assert actual.count(' -> "P": j()\n') == 2
@@ -0,0 +1,72 @@
+# Copyright (C) 2020 R. Knuus
+
+from INCode.plantuml_renderer import PlantUmlRenderer, RenderError
+import pytest
+import sys
+
+
+# mimics "plantuml -pipe -pipedelimitor <delimiter>": renders each diagram read from stdin as the number of diagrams
+# rendered so far and its line count, exits after max_diagrams and hangs on a "hang" line
+FAKE_PLANTUML = '''
+import sys
+import time
+delimiter = sys.argv[sys.argv.index('-pipedelimitor') + 1]
+max_diagrams = int(sys.argv[1])
+lines = []
+diagrams = 0
+while diagrams < max_diagrams:
+    lines.append(sys.stdin.readline())
+    if not lines[-1]:
+        break
+    if lines[-1].strip() == 'hang':
+        time.sleep(60)
+    if lines[-1].strip() == '@enduml':
+        diagrams += 1
+        sys.stdout.write('<svg>{} {}</svg>{}\\n'.format(diagrams, len(lines), delimiter))
+        sys.stdout.flush()
+        lines = []
+'''
+
+
+def create_renderer(max_diagrams=100, timeout=10):
+    return PlantUmlRenderer(command=[sys.executable, '-c', FAKE_PLANTUML, str(max_diagrams)], timeout=timeout)
+
+
+def test_given_two_diagrams__render_reuses_one_process():
+    renderer = create_renderer()
+    try:
+        first = renderer.render('@startuml\nA -> B\n@enduml')
+        second = renderer.render('@startuml\nA -> B\nB -> C\n@enduml')
+    finally:
+        renderer.stop()
+    assert first == b'<svg>1 3</svg>'
+    assert second == b'<svg>2 4</svg>'
+
+
+def test_given_crashed_process__render_restarts_it():
+    renderer = create_renderer(max_diagrams=1)
+    try:
+        renderer.render('@startuml\nA -> B\n@enduml')
+        renderer.process_.wait()
+        actual = renderer.render('@startuml\nA -> B\n@enduml')
+    finally:
+        renderer.stop()
+    assert actual == b'<svg>1 3</svg>'
+
+
+def test_given_process_dying_on_every_diagram__render_raises_render_error():
+    renderer = create_renderer(max_diagrams=0)
+    with pytest.raises(RenderError):
+        renderer.render('@startuml\nA -> B\n@enduml')
+
+
+def test_given_hanging_process__render_raises_render_error_and_restarts_it():
+    renderer = create_renderer(timeout=0.5)
+    try:
+        with pytest.raises(RenderError):
+            renderer.render('@startuml\nhang\n@enduml')
+        actual = renderer.render('@startuml\nA -> B\n@enduml')
+    finally:
+        renderer.stop()
+    assert actual == b'<svg>1 3</svg>'
+
@@ -0,0 +1,70 @@
+# Copyright (C) 2020 R. Knuus
+
+from INCode.call_tree_manager import CallTreeManager
+from INCode.clang_access import ClangCallGraphAccess, ClangTUAccess
+from INCode.project_index import get_project_index_file_name, ProjectIndex
+from tests.test_environment_generation import generate_file
+import INCode.clang_access
+import json
+
+
+def fail_to_create_index():
+    raise AssertionError('unexpected parse')
+
+
+def build_project_index(compilation_database_file_name):
+    project_index = ProjectIndex(get_project_index_file_name(compilation_database_file_name))
+    project_index.build(access=ClangCallGraphAccess(), files=ClangTUAccess(compilation_database_file_name).files)
+    return project_index
+
+
+def test_given_definition_followed_by_declaration__project_index_keeps_definition_and_its_tu():
+    with generate_file('f.cpp', 'void h() {}\nvoid f() { h(); }') as f_file_name:
+        with generate_file('g.cpp', 'void f();\nvoid g() { f(); }') as g_file_name:
+            content = json.dumps([{'command': '', 'file': f_file_name}, {'command': '', 'file': g_file_name}])
+            with generate_file('compile_commands.json', content) as file_name:
+                project_index = build_project_index(file_name)
+                definition = project_index.get_callable('f()')
+                definition_tu = project_index.get_definition_tu('f()')
+                callers = project_index.get_callers_of('h()')
+                project_index.close()
+    assert definition.is_definition()
+    assert definition_tu == f_file_name
+    assert [callable.name for callable in callers] == ['f()']
+
+
+def test_given_project_index__manager_answers_queries_without_parsing(monkeypatch):
+    with generate_file('f.cpp', 'void h() {}\nvoid f() { h(); }') as f_file_name:
+        with generate_file('g.cpp', 'extern void f();\nvoid g() { f(); }') as g_file_name:
+            content = json.dumps([{'command': '', 'file': g_file_name}, {'command': '', 'file': f_file_name}])
+            with generate_file('compile_commands.json', content) as file_name:
+                build_project_index(file_name).close()
+                monkeypatch.setattr(INCode.clang_access.Index, 'create', fail_to_create_index)
+                manager = CallTreeManager()
+                assert list(manager.open(get_project_index_file_name(file_name))) == [g_file_name, f_file_name]
+                assert [callable.name for callable in manager.select_tu(g_file_name)] == ['g()']
+                root = manager.select_root('g()')
+                calls = manager.get_calls_of(root.name)
+                definition = manager.load_definition('f()')
+    assert [callable.name for callable in calls] == ['f()']
+    assert not calls[0].is_definition()
+    assert definition.is_definition()
+    assert [callable.name for callable in manager.get_calls_of('f()')] == ['h()']
+
+
+def test_given_project_index__files_decodes_arguments_of_looked_up_tu_only(monkeypatch):
+    with generate_file('f.cpp', 'void f() {}') as f_file_name:
+        with generate_file('g.cpp', 'void g() {}') as g_file_name:
+            content = json.dumps([{'command': 'c++ -DF', 'file': f_file_name},
+                                  {'command': 'c++ -DG', 'file': g_file_name}])
+            with generate_file('compile_commands.json', content) as file_name:
+                project_index = build_project_index(file_name)
+                decoded = []
+                loads = json.loads
+                monkeypatch.setattr(json, 'loads', lambda text: decoded.append(text) or loads(text))
+                files = project_index.files
+                assert list(files) == [f_file_name, g_file_name] and len(files) == 2
+                assert g_file_name in files and file_name not in files
+                assert files[g_file_name] == ['-DG']
+                project_index.close()
+    assert decoded == [json.dumps(['-DG'])]
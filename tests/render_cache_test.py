@@ -0,0 +1,39 @@
+# Copyright (C) 2020 R. Knuus
+
+from INCode.render_cache import RenderCache
+import os
+import tempfile
+
+
+def render_once(source):
+    render_once.calls += 1
+    return '<svg>{}</svg>'.format(source).encode()
+
+
+def test_given_rendered_source__render_returns_cached_output_without_rendering_again():
+    render_once.calls = 0
+    with tempfile.TemporaryDirectory() as directory:
+        cache = RenderCache(directory=directory)
+        first = cache.render('@startuml\nA -> B\n@enduml', render_once)
+        second = cache.render('@startuml\nA -> B\n@enduml', render_once)
+    assert first == second == b'<svg>@startuml\nA -> B\n@enduml</svg>'
+    assert render_once.calls == 1
+
+
+def test_given_source_evicted_from_memory__get_returns_output_stored_on_disk():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = RenderCache(directory=directory, max_entries=1)
+        cache.put('first', b'<svg>1</svg>')
+        cache.put('second', b'<svg>2</svg>')
+        assert RenderCache(directory=directory).get('first') == b'<svg>1</svg>'
+        assert cache.get('first') == b'<svg>1</svg>'
+
+
+def test_given_disk_store_exceeding_max_size__put_removes_least_recently_used_renderings():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = RenderCache(directory=directory, max_size=20)
+        cache.put('first', b'<svg>1</svg>')
+        os.utime(os.path.join(directory, os.listdir(directory)[0]), (0, 0))
+        cache.put('second', b'<svg>2</svg>')
+        assert len(os.listdir(directory)) == 1
+        assert RenderCache(directory=directory).get('first') is None
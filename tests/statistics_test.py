@@ -0,0 +1,29 @@
+# Copyright (C) 2020 R. Knuus
+
+from INCode.statistics import Statistics
+import pickle
+
+
+def test_given_statistics_of_worker__merge_adds_counters_and_times():
+    statistics = Statistics()
+    statistics.count('TUs parsed')
+    worker_statistics = pickle.loads(pickle.dumps(Statistics()))
+    worker_statistics.count('TUs parsed', 2)
+    worker_statistics.add_seconds('parsing', 0.5, 'a.cpp')
+    statistics.merge(worker_statistics)
+    assert statistics.counters == {'TUs parsed': 3}
+    assert statistics.seconds == {'parsing': 0.5}
+    assert statistics.tu_seconds == {'a.cpp': 0.5}
+
+
+def test_given_times_of_several_tus__report_lists_slowest_tus_first():
+    statistics = Statistics()
+    statistics.add_seconds('parsing', 1.0, 'fast.cpp')
+    statistics.add_seconds('parsing', 2.0, 'slow.cpp')
+    statistics.count('cursors visited', 42)
+    assert statistics.report().splitlines() == [
+        '     3.000 s  parsing',
+        '        42    cursors visited',
+        'slowest TUs:',
+        '     2.000 s  slow.cpp',
+        '     1.000 s  fast.cpp']
@@ -1,5 +1,6 @@
 from contextlib import contextmanager
 # from unittest.mock import MagicMock
+import json
 import os.path
 import tempfile
 
@@ -11,3 +12,65 @@ def generate_file(file, content):
             file_name = file.name
             file.write(content)
         yield file_name
+
+
+def get_function_name(tu_index, function_index):
+    return 'f_{}_{}'.format(tu_index, function_index)
+
+
+def get_callees(tu_index, function_index, tu_count, functions_per_tu, fan_out, depth, recursion):
+    '''Returns the (tu_index, function_index) pairs called by a function of the synthetic project.
+
+    Functions are arranged in depth levels by their index; each one calls fan_out functions of the next level,
+    spread over the following TUs. With recursion, functions of the last level call the first function of their TU.
+    '''
+    level = function_index % depth
+    if level == depth - 1:
+        return [(tu_index, 0)] if recursion else []
+    next_level_size = len(range(level + 1, functions_per_tu, depth))
+    if next_level_size == 0:
+        return []
+    callees = []
+    for call_index in range(fan_out):
+        callee_slot = (function_index // depth + call_index) % next_level_size
+        callees.append(((tu_index + call_index) % tu_count, callee_slot * depth + level + 1))
+    return callees
+
+
+@contextmanager
+def generate_project(tu_count=4, functions_per_tu=8, fan_out=2, depth=3, recursion=False, shared_headers=1,
+                     header_functions=0):
+    '''Generates a synthetic C++ project and yields the file name of its compile_commands.json.
+
+    Function f_<tu>_<i> is defined in tu_<tu>.cpp, f_0_0 is the root of a call tree of the given depth.
+    All functions are declared in shared_headers headers included by every TU, each of which additionally
+    defines header_functions inline functions to make parsing the TUs more expensive.
+    '''
+    with tempfile.TemporaryDirectory() as directory:
+        header_names = ['shared_{}.h'.format(header_index) for header_index in range(shared_headers)]
+        declarations = [[] for _ in header_names]
+        for tu_index in range(tu_count):
+            for function_index in range(functions_per_tu):
+                declarations[tu_index % len(declarations)].append(
+                    'void {}();\n'.format(get_function_name(tu_index, function_index)))
+        for header_index, header_name in enumerate(header_names):
+            with open(os.path.join(directory, header_name), 'w') as header:
+                header.write('#pragma once\n')
+                header.writelines(declarations[header_index])
+                for function_index in range(header_functions):
+                    header.write('inline int h_{0}_{1}(int x) {{ return x * {1} + {0}; }}\n'.format(
+                        header_index, function_index))
+        entries = []
+        for tu_index in range(tu_count):
+            file_name = os.path.join(directory, 'tu_{}.cpp'.format(tu_index))
+            with open(file_name, 'w') as tu:
+                tu.writelines('#include "{}"\n'.format(header_name) for header_name in header_names)
+                for function_index in range(functions_per_tu):
+                    calls = ''.join(' {}();'.format(get_function_name(*callee)) for callee in get_callees(
+                        tu_index, function_index, tu_count, functions_per_tu, fan_out, depth, recursion))
+                    tu.write('void {}() {{{} }}\n'.format(get_function_name(tu_index, function_index), calls))
+            entries.append({'directory': directory, 'command': 'c++ -c {}'.format(file_name), 'file': file_name})
+        file_name = os.path.join(directory, 'compile_commands.json')
+        with open(file_name, 'w') as compilation_database:
+            json.dump(entries, compilation_database)
+        yield file_name
@@ -0,0 +1,36 @@
+# Copyright (C) 2020 R. Knuus
+
+from INCode.call_tree_manager import CallTreeManager
+from INCode.tui import TuiViewModel
+from tests.test_environment_generation import generate_file
+
+
+def create_view_model(content, root_name):
+    manager = CallTreeManager()
+    view_model = TuiViewModel(manager)
+    with generate_file('file.cpp', content) as file_name:
+        manager.open(file_name)
+        manager.select_tu(file_name)
+        view_model.set_root(manager.select_root(root_name))
+    return view_model
+
+
+def test_given_recursive_calls__set_root_expands_only_first_level():
+    view_model = create_view_model('void f();\nvoid g() { f(); }\nvoid f() { g(); }\n', 'f()')
+    assert view_model.view == '   f()\n   └── g() [+]\n'
+
+
+def test_given_recursive_calls__expand_stops_at_recursive_call():
+    view_model = create_view_model('void f();\nvoid g() { f(); }\nvoid f() { g(); }\n', 'f()')
+    assert view_model.expand('g()', depth=5)
+    assert view_model.view == '   f()\n   └── g()\n       └── f() (recursive)\n'
+
+
+def test_given_collapsed_callable__render_subtree_of_callable_shows_it_collapsed():
+    view_model = create_view_model('void h() {}\nvoid g() { h(); }\nvoid f() { g(); g(); }\n', 'f()')
+    view_model.expand('g()')
+    view_model.collapse('g()')
+    assert view_model.render(node_name='g()') == '   g() [+]\n'
+    assert view_model.expand('g()')
+    assert view_model.render(node_name='g()', max_depth=0) == '   g()\n'
+    assert len(view_model.nodes_of_['h()']) == 2  # below both calls of g()
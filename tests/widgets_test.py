@@ -0,0 +1,31 @@
+# Copyright (C) 2020 R. Knuus
+
+from INCode.widgets import get_tile_keys, get_zoom_level, rasterize_tile, TILE_SIZE
+from PyQt5.QtCore import QRectF
+from PyQt5.QtSvg import QSvgRenderer
+
+
+def test_given_zoom_between_powers_of_two__get_zoom_level_rounds_up():
+    assert [get_zoom_level(lod) for lod in [0.3, 0.5, 1.0, 1.2, 2.0]] == [-1, -1, 0, 1, 1]
+
+
+def test_given_rect_at_diagram_border__get_tile_keys_returns_only_tiles_within_diagram():
+    bounds = QRectF(0, 0, 2 * TILE_SIZE, 2 * TILE_SIZE)
+    actual = get_tile_keys(QRectF(TILE_SIZE + 1, -100, 4 * TILE_SIZE, TILE_SIZE), bounds, 0)
+    assert actual == [(0, 1, 0)]
+
+
+def test_given_zoom_level_one__get_tile_keys_returns_tiles_of_half_extent():
+    bounds = QRectF(0, 0, TILE_SIZE, TILE_SIZE)
+    assert get_tile_keys(bounds, bounds, 1) == [(1, 0, 0), (1, 1, 0), (1, 0, 1), (1, 1, 1)]
+
+
+def test_given_second_tile__rasterize_tile_draws_only_its_part_of_the_diagram():
+    content = ('<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{1}">'
+               '<rect x="{1}" y="0" width="{1}" height="{1}" fill="#0000ff"/></svg>').format(2 * TILE_SIZE, TILE_SIZE)
+    bounds = QRectF(0, 0, 2 * TILE_SIZE, TILE_SIZE)
+    renderer = QSvgRenderer(content.encode())
+    first = rasterize_tile(renderer, bounds, (0, 0, 0))
+    second = rasterize_tile(renderer, bounds, (0, 1, 0))
+    assert first.pixel(10, 10) == 0
+    assert second.pixel(10, 10) == 0xff0000ff